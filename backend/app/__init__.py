@@ -1,7 +1,8 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Request, jsonify, request
 from flask_cors import CORS
-from .models.session import Base
-from sqlalchemy import create_engine
+from .database import init_app as init_db_app, init_db
+from tempfile import SpooledTemporaryFile
+import hashlib
 import os
 import logging
 from dotenv import load_dotenv
@@ -12,21 +13,73 @@ load_dotenv()
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+class HashingSpool(SpooledTemporaryFile):
+    """Spooled upload that hashes its bytes as they are received
+
+    DocumentStore.save_upload uses the digest, so a document stored
+    before is recognized without reading the upload a second time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.bytes_written += len(data)
+        return super().write(data)
+
+class UploadRequest(Request):
+    """Request that keeps uploaded files in memory only up to UPLOAD_SPOOL_BYTES"""
+
+    spool_max_size = int(os.getenv('UPLOAD_SPOOL_BYTES', str(1024 * 1024)))
+    spool_dir = os.getenv('UPLOAD_SPOOL_DIR') or None
+    # Caps non-file form fields, which are always held in memory
+    max_form_memory_size = int(os.getenv('MAX_FORM_MEMORY_BYTES', str(1024 * 1024)))
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Larger files roll over to a temporary file on disk
+        return HashingSpool(max_size=self.spool_max_size, mode='rb+', dir=self.spool_dir)
+
 def create_app():
     app = Flask(__name__)
+    app.request_class = UploadRequest
+    # Werkzeug rejects bodies over this with 413 before reading them
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_BYTES', str(200 * 1024 * 1024)))
     CORS(app)  # Enable CORS for all routes
     
     # Initialize database
-    engine = create_engine('sqlite:///readit.db')
-    Base.metadata.create_all(engine)
+    init_db()
+    init_db_app(app)
 
     # Register blueprints
-    from .routes import main_bp
+    from .routes import main_bp, services
+    from .services.registry import ServiceUnavailable
     app.register_blueprint(main_bp)  # Remove url_prefix to match frontend calls
+    app.extensions['services'] = services
+
+    # Expires idle sessions in the background; SESSION_RETENTION_DAYS=0 turns it off
+    def start_retention() -> bool:
+        try:
+            services.get('retention').start()
+            return True
+        except ServiceUnavailable as e:
+            # The registry logs the failure; requests keep retrying once its retry window passes
+            logger.debug(f"Session retention not started: {str(e)}")
+            return False
+
+    retention_started = [start_retention()]
+
+    @app.before_request
+    def ensure_retention():
+        if not retention_started[0]:
+            retention_started[0] = start_retention()
 
     @app.route('/health')
     def health_check():
-        return {'status': 'healthy'}, 200
+        # Services not yet used report not_started; checking never creates them
+        return {'status': 'healthy', 'services': services.status()}, 200
 
     @app.errorhandler(404)
     def not_found_error(error):
@@ -37,6 +90,15 @@ def create_app():
             'status': 404
         }), 404
 
+    @app.errorhandler(413)
+    def request_too_large(error):
+        logger.error(f"413 Error: {error}")
+        return jsonify({
+            'error': 'Request Entity Too Large',
+            'message': f"Uploads are limited to {app.config['MAX_CONTENT_LENGTH']} bytes",
+            'status': 413
+        }), 413
+
     @app.errorhandler(500)
     def internal_error(error):
         logger.error(f"500 Error: {error}")
@@ -49,6 +111,7 @@ def create_app():
     @app.before_request
     def log_request_info():
         logger.debug('Headers: %s', request.headers)
-        logger.debug('Body: %s', request.get_data())
+        # Log the size only; reading the body here would buffer whole uploads in memory
+        logger.debug('Body: %s bytes (%s)', request.content_length, request.content_type)
 
     return app
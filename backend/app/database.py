@@ -1,8 +1,95 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text
+from sqlalchemy import create_engine, event, Column, String, Integer, DateTime, Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
+from datetime import datetime, timedelta
+import os
+import time
 import uuid
+from .services.metrics import DB_COMMIT_SECONDS
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///readit.db')
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent readers and writers"""
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a writer commits
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=30000')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-20000')
+    cursor.close()
+
+def create_db_engine(url=DATABASE_URL):
+    """Create the engine with pooling suited to the database backend"""
+    if url.startswith('sqlite'):
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            # A single shared connection, or each checkout would see an empty database
+            engine = create_engine(url, poolclass=StaticPool, connect_args={'check_same_thread': False})
+        else:
+            engine = create_engine(
+                url,
+                pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+                max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+                pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+                pool_pre_ping=True,
+                connect_args={'check_same_thread': False, 'timeout': 30}
+            )
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        pool_pre_ping=True
+    )
+
+# The one engine shared by the app, background workers and SessionManager
+engine = create_db_engine()
+# Plain factory for background threads, which open and close their own sessions
+SessionFactory = sessionmaker(bind=engine)
+# Request-scoped sessions, removed at the end of each request by init_app
+SessionLocal = scoped_session(SessionFactory)
+
+@event.listens_for(SessionFactory, 'before_commit')
+def _start_commit_timer(session):
+    session.info['commit_started'] = time.perf_counter()
+
+@event.listens_for(SessionFactory, 'after_commit')
+def _record_commit_time(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+@event.listens_for(SessionFactory, 'after_soft_rollback')
+def _drop_commit_timer(session, previous_transaction):
+    # A failed commit is not a commit latency
+    session.info.pop('commit_started', None)
+
+def init_db():
+    """Create the application's tables"""
+    from .models.session import Base as ModelBase
+    ModelBase.metadata.create_all(engine)
+    # Baseline databases keep segments on the sessions themselves
+    from .migrations import migrate_legacy_sessions, add_missing_columns
+    migrate_legacy_sessions(engine)
+    add_missing_columns(engine)
+    # create_all skips indexes on tables that already exist
+    for table in ModelBase.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # Full-text index over segments, kept current by triggers from the first upload on
+    from .services.segment_search import create_search_index
+    create_search_index(engine)
+
+def init_app(app):
+    """Tear down the request's database session when the app context ends"""
+    @app.teardown_appcontext
+    def remove_db_session(exception=None):
+        SessionLocal.remove()
 
 Base = declarative_base()
 
@@ -17,10 +104,9 @@ class Session(Base):
 
 class SessionManager:
     def __init__(self):
-        self.engine = create_engine('sqlite:///readit.db')
+        self.engine = engine
         Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.db_session = Session()
+        self.db_session = SessionFactory()
 
     def create_session(self, text):
         """Create a new reading session"""
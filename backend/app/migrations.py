@@ -0,0 +1,132 @@
+import json
+import uuid
+import sqlite3
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateTable
+
+logger = logging.getLogger(__name__)
+
+# ALTER TABLE ... DROP COLUMN arrived in SQLite 3.35; older versions rebuild the table instead
+DROP_COLUMN_SUPPORTED = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Nullable columns added to existing tables after their first release: (table, column, type)
+ADDED_COLUMNS = [
+    ('documents', 'materialize_error', 'TEXT'),
+]
+
+def _columns(cursor, table: str) -> set:
+    return {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+
+def migrate_legacy_sessions(engine):
+    """Move segments kept on baseline reading_sessions rows into shared documents
+
+    Baseline databases stored each session's segments in a JSON column and
+    had no documents table. Every distinct text becomes a document keyed by
+    a hash of its segments (the uploaded bytes are gone), its segments are
+    copied to document_segments, sessions reference it, and the old column
+    is dropped so new sessions can be inserted (on SQLite before 3.35 by
+    rebuilding the table). Runs after create_all and does nothing on an
+    up-to-date database.
+    """
+    columns = {column['name'] for column in inspect(engine).get_columns('reading_sessions')}
+    if 'document_id' in columns:
+        return
+    if engine.dialect.name != 'sqlite' or 'segments' not in columns:
+        error_msg = ("reading_sessions predates shared documents (no document_id column) and cannot be "
+                     "migrated automatically; recreate the database or add the column by hand")
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # Taken before checking again, so workers starting together migrate only once
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if 'document_id' not in _columns(cursor, 'reading_sessions'):
+                sessions, documents = _migrate(cursor, _create_sql(engine, 'reading_sessions'))
+                logger.info(f"Migrated {sessions} reading sessions to {documents} shared documents")
+            connection.commit()
+        except sqlite3.Error as e:
+            connection.rollback()
+            error_msg = f"Error migrating reading sessions to shared documents: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            raise ValueError(error_msg)
+    finally:
+        connection.close()
+
+def _create_sql(engine, table: str) -> str:
+    """CREATE TABLE statement for the current model of a table, without its indexes"""
+    from .models.session import Base
+    return str(CreateTable(Base.metadata.tables[table]).compile(dialect=engine.dialect))
+
+def _drop_column(cursor, table: str, column: str, create_sql: str):
+    """Drop a column, rebuilding the table from create_sql where SQLite cannot drop it"""
+    if DROP_COLUMN_SUPPORTED:
+        cursor.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+        return
+    kept = _columns(cursor, table) - {column}
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+    cursor.execute(create_sql)
+    # Model columns the old table lacks are left NULL, as an ADD COLUMN would leave them
+    shared = ', '.join(sorted(kept & _columns(cursor, table)))
+    cursor.execute(f'INSERT INTO {table} ({shared}) SELECT {shared} FROM {table}_legacy')
+    # Its indexes go with it; init_db creates the model's indexes afterwards
+    cursor.execute(f'DROP TABLE {table}_legacy')
+
+def _migrate(cursor, create_sql: str):
+    cursor.execute('ALTER TABLE reading_sessions ADD COLUMN document_id VARCHAR(36)')
+    rows = cursor.execute('SELECT id, document_name, segments FROM reading_sessions').fetchall()
+    now = str(datetime.utcnow())
+
+    document_ids = {}
+    for session_id, document_name, segments in rows:
+        texts = [str(text) for text in json.loads(segments or '[]')]
+        data = '\n'.join(texts).encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        document_id = document_ids.get(content_hash)
+        if document_id is None:
+            document_id = document_ids[content_hash] = str(uuid.uuid4())
+            # Same layout SegmentStore.append writes: offsets into the space-joined text
+            segment_rows, offset = [], 0
+            for i, text in enumerate(texts):
+                segment_rows.append((document_id, i, text, offset, len(text.split())))
+                offset += len(text) + 1
+            cursor.executemany(
+                'INSERT INTO document_segments (document_id, segment_index, text, char_offset, word_count) '
+                'VALUES (?, ?, ?, ?, ?)', segment_rows
+            )
+            cursor.execute(
+                'INSERT INTO documents (id, content_hash, format, size, path, total_segments, word_count, '
+                'materialized, ref_count, created_at) VALUES (?, ?, ?, ?, NULL, ?, ?, 1, 0, ?)',
+                (document_id, content_hash, os.path.splitext((document_name or '').lower())[1] or '.txt',
+                 len(data), len(texts), sum(row[4] for row in segment_rows), now)
+            )
+
+        cursor.execute('UPDATE documents SET ref_count = ref_count + 1 WHERE id = ?', (document_id,))
+        cursor.execute('UPDATE reading_sessions SET document_id = ? WHERE id = ?', (document_id, session_id))
+
+    # NOT NULL and no longer written, so it would reject every new session
+    _drop_column(cursor, 'reading_sessions', 'segments', create_sql)
+    return len(rows), len(document_ids)
+
+def add_missing_columns(engine):
+    """Add ADDED_COLUMNS to tables created before them; create_all leaves existing tables alone"""
+    for table, column, column_type in ADDED_COLUMNS:
+        if column in {c['name'] for c in inspect(engine).get_columns(table)}:
+            continue
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+            logger.info(f"Added column {table}.{column}")
+        except DBAPIError:
+            # Another worker starting at the same time may have added it first
+            if column not in {c['name'] for c in inspect(engine).get_columns(table)}:
+                raise
@@ -1,21 +1,38 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, Boolean, Float
+from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, Boolean, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 import uuid
 
 Base = declarative_base()
 
+class Document(Base):
+    """Parsed content shared by every session that uploaded the same bytes"""
+    __tablename__ = 'documents'
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    content_hash = Column(String(64), nullable=False, unique=True)  # SHA-256 of the uploaded bytes
+    format = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    path = Column(String, nullable=True)  # Raw upload kept for lazy extraction
+    total_segments = Column(Integer, default=0)  # Rows stored in the segments table
+    word_count = Column(Integer, default=0)
+    materialized = Column(Boolean, default=True)  # False while segments are still being extracted
+    materialize_error = Column(Text, nullable=True)  # Why lazy extraction stopped; it is not retried
+    ref_count = Column(Integer, default=0)  # Sessions referencing this document
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class ReadingSession(Base):
     __tablename__ = 'reading_sessions'
 
     id = Column(String, primary_key=True)
-    user_id = Column(String, nullable=True)  # For future user authentication
+    user_id = Column(String, nullable=True, index=True)  # Never client-supplied; scopes /search
     document_name = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    segments = Column(JSON, nullable=False)  # Store text segments
+    document_id = Column(String(36), nullable=False, index=True)
     current_segment = Column(Integer, default=0)
     current_position = Column(Integer, default=0)
-    bookmarks = Column(JSON, default=lambda: [])
+    bookmarks = deferred(Column(JSON, default=lambda: []))  # Legacy; bookmarks live in the bookmarks table
     voice_id = Column(String, default='en-US-JennyNeural')
     reading_speed = Column(Float, default=1.0)
     font_size = Column(Integer, default=16)
@@ -23,27 +40,60 @@ class ReadingSession(Base):
     offline_mode = Column(Boolean, default=False)
     cached_audio_paths = Column(JSON, default=lambda: {})
     created_at = Column(DateTime, default=datetime.utcnow)
-    last_accessed = Column(DateTime, default=datetime.utcnow)
+    last_accessed = Column(DateTime, default=datetime.utcnow, index=True)  # Drives retention sweeps
+
+    document = relationship(
+        Document, primaryjoin='foreign(ReadingSession.document_id) == Document.id', lazy='joined'
+    )
+
+    @property
+    def total_segments(self):
+        return self.document.total_segments
+
+    @property
+    def materialized(self):
+        return self.document.materialized
     
     def to_dict(self):
         return {
             'id': self.id,
+            'document_id': self.document_id,
             'document_name': self.document_name,
             'current_segment': self.current_segment,
             'current_position': self.current_position,
-            'bookmarks': self.bookmarks,
             'voice_id': self.voice_id,
             'reading_speed': self.reading_speed,
             'font_size': self.font_size,
             'dark_mode': self.dark_mode,
             'offline_mode': self.offline_mode,
-            'total_segments': len(self.segments),
+            'total_segments': self.total_segments,
+            'materialized': self.materialized,
             'created_at': self.created_at.isoformat(),
             'last_accessed': self.last_accessed.isoformat()
         }
 
+class Segment(Base):
+    __tablename__ = 'document_segments'
+
+    # The composite primary key doubles as the (document_id, segment_index) lookup index
+    document_id = Column(String(36), primary_key=True)
+    segment_index = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    char_offset = Column(Integer, nullable=False)  # Offset in the space-joined segment text
+    word_count = Column(Integer, nullable=False)
+
+    def to_dict(self):
+        return {
+            'index': self.segment_index,
+            'text': self.text,
+            'char_offset': self.char_offset,
+            'word_count': self.word_count
+        }
+
 class Bookmark(Base):
     __tablename__ = 'bookmarks'
+    # Covers both the per-session lookup and the listing order
+    __table_args__ = (Index('ix_bookmarks_session_order', 'session_id', 'segment_index', 'position'),)
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     session_id = Column(String, nullable=False)
@@ -55,8 +105,46 @@ class Bookmark(Base):
     def to_dict(self):
         return {
             'id': self.id,
+            'session_id': self.session_id,
             'position': self.position,
             'segment_index': self.segment_index,
             'note': self.note,
             'created_at': self.created_at.isoformat()
         }
+
+class AudioJob(Base):
+    __tablename__ = 'audio_jobs'
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    session_id = Column(String, nullable=False, index=True)
+    voice_id = Column(String, nullable=False)
+    audio_format = Column(String, default='wav')
+    status = Column(String, default='queued')  # queued, running, completed, failed
+    total_segments = Column(Integer, default=0)
+    completed_segments = Column(Integer, default=0)
+    failed_segments = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'voice_id': self.voice_id,
+            'format': self.audio_format,
+            'status': self.status,
+            'total': self.total_segments,
+            'done': self.completed_segments,
+            'failed': self.failed_segments,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class AudioJobSegment(Base):
+    __tablename__ = 'audio_job_segments'
+
+    job_id = Column(String(36), primary_key=True)
+    segment_index = Column(Integer, primary_key=True)
+    status = Column(String, default='pending')  # pending, done, failed
+    audio_path = Column(String, nullable=True, index=True)  # Checked before releasing cached audio
+    error = Column(Text, nullable=True)
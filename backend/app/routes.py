@@ -1,27 +1,178 @@
-from flask import Blueprint, request, jsonify, send_file
-from .services.text_parser import TextParser
-from .services.tts_service import TTSService
-from .services.ai_assistant import AIAssistant
-from .models.session import ReadingSession, Bookmark, Base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from flask import Blueprint, Response, request, jsonify, send_file
+from werkzeug.local import LocalProxy
+from .services.registry import ServiceRegistry, ServiceUnavailable
+from .services import metrics
+from .models.session import ReadingSession, Bookmark, Document
+from .database import SessionFactory, SessionLocal, engine
+from sqlalchemy.exc import IntegrityError
 import uuid
 import logging
 import os
-import asyncio
+import json
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 main_bp = Blueprint('main', __name__)
 
-# Initialize services and database
-engine = create_engine('sqlite:///readit.db')
-Session = sessionmaker(bind=engine)
+# Services are created on first use; each factory imports its own dependencies
+services = ServiceRegistry()
 
-text_parser = TextParser()
-tts_service = TTSService()
-ai_assistant = AIAssistant()
+def _text_parser():
+    from .services.text_parser import TextParser
+    return TextParser()
+
+def _tts_service():
+    from .services.tts_service import TTSService
+    return TTSService()
+
+def _ai_assistant():
+    from .services.ai_assistant import AIAssistant
+    return AIAssistant()
+
+def _segment_store():
+    from .services.segment_store import SegmentStore
+    return SegmentStore()
+
+def _document_store():
+    from .services.document_store import DocumentStore
+    return DocumentStore(services.get('text_parser'))
+
+def _bookmark_store():
+    from .services.bookmark_store import BookmarkStore
+    return BookmarkStore()
+
+def _materializer():
+    from .services.materializer import DocumentMaterializer
+    # Index a lazy document once it is complete, so the first /ask does not rebuild it on a request thread
+    return DocumentMaterializer(
+        services.get('text_parser'), SessionFactory, services.get('segment_store'),
+        on_complete=_build_retrieval_index
+    )
+
+def _build_retrieval_index(document_id):
+    db_session = SessionLocal()
+    try:
+        retrieval.build(document_id, segment_store.get_texts(db_session, document_id))
+    finally:
+        db_session.close()
+
+def _audio_jobs():
+    from .services.audio_jobs import OfflineAudioJobRunner
+    return OfflineAudioJobRunner(services.get('tts_service'), SessionFactory)
+
+def _progress():
+    from .services.progress_buffer import ProgressBuffer
+    return ProgressBuffer(SessionFactory, db_path=os.getenv('PROGRESS_BUFFER_DB') or _progress_buffer_path())
+
+def _progress_buffer_path():
+    """Beside a SQLite database file, otherwise in the audio cache directory"""
+    database = engine.url.database if engine.dialect.name == 'sqlite' else None
+    if database and database != ':memory:':
+        directory = os.path.dirname(os.path.abspath(database))
+    else:
+        directory = os.path.abspath(os.getenv(
+            'AUDIO_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', 'audio_cache')
+        ))
+    return os.path.join(directory, 'progress_buffer.db')
+
+def _retrieval():
+    from .services.retrieval import RetrievalService
+    return RetrievalService(services.get('segment_store'))
+
+def _async_runner():
+    from .services.async_runner import AsyncRunner
+    return AsyncRunner()
+
+def _prefetcher():
+    from .services.prefetcher import SegmentPrefetcher
+    return SegmentPrefetcher(services.get('tts_service'), services.get('segment_store'))
+
+def _search():
+    from .services.segment_search import SegmentSearch
+    return SegmentSearch(engine)
+
+def _retention():
+    from .services.retention import RetentionSweeper
+    # Callbacks go through the proxies, so e.g. TTS is only created once there is audio to release
+    return RetentionSweeper(
+        SessionFactory, services.get('document_store'), services.get('bookmark_store'), services.get('progress'),
+        release_audio=lambda path, idle_since: tts_service.cache.release(os.path.basename(path), idle_since),
+        on_session_expired=lambda session_id: _peek('prefetcher', lambda p: p.forget(session_id), None),
+        on_document_released=lambda document_id: retrieval.discard(document_id)
+    )
+
+for _name, _factory in [
+    ('text_parser', _text_parser), ('tts_service', _tts_service), ('ai_assistant', _ai_assistant),
+    ('segment_store', _segment_store), ('document_store', _document_store),
+    ('bookmark_store', _bookmark_store), ('materializer', _materializer), ('audio_jobs', _audio_jobs),
+    ('progress', _progress), ('retrieval', _retrieval), ('async_runner', _async_runner),
+    ('prefetcher', _prefetcher), ('search', _search), ('retention', _retention)
+]:
+    services.register(_name, _factory)
+
+# Module-level names resolve through the registry, so route code uses them as plain objects
+text_parser = LocalProxy(lambda: services.get('text_parser'))
+tts_service = LocalProxy(lambda: services.get('tts_service'))
+ai_assistant = LocalProxy(lambda: services.get('ai_assistant'))
+segment_store = LocalProxy(lambda: services.get('segment_store'))
+document_store = LocalProxy(lambda: services.get('document_store'))
+bookmark_store = LocalProxy(lambda: services.get('bookmark_store'))
+materializer = LocalProxy(lambda: services.get('materializer'))
+audio_jobs = LocalProxy(lambda: services.get('audio_jobs'))
+progress = LocalProxy(lambda: services.get('progress'))
+retrieval = LocalProxy(lambda: services.get('retrieval'))
+async_runner = LocalProxy(lambda: services.get('async_runner'))
+prefetcher = LocalProxy(lambda: services.get('prefetcher'))
+search = LocalProxy(lambda: services.get('search'))
+retention = LocalProxy(lambda: services.get('retention'))
+
+def _peek(name, read, default=0):
+    """Read a gauge from a service only if something has already created it"""
+    service = services.peek(name)
+    return read(service) if service is not None else default
+
+# Gauges are read when /metrics is scraped, so they cost nothing between scrapes
+metrics.registry.gauge('readit_audio_cache_bytes', 'Bytes of synthesized audio in the cache',
+                       lambda: _peek('tts_service', lambda s: s.cache.stats()['bytes']))
+metrics.registry.gauge('readit_audio_cache_entries', 'Audio files in the cache',
+                       lambda: _peek('tts_service', lambda s: s.cache.stats()['entries']))
+metrics.registry.gauge('readit_answer_cache_entries', 'AI answers held in memory',
+                       lambda: _peek('ai_assistant', lambda s: s.cache.stats()['entries']))
+metrics.registry.gauge('readit_progress_pending_sessions', 'Sessions with progress not yet written',
+                       lambda: _peek('progress', lambda s: s.stats()['pending']))
+metrics.registry.gauge('readit_jobs_in_flight', 'Background jobs queued or running, by kind',
+                       lambda: {('audio',): _peek('audio_jobs', lambda s: s.in_flight()),
+                                ('materialize',): _peek('materializer', lambda s: s.in_flight()),
+                                ('prefetch',): _peek('prefetcher', lambda s: s.in_flight())},
+                       ['kind'])
+
+# Segments returned inline by /upload; the rest are paged via /session/<id>/segments
+UPLOAD_SEGMENT_PAGE = int(os.getenv('UPLOAD_SEGMENT_PAGE', '50'))
+MAX_SEGMENT_PAGE = 500
+BOOKMARK_PAGE = int(os.getenv('BOOKMARK_PAGE', '100'))
+MAX_BOOKMARK_PAGE = 1000
+SEARCH_PAGE = int(os.getenv('SEARCH_PAGE', '20'))
+MAX_SEARCH_PAGE = 100
+# Reading a session refreshes last_accessed at most this often
+ACCESS_TOUCH_SECONDS = int(os.getenv('SESSION_ACCESS_TOUCH_SECONDS', '3600'))
+
+def _prefetch_after(db_session, session_id, segment_index, fmt=None):
+    """Start synthesizing the segments after segment_index; never fails the request"""
+    try:
+        # Served from the identity map when the caller already loaded the session
+        session = db_session.get(ReadingSession, session_id)
+        if session is not None:
+            prefetcher.advance(db_session, session, int(segment_index), fmt)
+    except ServiceUnavailable as e:
+        logger.debug(f"Prefetch disabled: {str(e)}")
+    except Exception as e:
+        logger.warning(f"Could not schedule prefetch for session {session_id}: {str(e)}")
+
+def _is_lazy_upload():
+    """Whether the client asked for lazy document materialization"""
+    value = request.form.get('lazy', request.args.get('lazy', 'false'))
+    return value.lower() in ('1', 'true', 'yes')
 
 @main_bp.route('/upload', methods=['POST'])
 def upload_document():
@@ -34,38 +185,109 @@ def upload_document():
         return jsonify({'error': 'No file selected'}), 400
 
     try:
-        # Parse document
-        logger.info(f"Parsing document: {file.filename}")
-        parsed_content = text_parser.parse_document(file)
-        
-        # Create new session
-        db_session = Session()
-        session_id = str(uuid.uuid4())
-        
-        reading_session = ReadingSession(
-            id=session_id,
-            document_name=file.filename,
-            content=parsed_content['segments'][0],
-            segments=parsed_content['segments'],
-            current_segment=0,
-            current_position=0
-        )
-        
-        db_session.add(reading_session)
-        db_session.commit()
-        
-        logger.info(f"Created new session: {session_id}")
-        
-        return jsonify({
-            'session_id': session_id,
-            'metadata': parsed_content['metadata'],
-            'segments': parsed_content['segments'],
-            'current_segment': 0
-        })
+        ext = text_parser.get_format(file.filename)
+        db_session = SessionLocal()
+        for attempt in range(2):
+            content_hash, path, size = document_store.save_upload(file)
+
+            document = document_store.find(db_session, content_hash)
+            if document is not None:
+                # Same bytes as an earlier upload: reuse its segments instead of parsing again
+                logger.info(f"Reusing parsed document {document.id} for {file.filename}")
+            elif _is_lazy_upload():
+                document = _materialize_document_lazy(db_session, content_hash, ext, size, path)
+            else:
+                document = _parse_document(db_session, file, content_hash, ext, size, path)
+
+            # user_id is not taken from the request: without authentication a client could claim anyone's
+            response = _create_session(db_session, file.filename, document)
+            if response is not None:
+                return response
+            # The retention sweep released the document in between; store the upload again
+            logger.info(f"Document {content_hash} was released during the upload of {file.filename}")
+            file.stream.seek(0)
+        raise ValueError(f"Document for {file.filename} was released while it was being uploaded")
     except Exception as e:
         logger.error(f"Error in upload_document: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+def _parse_document(db_session, file, content_hash, ext, size, path):
+    """Parse a new document and store its segments"""
+    logger.info(f"Parsing document: {file.filename}")
+    parsed_content = text_parser.parse_document(file, path=path)
+
+    try:
+        document = document_store.create(db_session, content_hash, ext, size, path)
+        segment_store.append(db_session, document, parsed_content['segments'])
+        db_session.commit()
+    except IntegrityError:
+        # A concurrent upload of the same bytes stored it first
+        db_session.rollback()
+        return document_store.find(db_session, content_hash)
+
+    try:
+        retrieval.build(document.id, parsed_content['segments'])
+    except ValueError:
+        # Not fatal: /ask rebuilds a missing index from the stored segments
+        pass
+    return document
+
+def _materialize_document_lazy(db_session, content_hash, ext, size, path):
+    """Store the first pages of a new document and extract the rest later"""
+    try:
+        document = document_store.create(db_session, content_hash, ext, size, path, materialized=False)
+        db_session.commit()
+    except IntegrityError:
+        db_session.rollback()
+        return document_store.find(db_session, content_hash)
+
+    logger.info(f"Lazily materializing document: {document.id}")
+    initial = materializer.begin(document.id, path, ext)
+    if not initial['complete']:
+        materializer.schedule(document.id)
+    return document
+
+def _create_session(db_session, filename, document, user_id=None):
+    """Create a reading session referencing a stored document
+
+    Returns None, having rolled back, if the document was released before
+    the reference could be taken.
+    """
+    if not document_store.acquire(db_session, document.id):
+        db_session.rollback()
+        return None
+    session_id = str(uuid.uuid4())
+    # Pick up segments stored by the materializer through its own database session
+    db_session.refresh(document)
+    segments = segment_store.get_range(db_session, document.id, 0, UPLOAD_SEGMENT_PAGE)
+
+    reading_session = ReadingSession(
+        id=session_id,
+        user_id=user_id or None,
+        document_name=filename,
+        content=segments[0].text if segments else '',
+        document_id=document.id,
+        current_segment=0,
+        current_position=0
+    )
+    db_session.add(reading_session)
+    db_session.commit()
+
+    logger.info(f"Created new session: {session_id}")
+
+    return jsonify({
+        'session_id': session_id,
+        'metadata': {
+            'filename': filename.lower(),
+            'format': document.format,
+            'word_count': document.word_count
+        },
+        'segments': [segment.text for segment in segments],
+        'total_segments': document.total_segments,
+        'current_segment': 0,
+        'materialized': document.materialized
+    })
+
 @main_bp.route('/api/voices', methods=['GET'])
 def get_voices():
     try:
@@ -86,10 +308,21 @@ def get_voices_legacy():
         logger.info("Fetching available voices")
         voices = tts_service.get_available_voices()
         return jsonify(voices)
+    except ServiceUnavailable as e:
+        # The feature is switched off (e.g. no API key); the rest of the app keeps working
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error in get_voices: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+def _wants_stream(data):
+    """Whether a /tts request asked for chunked streaming"""
+    value = data.get('stream', request.args.get('stream', False))
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
 @main_bp.route('/tts', methods=['POST'])
 def text_to_speech():
     """Convert text to speech"""
@@ -101,114 +334,506 @@ def text_to_speech():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
 
-        logger.info(f"Converting text to speech using voice: {voice_id}")
-        audio_path = tts_service.convert_to_speech(text, voice_id)
-        
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Generated audio file not found: {audio_path}")
-            
-        logger.info(f"Sending audio file: {audio_path}")
-        return send_file(
-            audio_path,
-            mimetype='audio/wav',
-            as_attachment=True,
-            download_name='speech.wav',
-            conditional=True
-        )
+        # An explicit format parameter wins over the Accept header
+        fmt = data.get('format') or request.args.get('format')
+        if fmt is None:
+            fmt = tts_service.negotiate_format(request.accept_mimetypes)
+        try:
+            audio_format = tts_service.get_format(fmt)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Requests that name their segment warm the audio cache for the ones after it
+        session_id = data.get('session_id')
+        segment_index = data.get('segment_index')
+        if session_id and segment_index is not None:
+            _prefetch_after(SessionLocal(), session_id, segment_index, fmt)
+
+        stream = _wants_stream(data)
+        # The cache may evict a file between lookup and send; go round again and synthesize it anew
+        for attempt in range(2):
+            if stream:
+                audio_path = tts_service.get_cached_audio(text, voice_id, fmt)
+                if audio_path is None:
+                    logger.info(f"Streaming text to speech using voice: {voice_id} ({fmt})")
+                    return Response(
+                        tts_service.stream_speech(text, voice_id, fmt),
+                        mimetype=audio_format.mimetype,
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Vary': 'Accept'}
+                    )
+            else:
+                logger.info(f"Converting text to speech using voice: {voice_id} ({fmt})")
+                audio_path = tts_service.convert_to_speech(text, voice_id, fmt=fmt)
+
+            try:
+                # send_file opens the file, so once it returns an eviction cannot cut the response short
+                response = send_file(
+                    audio_path,
+                    mimetype=audio_format.mimetype,
+                    as_attachment=True,
+                    download_name=f"speech{audio_format.extension}",
+                    conditional=True
+                )
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                logger.info(f"Cached audio was evicted before it was sent: {audio_path}")
+                continue
+            logger.info(f"Sent audio file: {audio_path}")
+            response.headers['Vary'] = 'Accept'
+            return response
     except FileNotFoundError as e:
         logger.error(f"Error in text_to_speech: {str(e)}", exc_info=True)
         return jsonify({'error': 'Audio file not found'}), 404
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error in text_to_speech: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/tts/cache', methods=['GET'])
+def audio_cache_stats():
+    """Report audio cache size and hit/miss/eviction counters"""
+    try:
+        return jsonify(tts_service.cache.stats())
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in audio_cache_stats: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/tts/prefetch', methods=['GET'])
+def prefetch_stats():
+    """Report speculative synthesis counters"""
+    try:
+        return jsonify(prefetcher.stats())
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in prefetch_stats: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/retention', methods=['GET'])
+def retention_stats():
+    """Report what the session retention sweeper has expired in this process"""
+    try:
+        return jsonify(retention.stats())
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in retention_stats: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose stage latency histograms and cache/job gauges for Prometheus"""
+    try:
+        return Response(metrics.registry.render(), content_type=metrics.registry.content_type)
+    except Exception as e:
+        logger.error(f"Error in prometheus_metrics: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/ask/cache', methods=['GET'])
+def answer_cache_stats():
+    """Report AI answer cache hit rate and latency saved"""
+    try:
+        return jsonify(ai_assistant.cache.stats())
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in answer_cache_stats: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+# Fields a client may change through PUT /session/<id> and the type each must have
+EDITABLE_SESSION_FIELDS = {
+    'document_name': str,
+    'current_segment': int,
+    'current_position': int,
+    'voice_id': str,
+    'reading_speed': float,
+    'font_size': int,
+    'dark_mode': bool
+}
+MAX_DOCUMENT_NAME = 255
+
+def _session_update(data):
+    """Validate a session update against EDITABLE_SESSION_FIELDS, raising ValueError"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError("Expected a JSON object of session fields")
+    unknown = sorted(key for key in data if key not in EDITABLE_SESSION_FIELDS)
+    if unknown:
+        raise ValueError(f"Fields cannot be changed: {', '.join(unknown)}")
+
+    for key, value in data.items():
+        kind = EDITABLE_SESSION_FIELDS[key]
+        if value is None:
+            raise ValueError(f"{key} cannot be null")
+        if kind is bool:
+            valid = isinstance(value, bool)
+        elif kind is int:
+            valid = isinstance(value, int) and not isinstance(value, bool) and value >= 0
+        elif kind is float:
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+        else:
+            valid = isinstance(value, str) and bool(value.strip()) and len(value) <= MAX_DOCUMENT_NAME
+        if not valid:
+            raise ValueError(f"Invalid value for {key}")
+    return data
+
+def _reach_segment(db_session, document, segment_index):
+    """Extract a lazy document up to segment_index, raising ValueError if it has no such segment"""
+    if not document.materialized:
+        materializer.ensure(document.id, segment_index)
+        db_session.refresh(document)
+    # An empty document still has a position 0
+    if segment_index >= max(document.total_segments or 0, 1):
+        raise ValueError(f"current_segment must be below {document.total_segments}")
+
 @main_bp.route('/session/<session_id>', methods=['GET', 'PUT'])
 def manage_session(session_id):
     """Manage reading session"""
     try:
-        db_session = Session()
+        db_session = SessionLocal()
+
+        if request.method == 'PUT':
+            try:
+                data = _session_update(request.get_json(silent=True))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        if request.method == 'PUT' and progress.accepts(data):
+            # Playback progress is buffered and written behind in batches, without loading the session
+            document_id = db_session.query(ReadingSession.document_id).filter_by(id=session_id).scalar()
+            if document_id is None:
+                return jsonify({'error': 'Session not found'}), 404
+
+            try:
+                if 'current_segment' in data:
+                    _reach_segment(db_session, db_session.get(Document, document_id), data['current_segment'])
+                previous, pending = progress.update(session_id, data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            # Position ticks within a segment need no new prefetch
+            if 'current_segment' in data and (previous or {}).get('current_segment') != data['current_segment']:
+                _prefetch_after(db_session, session_id, pending['current_segment'])
+
+            return jsonify(dict(pending, id=session_id))
+
         session = db_session.query(ReadingSession).filter_by(id=session_id).first()
         
         if not session:
             return jsonify({'error': 'Session not found'}), 404
 
         if request.method == 'GET':
-            return jsonify(session.to_dict())
-        
-        # Update session
-        data = request.json
+            # Opening a session counts as access for retention; written at most once per interval
+            now = datetime.utcnow()
+            if session.last_accessed is None or (now - session.last_accessed).total_seconds() > ACCESS_TOUCH_SECONDS:
+                session.last_accessed = now
+                db_session.commit()
+            return jsonify(progress.overlay(session_id, session.to_dict()))
+
+        if 'current_segment' in data:
+            try:
+                _reach_segment(db_session, session.document, data['current_segment'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        # Update session, writing any buffered progress first so it cannot land later
+        data = dict(progress.pop(session_id) or {}, **data)
         for key, value in data.items():
-            if hasattr(session, key):
-                setattr(session, key, value)
+            setattr(session, key, value)
+        session.last_accessed = datetime.utcnow()
         
         db_session.commit()
         logger.info(f"Updated session: {session_id}")
+
+        if 'current_segment' in data:
+            _prefetch_after(db_session, session_id, session.current_segment)
+
         return jsonify(session.to_dict())
     except Exception as e:
         logger.error(f"Error in manage_session: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/session/<session_id>/segments', methods=['GET'])
+def get_segments(session_id):
+    """Return a page of a session's segments"""
+    try:
+        start = max(0, request.args.get('start', 0, type=int))
+        count = min(max(1, request.args.get('count', UPLOAD_SEGMENT_PAGE, type=int)), MAX_SEGMENT_PAGE)
+
+        db_session = SessionLocal()
+        session = db_session.query(ReadingSession).filter_by(id=session_id).first()
+
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+
+        if not session.materialized and start + count > session.total_segments:
+            materializer.ensure(session.document_id, start + count - 1)
+            db_session.refresh(session.document)
+
+        segments = segment_store.get_range(db_session, session.document_id, start, count)
+        return jsonify({
+            'session_id': session_id,
+            'start': start,
+            'count': len(segments),
+            'total_segments': session.total_segments,
+            'materialized': session.materialized,
+            'segments': [s.to_dict() for s in segments]
+        })
+    except Exception as e:
+        logger.error(f"Error in get_segments: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+def _search_page():
+    """Query text, limit and offset of a search request"""
+    query = (request.args.get('q') or '').strip()
+    limit = min(max(1, request.args.get('limit', SEARCH_PAGE, type=int)), MAX_SEARCH_PAGE)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    return query, limit, offset
+
+@main_bp.route('/session/<session_id>/search', methods=['GET'])
+def search_session(session_id):
+    """Find segments of a session's document matching ?q=, best first"""
+    try:
+        query, limit, offset = _search_page()
+        if not query:
+            return jsonify({'error': 'Missing search query'}), 400
+
+        db_session = SessionLocal()
+        session = db_session.query(ReadingSession).filter_by(id=session_id).first()
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+
+        hits = search.search(db_session, [session.document_id], query, limit, offset)
+        for hit in hits:
+            del hit['document_id']
+        return jsonify({
+            'session_id': session_id,
+            'query': query,
+            'offset': offset,
+            # Segments not yet extracted from a lazily parsed document cannot match
+            'materialized': session.materialized,
+            'hits': hits
+        })
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in search_session: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/search', methods=['GET'])
+def search_sessions():
+    """Find segments matching ?q= across the documents of ?session_id='s owner, best first
+
+    There is no authentication, so a session id is the caller's only
+    credential: the owner is taken from that session, and hits name
+    documents, never other sessions' ids. Clients cannot set user_id (not
+    at upload, not through PUT /session/<id>), so until authentication sets
+    it a session searches only its own document.
+    """
+    try:
+        query, limit, offset = _search_page()
+        session_id = request.args.get('session_id')
+        if not query or not session_id:
+            return jsonify({'error': 'Missing search query or session_id'}), 400
+
+        db_session = SessionLocal()
+        owner = db_session.query(
+            ReadingSession.user_id, ReadingSession.document_id, ReadingSession.document_name
+        ).filter_by(id=session_id).first()
+        if not owner:
+            return jsonify({'error': 'Session not found'}), 404
+
+        names = {owner.document_id: owner.document_name}
+        if owner.user_id:
+            for document_id, document_name in db_session.query(
+                ReadingSession.document_id, ReadingSession.document_name
+            ).filter(ReadingSession.user_id == owner.user_id):
+                names.setdefault(document_id, document_name)
+
+        # Sessions of the same document share its index entries; search each document once
+        hits = search.search(db_session, list(names), query, limit, offset)
+        for hit in hits:
+            hit['document_name'] = names[hit['document_id']]
+        return jsonify({'session_id': session_id, 'query': query, 'offset': offset, 'hits': hits})
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in search_sessions: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/session/<session_id>/segments/status', methods=['GET'])
+def segments_status(session_id):
+    """Report which segments of a lazily materialized session are ready"""
+    try:
+        document_id = SessionLocal().query(ReadingSession.document_id).filter_by(id=session_id).scalar()
+        status = materializer.status(document_id) if document_id else None
+        if status is None:
+            return jsonify({'error': 'Session not found'}), 404
+        return jsonify(dict(status, session_id=session_id))
+    except Exception as e:
+        logger.error(f"Error in segments_status: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+def _bookmark_page():
+    """Read start/count paging arguments for bookmark listings"""
+    start = max(0, request.args.get('start', 0, type=int))
+    count = min(max(1, request.args.get('count', BOOKMARK_PAGE, type=int)), MAX_BOOKMARK_PAGE)
+    return start, count
+
+def _session_exists(db_session, session_id):
+    return db_session.query(ReadingSession.id).filter_by(id=session_id).first() is not None
+
 @main_bp.route('/session/<session_id>/bookmark', methods=['POST', 'GET', 'DELETE'])
 def manage_bookmarks(session_id):
     """Manage bookmarks for a session"""
     try:
-        db_session = Session()
-        session = db_session.query(ReadingSession).filter_by(id=session_id).first()
-        
-        if not session:
+        db_session = SessionLocal()
+        if not _session_exists(db_session, session_id):
             return jsonify({'error': 'Session not found'}), 404
             
         if request.method == 'GET':
-            bookmarks = [b.to_dict() for b in session.bookmarks]
-            return jsonify(bookmarks)
+            start, count = _bookmark_page()
+            bookmarks, total = bookmark_store.list(db_session, session_id, start, count)
+            return jsonify({
+                'session_id': session_id,
+                'start': start,
+                'count': len(bookmarks),
+                'total': total,
+                'bookmarks': [b.to_dict() for b in bookmarks]
+            })
             
         elif request.method == 'POST':
-            data = request.json
-            bookmark = Bookmark(
-                session_id=session_id,
-                segment_index=data.get('segment_index'),
-                position=data.get('position'),
-                note=data.get('note', '')
-            )
-            db_session.add(bookmark)
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Expected a JSON object'}), 400
+            # A {'bookmarks': [...]} body creates them all in one insert
+            bulk = 'bookmarks' in data
+            created = bookmark_store.create_many(db_session, session_id, data['bookmarks'] if bulk else [data])
             db_session.commit()
-            return jsonify(bookmark.to_dict())
+            if bulk:
+                return jsonify({'bookmarks': created}), 201
+            return jsonify(created[0]), 201
             
         elif request.method == 'DELETE':
+            data = request.get_json(silent=True) or {}
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Expected a JSON object'}), 400
+            if 'ids' in data:
+                deleted = bookmark_store.delete_many(db_session, session_id, data['ids'])
+                db_session.commit()
+                return jsonify({'status': 'success', 'deleted': deleted})
+
             bookmark_id = request.args.get('bookmark_id')
-            bookmark = db_session.query(Bookmark).filter_by(id=bookmark_id).first()
-            if bookmark:
-                db_session.delete(bookmark)
+            if not bookmark_id:
+                return jsonify({'error': 'Missing ids or bookmark_id'}), 400
+            if bookmark_store.delete_many(db_session, session_id, [bookmark_id]):
                 db_session.commit()
                 return jsonify({'status': 'success'})
             return jsonify({'error': 'Bookmark not found'}), 404
-            
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error in manage_bookmarks: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/session/<session_id>/offline', methods=['POST'])
+def prepare_offline(session_id):
+    """Queue a background job that prepares audio files for offline use"""
+    try:
+        db_session = SessionLocal()
+        session = db_session.query(ReadingSession).filter_by(id=session_id).first()
+
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+        if not session.materialized:
+            return jsonify({'error': 'Document is still being processed'}), 409
+
+        data = request.get_json(silent=True) or {}
+        fmt = data.get('format') or request.args.get('format')
+        try:
+            job = audio_jobs.enqueue(session_id, fmt)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(job), 202
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in prepare_offline: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/session/<session_id>/offline/<job_id>', methods=['GET'])
+def offline_status(session_id, job_id):
+    """Report progress of an offline audio job"""
+    try:
+        status = audio_jobs.status(job_id)
+        if status is None or status['session_id'] != session_id:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(status)
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in offline_status: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/session/<session_id>/offline/<job_id>/retry', methods=['POST'])
+def retry_offline(session_id, job_id):
+    """Re-run the failed segments of an offline audio job"""
+    try:
+        status = audio_jobs.status(job_id)
+        if status is None or status['session_id'] != session_id:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(audio_jobs.retry(job_id)), 202
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in retry_offline: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @main_bp.route('/bookmarks', methods=['POST'])
 def add_bookmark():
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object'}), 400
         session_id = data.get('sessionId')
-        segment = data.get('segment')
-        note = data.get('note')
 
-        if not all([session_id, segment]):
+        if 'bookmarks' in data:
+            items = data['bookmarks']
+        else:
+            segment_index = data.get('segmentIndex', data.get('segment'))
+            if segment_index is None:
+                return jsonify({'error': 'Missing required fields'}), 400
+            items = [{'segment_index': segment_index, 'position': data.get('position'), 'note': data.get('note')}]
+
+        if not session_id:
             return jsonify({'error': 'Missing required fields'}), 400
 
-        # Add bookmark logic here
-        bookmark = {
-            'id': str(uuid.uuid4()),
-            'session_id': session_id,
-            'segment': segment,
-            'note': note,
-            'created_at': datetime.now().isoformat()
-        }
-        
-        return jsonify(bookmark), 201
+        db_session = SessionLocal()
+        if not _session_exists(db_session, session_id):
+            return jsonify({'error': 'Session not found'}), 404
+
+        created = bookmark_store.create_many(db_session, session_id, items)
+        db_session.commit()
 
+        if 'bookmarks' in data:
+            return jsonify({'bookmarks': created}), 201
+        return jsonify(created[0]), 201
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error adding bookmark: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
@@ -216,9 +841,11 @@ def add_bookmark():
 @main_bp.route('/bookmarks/<session_id>', methods=['GET'])
 def get_bookmarks(session_id):
     try:
-        # Get bookmarks logic here
-        bookmarks = []  # Replace with actual database query
-        return jsonify(bookmarks)
+        start, count = _bookmark_page()
+        bookmarks, total = bookmark_store.list(SessionLocal(), session_id, start, count)
+        response = jsonify([b.to_dict() for b in bookmarks])
+        response.headers['X-Total-Count'] = str(total)
+        return response
 
     except Exception as e:
         logger.error(f"Error getting bookmarks: {str(e)}", exc_info=True)
@@ -227,31 +854,101 @@ def get_bookmarks(session_id):
 @main_bp.route('/bookmarks/<bookmark_id>', methods=['DELETE'])
 def delete_bookmark(bookmark_id):
     try:
-        # Delete bookmark logic here
+        db_session = SessionLocal()
+        deleted = db_session.query(Bookmark).filter_by(id=bookmark_id).delete()
+        db_session.commit()
+        if not deleted:
+            return jsonify({'error': 'Bookmark not found'}), 404
         return '', 204
 
     except Exception as e:
         logger.error(f"Error deleting bookmark: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+def _ask_context(data):
+    """Return (question, context) for an /ask body, or an error response"""
+    if not isinstance(data, dict):
+        return None, (jsonify({'error': 'Request body must be a JSON object'}), 400)
+    question = data.get('question')
+    context = data.get('context')
+    session_id = data.get('sessionId')
+
+    if not all([question, session_id]):
+        return None, (jsonify({'error': 'Missing required parameters'}), 400)
+
+    if not context:
+        # Retrieve the relevant segments server-side instead of trusting a client-sent blob
+        db_session = SessionLocal()
+        session = db_session.query(ReadingSession).filter_by(id=session_id).first()
+        if not session:
+            return None, (jsonify({'error': 'Session not found'}), 404)
+        current_segment = data.get('currentSegment')
+        if current_segment is None:
+            current_segment = (progress.pending(session_id) or {}).get(
+                'current_segment', session.current_segment
+            )
+        try:
+            current_segment = int(current_segment or 0)
+        except (TypeError, ValueError):
+            return None, (jsonify({'error': 'currentSegment must be an integer'}), 400)
+        context = retrieval.build_context(
+            db_session, session.document_id, session.total_segments, question, current_segment
+        )
+    return (question, context), None
+
+def _sse(data, event=None):
+    """Format one Server-Sent Events message"""
+    message = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{message}" if event else message
+
 @main_bp.route('/ask', methods=['POST'])
 def ask_question():
     try:
-        data = request.get_json()
-        question = data.get('question')
-        context = data.get('context')
-        session_id = data.get('sessionId')
+        prompt, error = _ask_context(request.get_json(silent=True))
+        if error:
+            return error
 
-        if not all([question, context, session_id]):
-            return jsonify({'error': 'Missing required parameters'}), 400
-
-        # Run the async function in a synchronous context
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        response = loop.run_until_complete(ai_assistant.ask_question(question, context))
-        loop.close()
+        # Run on the shared event loop rather than a new loop per request
+        response = async_runner.run(ai_assistant.ask_question(*prompt))
 
         return jsonify({'response': response})
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error in ask_question: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Stream the answer's tokens as Server-Sent Events"""
+    try:
+        prompt, error = _ask_context(request.get_json(silent=True))
+        if error:
+            return error
+
+        def generate():
+            # Closing this generator (client disconnect) cancels the upstream completion
+            tokens = []
+            try:
+                for token in async_runner.iterate(lambda: ai_assistant.stream_answer(*prompt)):
+                    tokens.append(token)
+                    yield _sse({'token': token})
+                yield _sse({'response': ''.join(tokens)}, event='done')
+            except Exception as e:
+                logger.error(f"Error in ask_question_stream: {str(e)}", exc_info=True)
+                yield _sse({'error': str(e)}, event='error')
+
+        # Fail before the stream starts if the assistant is switched off
+        services.get('ai_assistant')
+        return Response(
+            generate(),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except ServiceUnavailable as e:
+        logger.warning(str(e))
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in ask_question_stream: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
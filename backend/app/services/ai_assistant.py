@@ -1,8 +1,11 @@
 import os
+import time
 import openai
 from dotenv import load_dotenv
 import logging
-from typing import Optional
+from typing import AsyncIterator, Optional
+from .answer_cache import AnswerCache
+from .metrics import AI_ANSWER_SECONDS
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -17,28 +20,80 @@ class AIAssistant:
             
         # Set the API key directly
         openai.api_key = self.api_key
+        # Point at a compatible server, e.g. tools/fake_openai.py for local testing
+        openai.api_base = os.getenv('OPENAI_API_BASE', openai.api_base)
         self.model = "gpt-3.5-turbo"
+        self.cache = AnswerCache()
         
     async def ask_question(self, question: str, context: str) -> str:
         """
         Ask a question about the document context
         """
+        started = time.monotonic()
+        cache_key = self.cache.make_key(self.model, question, context)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Answer cache hit for question: {question}")
+            AI_ANSWER_SECONDS.observe(time.monotonic() - started, mode='ask', outcome='hit')
+            return cached
+
         try:
             logger.info(f"Processing question: {question}")
             
-            response = await openai.ChatCompletion.create(
+            response = await openai.ChatCompletion.acreate(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions about documents."},
-                    {"role": "user", "content": f"Context: {context}\n\nQuestion: {question}"}
-                ]
+                messages=self._messages(question, context)
             )
             answer = response.choices[0].message['content']
             logger.info(f"Generated answer: {answer}")
-            
+
+            # Only real answers are cached; the error fallback below never is
+            self.cache.put(cache_key, answer, time.monotonic() - started)
+            AI_ANSWER_SECONDS.observe(time.monotonic() - started, mode='ask', outcome='miss')
             return answer
             
         except Exception as e:
             error_msg = f"Error getting AI response: {str(e)}"
             logger.error(error_msg, exc_info=True)
+            AI_ANSWER_SECONDS.observe(time.monotonic() - started, mode='ask', outcome='error')
             return "Sorry, I encountered an error. Please try again."
+
+    async def stream_answer(self, question: str, context: str) -> AsyncIterator[str]:
+        """
+        Yield the answer's tokens as the model produces them
+        """
+        started = time.monotonic()
+        cache_key = self.cache.make_key(self.model, question, context)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Answer cache hit for question: {question}")
+            AI_ANSWER_SECONDS.observe(time.monotonic() - started, mode='stream', outcome='hit')
+            yield cached
+            return
+
+        logger.info(f"Streaming answer to question: {question}")
+        response = await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=self._messages(question, context),
+            stream=True
+        )
+        tokens = []
+        try:
+            async for chunk in response:
+                token = chunk.choices[0].delta.get('content')
+                if token:
+                    tokens.append(token)
+                    yield token
+        finally:
+            # Closing the response drops the upstream connection if the client went away mid-answer
+            await response.aclose()
+
+        # Reached only when the whole answer arrived
+        self.cache.put(cache_key, ''.join(tokens), time.monotonic() - started)
+        AI_ANSWER_SECONDS.observe(time.monotonic() - started, mode='stream', outcome='miss')
+
+    def _messages(self, question: str, context: str):
+        return [
+            {"role": "system", "content": "You are a helpful assistant that answers questions about documents."},
+            {"role": "user", "content": f"Context: {context}\n\nQuestion: {question}"}
+        ]
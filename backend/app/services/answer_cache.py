@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+def normalize_question(question: str) -> str:
+    """Fold case, whitespace and trailing punctuation so near-identical questions share a key"""
+    return _TRAILING_PUNCTUATION.sub('', _WHITESPACE.sub(' ', question.strip().lower()))
+
+class _Answer:
+    __slots__ = ('answer', 'created_at', 'latency')
+
+    def __init__(self, answer: str, created_at: float, latency: float):
+        self.answer = answer
+        self.created_at = created_at
+        self.latency = latency  # Seconds the remote call took; saved again on every hit
+
+class AnswerCache:
+    """TTL'd LRU cache of assistant answers with an optional SQLite backing store
+
+    Keys combine the model, the normalized question and a hash of the
+    context. Up to max_entries answers are held in memory in recency order;
+    with a db_path, answers are also written to SQLite so they survive
+    restarts and are shared by worker processes. Every prune_every inserts
+    the store drops expired answers and then the oldest ones beyond
+    max_stored_entries.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, db_path: str = None,
+                 max_stored_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv('AI_CACHE_MAX_ENTRIES', '1000'))
+        self.max_stored_entries = max_stored_entries or int(os.getenv('AI_CACHE_DB_MAX_ENTRIES', '10000'))
+        self.prune_every = 100
+        self.ttl = ttl if ttl is not None else float(os.getenv('AI_CACHE_TTL', str(24 * 3600)))
+        db_path = db_path if db_path is not None else os.getenv('AI_CACHE_DB', '')
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        self._puts = 0
+
+        self._entries: 'OrderedDict[str, _Answer]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS answers ('
+                'key TEXT PRIMARY KEY, answer TEXT NOT NULL, '
+                'created_at REAL NOT NULL, latency REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS answers_created_at ON answers (created_at)')
+            self._db.commit()
+            self._prune()
+
+    @staticmethod
+    def make_key(model: str, question: str, context: str) -> str:
+        context_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()
+        raw = f"{model}\0{normalize_question(question)}\0{context_hash}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a fresh cached answer, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    'SELECT answer, created_at, latency FROM answers WHERE key = ?', (key,)
+                ).fetchone()
+                if row:
+                    entry = self._insert(key, _Answer(*row))
+
+            if entry is not None and entry.created_at < now - self.ttl:
+                self._delete(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry.latency
+            return entry.answer
+
+    def put(self, key: str, answer: str, latency: float):
+        """Store an answer and how long it took to produce"""
+        entry = _Answer(answer, time.time(), latency)
+        with self._lock:
+            self._insert(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)',
+                    (key, entry.answer, entry.created_at, entry.latency)
+                )
+                self._db.commit()
+                self._puts += 1
+                if self._puts % self.prune_every == 0:
+                    self._prune()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'persistent': self._db is not None,
+                'max_stored_entries': self.max_stored_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'saved_seconds': round(self.saved_seconds, 3)
+            }
+
+    def _insert(self, key: str, entry: _Answer) -> _Answer:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def _prune(self):
+        """Drop expired answers from the store, then the oldest beyond max_stored_entries"""
+        expired = self._db.execute('DELETE FROM answers WHERE created_at < ?', (time.time() - self.ttl,)).rowcount
+        excess = self._db.execute('SELECT COUNT(*) FROM answers').fetchone()[0] - self.max_stored_entries
+        if excess > 0:
+            self._db.execute(
+                'DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY created_at LIMIT ?)', (excess,)
+            )
+        self._db.commit()
+        if expired or excess > 0:
+            logger.debug(f"Pruned {expired} expired and {max(excess, 0)} excess stored answers")
+
+    def _delete(self, key: str):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute('DELETE FROM answers WHERE key = ?', (key,))
+            self._db.commit()
@@ -0,0 +1,69 @@
+import queue
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+class AsyncRunner:
+    """One long-lived event loop on a daemon thread shared by all request threads
+
+    Coroutines are submitted with run(); async generators are bridged to
+    plain iterators with iterate(), which cancels the producer as soon as
+    the consumer stops (e.g. the client of a streaming response went away).
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='async-runner', daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout: float = None):
+        """Run a coroutine on the shared loop and wait for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, agen_factory: Callable[[], AsyncIterator]) -> Iterator:
+        """Yield the items of an async generator from a synchronous caller"""
+        items = queue.Queue()
+
+        async def pump():
+            agen = agen_factory()
+            try:
+                async for item in agen:
+                    items.put((item, None))
+                items.put((_DONE, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                items.put((_DONE, e))
+            finally:
+                # Releases whatever the generator holds open, such as the upstream HTTP response
+                await agen.aclose()
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        finished = False
+        try:
+            while True:
+                item, error = items.get()
+                if item is _DONE:
+                    finished = True
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            if not finished and not future.done():
+                logger.info("Stream consumer went away; cancelling producer")
+                future.cancel()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
@@ -0,0 +1,263 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'index.sqlite3'
+
+# Keep usage.bytes equal to SUM(entries.size). Entries are never written with
+# INSERT OR REPLACE, whose implicit delete would not fire the delete trigger.
+USAGE_TRIGGERS = [
+    ('entries_usage_insert', 'INSERT', 'new.size'),
+    ('entries_usage_delete', 'DELETE', '-old.size'),
+    ('entries_usage_update', 'UPDATE OF size', 'new.size - old.size')
+]
+
+UPSERT_ENTRY = (
+    'INSERT INTO entries VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+    'size = excluded.size, last_access = excluded.last_access, hits = excluded.hits'
+)
+
+class AudioCache:
+    """Byte-bounded audio file cache shared by every worker process using cache_dir
+
+    The SQLite index next to the audio (key, size, last access, hit count)
+    is the single record of what the cache holds, so the byte budget
+    covers all processes together: usage is a running SUM(size) kept by
+    triggers on the index, and eviction takes victims in policy order
+    (LRU: last_access; LFU: hits, then last_access) through an index, a
+    batch at a time. Accesses are
+    buffered in memory and written back in batches; hit counts are added
+    to the stored ones so every process's hits count.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = None, policy: str = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes or int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+        self.policy = (policy or os.getenv('AUDIO_CACHE_POLICY', 'lru')).lower()
+        if self.policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unsupported audio cache policy: {self.policy}")
+        self._order = 'hits, last_access' if self.policy == 'lfu' else 'last_access'
+        # Evict down to this fraction of the budget so evictions are batched
+        self.low_watermark = int(self.max_bytes * 0.9)
+        self.flush_every = 100
+
+        # Counters for this process
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> [last_access, hits] not yet written to the index
+        self._pending_access: Dict[str, list] = {}
+        self._lock = threading.RLock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Autocommit; multi-statement changes take the write lock with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, INDEX_FILENAME), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+            'last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_lfu ON entries (hits, last_access)')
+        with self._transaction():
+            # Total bytes, updated in the same transaction as every entry change
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)'
+            )
+            self._db.execute('INSERT OR IGNORE INTO usage SELECT 0, COALESCE(SUM(size), 0) FROM entries')
+            for name, action, change in USAGE_TRIGGERS:
+                self._db.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {name} AFTER {action} ON entries '
+                    f'BEGIN UPDATE usage SET bytes = bytes + {change}; END'
+                )
+        if self._db.execute('SELECT 1 FROM entries LIMIT 1').fetchone() is None:
+            self._scan()
+
+    def path_for(self, key: str) -> str:
+        """Absolute path an entry is (or will be) stored at"""
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path for key and record the access, or None on a miss"""
+        path = self.path_for(key)
+        with self._lock:
+            # The file is the truth: another process may have written or evicted it
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            access = self._pending_access.setdefault(key, [0.0, 0])
+            access[0] = time.time()
+            access[1] += 1
+            if len(self._pending_access) >= self.flush_every:
+                self.flush()
+            return path
+
+    def contains(self, key: str) -> bool:
+        """Check for key without counting a hit or miss"""
+        return os.path.exists(self.path_for(key))
+
+    def put(self, key: str, tmp_path: str) -> str:
+        """Atomically move a finished temp file into the cache under key"""
+        path = self.path_for(key)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._pending_access.pop(key, None)
+            with self._transaction():
+                self._db.execute(UPSERT_ENTRY, (key, size, time.time(), 0))
+                victims = self._evict(keep=key)
+        for victim in victims:
+            self._delete_file(victim)
+            logger.info(f"Evicted cached audio: {victim}")
+        return path
+
+    def discard(self, key: str):
+        """Remove key and its file if present"""
+        with self._lock:
+            self._pending_access.pop(key, None)
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._delete_file(key)
+
+    def release(self, key: str, idle_since: float) -> bool:
+        """Remove key unless it has been read at or after idle_since (epoch seconds)"""
+        with self._lock:
+            self.flush()
+            row = self._db.execute('SELECT last_access FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[0] >= idle_since:
+                return False
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._delete_file(key)
+            return True
+
+    def expire(self, max_age_seconds: float):
+        """Remove entries not accessed within max_age_seconds"""
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            self.flush()
+            with self._transaction():
+                expired = [key for (key,) in self._db.execute(
+                    'SELECT key FROM entries WHERE last_access < ?', (cutoff,)
+                )]
+                self._db.execute('DELETE FROM entries WHERE last_access < ?', (cutoff,))
+        for key in expired:
+            self._delete_file(key)
+        return len(expired)
+
+    def flush(self):
+        """Write buffered access times and hit counts to the index"""
+        with self._lock:
+            if not self._pending_access:
+                return
+            rows = []
+            for key, (last_access, hits) in self._pending_access.items():
+                try:
+                    size = os.path.getsize(self.path_for(key))
+                except FileNotFoundError:
+                    continue
+                rows.append((key, size, last_access, hits))
+            # Also adopts files another process wrote but never indexed (e.g. it crashed in between)
+            with self._transaction():
+                self._db.executemany(
+                    'INSERT INTO entries VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                    'last_access = max(last_access, excluded.last_access), hits = hits + excluded.hits',
+                    rows
+                )
+            self._pending_access.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            total_bytes = self._usage()
+            lookups = self.hits + self.misses
+            return {
+                'policy': self.policy,
+                'entries': entries,
+                'bytes': total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements atomically, holding the index's write lock across processes"""
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def _scan(self):
+        """Index files cached before the index existed"""
+        rows = []
+        with os.scandir(self.cache_dir) as it:
+            for dirent in it:
+                name = dirent.name
+                if not dirent.is_file() or name.startswith(INDEX_FILENAME) or name.endswith('.part'):
+                    continue
+                stat = dirent.stat()
+                rows.append((name, stat.st_size, stat.st_mtime, 0))
+        if rows:
+            with self._transaction():
+                self._db.executemany(UPSERT_ENTRY, rows)
+        logger.info(f"Indexed {len(rows)} existing audio cache files")
+
+    def _evict(self, keep: str, batch: int = 64) -> List[str]:
+        """Drop index rows in policy order until usage is under the low watermark
+
+        Runs inside the caller's transaction; returns the keys whose files
+        the caller deletes once it has committed.
+        """
+        total = self._usage()
+        if total <= self.max_bytes:
+            return []
+        # Order victims by accesses made here too, not only those already written back
+        self._db.executemany(
+            'UPDATE entries SET last_access = max(last_access, ?), hits = hits + ? WHERE key = ?',
+            [(last_access, hits, key) for key, (last_access, hits) in self._pending_access.items()]
+        )
+        self._pending_access.clear()
+
+        excess = total - self.low_watermark
+        victims = []
+        while excess > 0:
+            rows = self._db.execute(
+                f'SELECT key, size FROM entries WHERE key != ? ORDER BY {self._order} LIMIT ?', (keep, batch)
+            ).fetchall()
+            if not rows:
+                break
+            chosen = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                chosen.append((key,))
+                excess -= size
+            self._db.executemany('DELETE FROM entries WHERE key = ?', chosen)
+            victims.extend(key for (key,) in chosen)
+        self.evictions += len(victims)
+        return victims
+
+    def _usage(self) -> int:
+        return self._db.execute('SELECT bytes FROM usage').fetchone()[0]
+
+    def _delete_file(self, key: str):
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
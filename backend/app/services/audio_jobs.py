@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import and_, insert, or_, update
+
+from ..models.session import AudioJob, AudioJobSegment, ReadingSession, Segment
+
+logger = logging.getLogger(__name__)
+
+# A queued or running job not touched for this long belongs to a worker that died
+JOB_LEASE_SECONDS = float(os.getenv('OFFLINE_AUDIO_JOB_LEASE', '300'))
+ACTIVE_STATUSES = ('queued', 'running')
+
+def live_job_filter(now: datetime = None):
+    """SQL condition for jobs that are queued or running and still within their lease"""
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=JOB_LEASE_SECONDS)
+    return and_(AudioJob.status.in_(ACTIVE_STATUSES), AudioJob.updated_at >= cutoff)
+
+class OfflineAudioJobRunner:
+    """Prepare a session's offline audio in the background with bounded concurrency
+
+    Uncached segments are grouped into consecutive batches (TTS_BATCH_SIZE)
+    so each synthesis request covers several segments. A running job
+    refreshes updated_at at least every lease / 3 seconds; a job whose
+    lease ran out (its worker died) is resumed from its pending segments
+    by the next enqueue or retry.
+    """
+
+    def __init__(self, tts_service, session_factory, max_concurrency=None, max_jobs=None):
+        self.tts_service = tts_service
+        self.session_factory = session_factory
+        self.max_concurrency = max_concurrency or int(os.getenv('OFFLINE_AUDIO_CONCURRENCY', '4'))
+        # Segment results are committed in batches rather than one commit per segment
+        self.progress_batch = int(os.getenv('OFFLINE_AUDIO_PROGRESS_BATCH', '10'))
+        self._jobs = ThreadPoolExecutor(
+            max_workers=max_jobs or int(os.getenv('OFFLINE_AUDIO_MAX_JOBS', '2')),
+            thread_name_prefix='audio-job'
+        )
+        self._synth = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='audio-synth')
+        self.heartbeat_interval = JOB_LEASE_SECONDS / 3
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def enqueue(self, session_id: str, fmt: str = None) -> Dict:
+        """Create a job for every segment of the session and start it"""
+        fmt = self.tts_service.get_format(fmt or self.tts_service.offline_format).name
+        db_session = self.session_factory()
+        try:
+            session = db_session.query(ReadingSession).filter_by(id=session_id).one()
+
+            # Reuse a job that is already preparing this session, voice and format
+            existing = db_session.query(AudioJob).filter(
+                AudioJob.session_id == session_id,
+                AudioJob.voice_id == session.voice_id,
+                AudioJob.audio_format == fmt,
+                AudioJob.status.in_(ACTIVE_STATUSES)
+            ).order_by(AudioJob.updated_at.desc()).first()
+            if existing:
+                if existing.updated_at < datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS):
+                    logger.info(f"Resuming offline audio job {existing.id} abandoned by its worker")
+                    self._submit(existing.id)
+                return existing.to_dict()
+
+            job = AudioJob(
+                session_id=session_id,
+                voice_id=session.voice_id,
+                audio_format=fmt,
+                total_segments=session.total_segments
+            )
+            db_session.add(job)
+            db_session.flush()
+            if session.total_segments:
+                db_session.execute(insert(AudioJobSegment), [
+                    {'job_id': job.id, 'segment_index': i}
+                    for i in range(session.total_segments)
+                ])
+            db_session.commit()
+
+            logger.info(f"Queued offline audio job {job.id} for session {session_id}")
+            self._submit(job.id)
+            return job.to_dict()
+        finally:
+            db_session.close()
+
+    def retry(self, job_id: str) -> Optional[Dict]:
+        """Reset a finished job's failed segments and run it again"""
+        db_session = self.session_factory()
+        try:
+            job = db_session.query(AudioJob).filter_by(id=job_id).first()
+            if not job:
+                return None
+            if db_session.query(AudioJob.id).filter(AudioJob.id == job_id, live_job_filter()).first():
+                return job.to_dict()
+
+            db_session.execute(
+                update(AudioJobSegment)
+                .where(AudioJobSegment.job_id == job_id, AudioJobSegment.status == 'failed')
+                .values(status='pending', error=None)
+            )
+            job.status = 'queued'
+            job.failed_segments = 0
+            job.updated_at = datetime.utcnow()
+            db_session.commit()
+
+            logger.info(f"Retrying offline audio job {job_id}")
+            self._submit(job_id)
+            return job.to_dict()
+        finally:
+            db_session.close()
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Return job progress including the indexes of failed segments"""
+        db_session = self.session_factory()
+        try:
+            job = db_session.query(AudioJob).filter_by(id=job_id).first()
+            if not job:
+                return None
+            result = job.to_dict()
+            failed = db_session.query(AudioJobSegment.segment_index).filter_by(
+                job_id=job_id, status='failed'
+            ).order_by(AudioJobSegment.segment_index).all()
+            result['failed_segments'] = [row.segment_index for row in failed]
+            return result
+        finally:
+            db_session.close()
+
+    def in_flight(self) -> int:
+        """Number of jobs currently queued or running in this process"""
+        with self._lock:
+            return len(self._active)
+
+    def _submit(self, job_id: str):
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        self._jobs.submit(self._run, job_id)
+
+    def _run(self, job_id: str):
+        """Coordinate one job: fan segments out to the synth pool and record results"""
+        db_session = self.session_factory()
+        try:
+            # Claim the job; another worker may hold a live lease on it
+            now = datetime.utcnow()
+            claimed = db_session.query(AudioJob).filter(
+                AudioJob.id == job_id,
+                or_(AudioJob.status == 'queued', ~live_job_filter(now))
+            ).update({'status': 'running', 'updated_at': now}, synchronize_session=False)
+            db_session.commit()
+            if not claimed:
+                logger.info(f"Offline audio job {job_id} is already running elsewhere")
+                return
+            job = db_session.query(AudioJob).filter_by(id=job_id).one()
+            heartbeat = time.monotonic()
+
+            document_id = db_session.query(ReadingSession.document_id).filter_by(id=job.session_id).scalar()
+            pending = db_session.query(Segment.segment_index, Segment.text).join(
+                AudioJobSegment,
+                (AudioJobSegment.segment_index == Segment.segment_index)
+                & (AudioJobSegment.job_id == job_id)
+            ).filter(
+                Segment.document_id == document_id,
+                AudioJobSegment.status == 'pending'
+            ).order_by(Segment.segment_index).all()
+
+            results = []
+            in_flight = {}
+            batches = self.tts_service.iter_batches(
+                self._uncached(pending, job.voice_id, job.audio_format, results), text=lambda item: item[1]
+            )
+            while True:
+                # Keep at most max_concurrency synthesis requests in flight for this job
+                for batch in batches:
+                    future = self._synth.submit(
+                        self.tts_service.convert_batch, [text for _, text in batch],
+                        job.voice_id, job.audio_format
+                    )
+                    in_flight[future] = [index for index, _ in batch]
+                    if len(in_flight) >= self.max_concurrency:
+                        break
+
+                if len(results) >= self.progress_batch or (results and not in_flight):
+                    self._record(db_session, job, results)
+                    results = []
+                    heartbeat = time.monotonic()
+                elif time.monotonic() - heartbeat >= self.heartbeat_interval:
+                    # Renew the lease while slow syntheses are still running
+                    job.updated_at = datetime.utcnow()
+                    db_session.commit()
+                    heartbeat = time.monotonic()
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, timeout=self.heartbeat_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    indexes = in_flight.pop(future)
+                    try:
+                        results.extend((index, path, None) for index, path in zip(indexes, future.result()))
+                    except Exception as e:
+                        logger.error(f"Job {job_id} failed on segments {indexes}: {str(e)}")
+                        results.extend((index, None, str(e)) for index in indexes)
+
+            job.status = 'failed' if job.failed_segments else 'completed'
+            job.updated_at = datetime.utcnow()
+            if job.status == 'completed':
+                db_session.query(ReadingSession).filter_by(id=job.session_id).update(
+                    {'offline_mode': True}
+                )
+            db_session.commit()
+            logger.info(f"Offline audio job {job_id} {job.status}: "
+                        f"{job.completed_segments}/{job.total_segments} segments")
+        except Exception as e:
+            logger.error(f"Error running offline audio job {job_id}: {str(e)}", exc_info=True)
+            db_session.rollback()
+            db_session.query(AudioJob).filter_by(id=job_id).update(
+                {'status': 'failed', 'updated_at': datetime.utcnow()}
+            )
+            db_session.commit()
+        finally:
+            db_session.close()
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _uncached(self, pending, voice_id, fmt, results):
+        """Yield (index, text) pairs still needing synthesis; cached ones go straight to results"""
+        for index, text in pending:
+            cached = self.tts_service.get_cached_audio(text, voice_id, fmt)
+            if cached:
+                results.append((index, cached, None))
+            else:
+                yield index, text
+
+    def _record(self, db_session, job, results):
+        """Persist a batch of segment results and expose finished audio on the session"""
+        succeeded = [(index, path) for index, path, error in results if error is None]
+        failed = [(index, error) for index, path, error in results if error is not None]
+
+        for index, path in succeeded:
+            db_session.query(AudioJobSegment).filter_by(job_id=job.id, segment_index=index).update(
+                {'status': 'done', 'audio_path': path}
+            )
+        for index, error in failed:
+            db_session.query(AudioJobSegment).filter_by(job_id=job.id, segment_index=index).update(
+                {'status': 'failed', 'error': error}
+            )
+
+        if succeeded:
+            session = db_session.query(ReadingSession).filter_by(id=job.session_id).one()
+            cached = dict(session.cached_audio_paths or {})
+            cached.update({str(index): path for index, path in succeeded})
+            session.cached_audio_paths = cached
+
+        job.completed_segments += len(succeeded)
+        job.failed_segments += len(failed)
+        job.updated_at = datetime.utcnow()
+        db_session.commit()
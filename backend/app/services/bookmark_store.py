@@ -0,0 +1,101 @@
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, func, insert
+
+from ..models.session import Bookmark
+
+logger = logging.getLogger(__name__)
+
+# Ids per DELETE statement, well under SQLite's bound-parameter limit
+DELETE_CHUNK = 500
+
+def _is_index(value) -> bool:
+    # bool is an int subclass, but true is not a position
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+class BookmarkStore:
+    """Create, page through and delete a session's rows in the bookmarks table
+
+    Listing, counting and deleting all go through the (session_id,
+    segment_index, position) index, so they stay cheap however many
+    bookmarks a session has.
+    """
+
+    def create_many(self, db_session, session_id: str, items: List[Dict]) -> List[Dict]:
+        """Insert bookmarks in one statement and return them; the caller commits
+
+        Raises ValueError, before writing anything, unless items is a list of
+        objects with a non-negative int segment_index, an optional
+        non-negative int position and an optional string note.
+        """
+        if not isinstance(items, list):
+            raise ValueError("bookmarks must be a list")
+        now = datetime.utcnow()
+        rows = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError("Each bookmark must be an object")
+            segment_index = item.get('segment_index')
+            position = item.get('position')
+            note = item.get('note')
+            if not _is_index(segment_index):
+                raise ValueError("Each bookmark needs a non-negative integer segment_index")
+            if position is not None and not _is_index(position):
+                raise ValueError("position must be a non-negative integer")
+            if note is not None and not isinstance(note, str):
+                raise ValueError("note must be a string")
+            rows.append({
+                'id': str(uuid.uuid4()),
+                'session_id': session_id,
+                'segment_index': segment_index,
+                'position': position or 0,
+                'note': note or '',
+                'created_at': now
+            })
+
+        if rows:
+            db_session.execute(insert(Bookmark), rows)
+        return [dict(row, created_at=now.isoformat()) for row in rows]
+
+    def list(self, db_session, session_id: str, start: int, count: int) -> Tuple[List[Bookmark], int]:
+        """Return up to count bookmarks in reading order from offset start, and the total"""
+        total = db_session.query(func.count(Bookmark.id)).filter(
+            Bookmark.session_id == session_id
+        ).scalar()
+        bookmarks = db_session.query(Bookmark).filter(
+            Bookmark.session_id == session_id
+        ).order_by(Bookmark.segment_index, Bookmark.position).offset(start).limit(count).all()
+        return bookmarks, total
+
+    def delete_many(self, db_session, session_id: str, bookmark_ids: List[str]) -> int:
+        """Delete the given bookmarks of a session, returning how many existed; the caller commits"""
+        if not isinstance(bookmark_ids, list) or not all(isinstance(i, str) for i in bookmark_ids):
+            raise ValueError("ids must be a list of bookmark ids")
+        deleted = 0
+        for i in range(0, len(bookmark_ids), DELETE_CHUNK):
+            result = db_session.execute(
+                delete(Bookmark).where(
+                    Bookmark.session_id == session_id,
+                    Bookmark.id.in_(bookmark_ids[i:i + DELETE_CHUNK])
+                )
+            )
+            deleted += result.rowcount
+        return deleted
+
+    def delete_session(self, db_session, session_id: str) -> int:
+        """Delete every bookmark of a session; the caller commits"""
+        result = db_session.execute(delete(Bookmark).where(Bookmark.session_id == session_id))
+        return result.rowcount
+
+    def delete_sessions(self, db_session, session_ids: List[str]) -> int:
+        """Delete every bookmark of several sessions; the caller commits"""
+        deleted = 0
+        for i in range(0, len(session_ids), DELETE_CHUNK):
+            result = db_session.execute(
+                delete(Bookmark).where(Bookmark.session_id.in_(session_ids[i:i + DELETE_CHUNK]))
+            )
+            deleted += result.rowcount
+        return deleted
@@ -0,0 +1,121 @@
+import os
+import uuid
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import delete
+
+from ..models.session import Document, Segment
+
+logger = logging.getLogger(__name__)
+
+class DocumentStore:
+    """Content-addressed storage of uploaded documents, shared between sessions
+
+    Uploads are hashed as they are spooled (or, for other streams, while
+    they are copied to disk), so a document whose bytes were seen before
+    is found without parsing or storing it again. Each session
+    holds one reference; a document's segments and file are removed when
+    the last reference is released.
+    """
+
+    def __init__(self, text_parser, upload_dir: str = None, chunk_size: int = 1024 * 1024):
+        self.text_parser = text_parser
+        self.upload_dir = os.path.abspath(upload_dir or os.getenv(
+            'UPLOAD_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'uploads')
+        ))
+        self.chunk_size = chunk_size
+
+        if not os.path.exists(self.upload_dir):
+            os.makedirs(self.upload_dir, exist_ok=True)
+            logger.info(f"Created upload directory: {self.upload_dir}")
+
+    def save_upload(self, file) -> Tuple[str, str, int]:
+        """Store an upload under its content hash; returns (content_hash, path, size)
+
+        A stream that was hashed while it was spooled (HashingSpool) is
+        not hashed again, and not copied at all if those bytes are stored.
+        """
+        ext = self.text_parser.get_format(file.filename)
+        stream = file.stream
+        spooled = getattr(stream, 'hasher', None)
+        if spooled is not None:
+            content_hash, size = spooled.hexdigest(), stream.bytes_written
+            path = os.path.join(self.upload_dir, f"{content_hash}{ext}")
+            if os.path.exists(path):
+                return content_hash, path, size
+
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.upload_dir, f".{uuid.uuid4().hex}.part")
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    if spooled is None:
+                        hasher.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+
+            content_hash = spooled.hexdigest() if spooled is not None else hasher.hexdigest()
+            path = os.path.join(self.upload_dir, f"{content_hash}{ext}")
+            # Same name means same bytes, so an existing copy can simply be kept
+            os.replace(tmp_path, path)
+            return content_hash, path, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def find(self, db_session, content_hash: str) -> Optional[Document]:
+        return db_session.query(Document).filter_by(content_hash=content_hash).first()
+
+    def create(self, db_session, content_hash: str, ext: str, size: int, path: str,
+               materialized: bool = True) -> Document:
+        """Add a document row with no references yet; the caller commits"""
+        document = Document(content_hash=content_hash, format=ext, size=size,
+                            path=path, materialized=materialized)
+        db_session.add(document)
+        db_session.flush()
+        return document
+
+    def acquire(self, db_session, document_id: str) -> bool:
+        """Add a session's reference to a document; the caller commits
+
+        Returns False if the document no longer exists, e.g. the retention
+        sweep released its last reference after the caller found it. The
+        update write-locks the row until the caller commits, so once this
+        returns True a concurrent release sees the new reference.
+        """
+        return db_session.query(Document).filter_by(id=document_id).update(
+            {'ref_count': Document.ref_count + 1}, synchronize_session=False
+        ) == 1
+
+    def release(self, db_session, document_id: str) -> Optional[str]:
+        """Drop a reference and delete the document's rows once none are left
+
+        Returns the path of the freed upload so the caller can remove it
+        after committing, or None if the document is still referenced.
+        """
+        db_session.query(Document).filter_by(id=document_id).update(
+            {'ref_count': Document.ref_count - 1}, synchronize_session=False
+        )
+        document = db_session.query(Document).filter_by(id=document_id).populate_existing().first()
+        if document is None or document.ref_count > 0:
+            return None
+
+        db_session.execute(delete(Segment).where(Segment.document_id == document_id))
+        db_session.delete(document)
+        logger.info(f"Released last reference to document {document_id}")
+        return document.path
+
+    def remove_file(self, path: Optional[str]):
+        if not path:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
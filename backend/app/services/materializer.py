@@ -0,0 +1,227 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .text_parser import SegmentBuilder
+from ..models.session import Document
+
+logger = logging.getLogger(__name__)
+
+class _Materialization:
+    """In-memory extraction state for one lazily materialized document"""
+
+    def __init__(self, pages, stored: int = 0):
+        self.pages = pages
+        self.builder = SegmentBuilder()
+        self.produced = 0  # segments produced from the start of the document
+        self.stored = stored  # segments already persisted for the document
+        self.done = False
+        self.failed = False  # pages may be half consumed, so nothing more is read
+        self.lock = threading.Lock()
+
+class DocumentMaterializer:
+    """Extract a stored document's segments on demand instead of all at upload time"""
+
+    def __init__(self, text_parser, session_factory, segment_store, on_complete=None):
+        self.text_parser = text_parser
+        self.session_factory = session_factory
+        self.segment_store = segment_store
+        # Called with a document_id once all of its segments are stored
+        self.on_complete = on_complete
+        self.initial_pages = int(os.getenv('LAZY_INITIAL_PAGES', '3'))
+        self.batch_pages = int(os.getenv('LAZY_BATCH_PAGES', '20'))
+        # Keep at least this many segments extracted ahead of current_segment
+        self.lookahead = int(os.getenv('LAZY_LOOKAHEAD_SEGMENTS', '20'))
+        self.background = os.getenv('LAZY_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('LAZY_MATERIALIZE_WORKERS', '2')),
+            thread_name_prefix='materializer'
+        )
+        self._states: Dict[str, _Materialization] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, document_id: str, path: str, ext: str) -> Dict:
+        """Extract and store the first pages of a new document synchronously"""
+        state = _Materialization(self.text_parser.iter_pages(path, ext))
+        with self._lock:
+            self._states[document_id] = state
+        with state.lock:
+            # Stored under the lock so sessions sharing the document never see a partial first batch
+            try:
+                segments = self._read(state, self.initial_pages)
+                state.stored, state.done = self._store(document_id, 0, segments, state.done)
+            except Exception as e:
+                self._fail(document_id, state, e)
+                raise
+            if state.done:
+                self._finish(document_id)
+        return {'segments': segments, 'complete': state.done}
+
+    def schedule(self, document_id: str):
+        """Continue extraction in the background if background mode is enabled"""
+        if self.background:
+            self._executor.submit(self._run, document_id)
+
+    def ensure(self, document_id: str, segment_index: int):
+        """Make sure segments up to segment_index plus the lookahead are extracted"""
+        target = segment_index + self.lookahead + 1
+        state = self._get_state(document_id)
+        while state is not None:
+            with state.lock:
+                if state.done or state.failed or state.stored >= target:
+                    return
+                self._step(document_id, state)
+
+    def status(self, document_id: str) -> Optional[Dict]:
+        """Report how many segments of a document are ready to read"""
+        db_session = self.session_factory()
+        try:
+            document = db_session.query(Document).filter_by(id=document_id).first()
+            if not document:
+                return None
+            with self._lock:
+                in_progress = document_id in self._states
+            ready = document.total_segments
+            return {
+                'document_id': document_id,
+                'ready_segments': ready,
+                'complete': bool(document.materialized),
+                'total_segments': ready if document.materialized else None,
+                'in_progress': in_progress,
+                # Set once extraction has failed; ready_segments is then all there will be
+                'error': document.materialize_error
+            }
+        finally:
+            db_session.close()
+
+    def in_flight(self) -> int:
+        """Number of documents still being materialized in this process"""
+        with self._lock:
+            return len(self._states)
+
+    def _run(self, document_id: str):
+        """Background task: extract the remaining pages batch by batch"""
+        try:
+            state = self._get_state(document_id)
+            while state is not None:
+                with state.lock:
+                    if state.done or state.failed:
+                        return
+                    self._step(document_id, state)
+            logger.info(f"Finished materializing document: {document_id}")
+        except Exception as e:
+            logger.error(f"Error materializing document {document_id}: {str(e)}", exc_info=True)
+
+    def _step(self, document_id: str, state: _Materialization):
+        """Extract and persist one batch of pages; caller holds state.lock"""
+        try:
+            segments = self._read(state, self.batch_pages)
+            state.stored, state.done = self._store(document_id, state.stored, segments, state.done)
+        except Exception as e:
+            self._fail(document_id, state, e)
+            raise
+        if state.done:
+            self._finish(document_id)
+
+    def _read(self, state: _Materialization, max_pages: int) -> List[str]:
+        """Pull up to max_pages pages, returning the segments not yet stored"""
+        segments = []
+        for _ in range(max_pages):
+            page = next(state.pages, None)
+            if page is None:
+                new = state.builder.finish()
+                state.done = True
+            else:
+                new = state.builder.feed(page)
+            # On resume, segments persisted by an earlier run are skipped
+            skip = max(0, min(len(new), state.stored - state.produced))
+            state.produced += len(new)
+            segments.extend(new[skip:])
+            if state.done:
+                break
+        return segments
+
+    def _store(self, document_id: str, start: int, segments: List[str], complete: bool) -> Tuple[int, bool]:
+        """Persist segments extracted from index start on
+
+        Returns how many segments the document now has and whether it is
+        complete, which it may be because another worker finished it.
+
+        Another worker process may be extracting the same document. The row
+        is locked before its segment count is read, so whatever that worker
+        already stored is skipped instead of appended a second time.
+        """
+        db_session = self.session_factory()
+        try:
+            # A no-op write takes the document's write lock for the rest of the transaction
+            locked = db_session.query(Document).filter_by(id=document_id).update(
+                {'total_segments': Document.total_segments}, synchronize_session=False
+            )
+            document = db_session.query(Document).filter_by(id=document_id).populate_existing().first()
+            if not locked or not document:
+                raise ValueError(f"Document not found: {document_id}")
+            stored = document.total_segments or 0
+            if stored > start:
+                logger.info(f"Skipping {min(stored - start, len(segments))} segments of document "
+                            f"{document_id} already stored by another worker")
+            segments = segments[max(0, stored - start):]
+            self.segment_store.append(db_session, document, segments)
+            if complete:
+                document.materialized = True
+            db_session.commit()
+            return document.total_segments, bool(document.materialized)
+        finally:
+            db_session.close()
+
+    def _get_state(self, document_id: str) -> Optional[_Materialization]:
+        """Return the extraction state, re-opening the document if this process lost it"""
+        with self._lock:
+            state = self._states.get(document_id)
+            if state is not None:
+                return state
+
+            db_session = self.session_factory()
+            try:
+                document = db_session.query(Document).filter_by(id=document_id).first()
+                if not document or document.materialized or document.materialize_error or not document.path:
+                    return None
+                pages = self.text_parser.iter_pages(document.path, document.format)
+                state = _Materialization(pages, stored=document.total_segments)
+            finally:
+                db_session.close()
+
+            self._states[document_id] = state
+            return state
+
+    def _fail(self, document_id: str, state: _Materialization, error: Exception):
+        """Record why extraction stopped, so status() reports it instead of waiting forever"""
+        state.failed = True
+        self._forget(document_id)
+        db_session = self.session_factory()
+        try:
+            db_session.query(Document).filter_by(id=document_id).update(
+                {'materialize_error': str(error) or type(error).__name__}, synchronize_session=False
+            )
+            db_session.commit()
+        except Exception as e:
+            logger.error(f"Could not record materialization failure of {document_id}: {str(e)}", exc_info=True)
+        finally:
+            db_session.close()
+
+    def _finish(self, document_id: str):
+        """Drop a completed document's state and run on_complete off the caller's thread"""
+        self._forget(document_id)
+        if self.on_complete is not None:
+            self._executor.submit(self._completed, document_id)
+
+    def _completed(self, document_id: str):
+        try:
+            self.on_complete(document_id)
+        except Exception as e:
+            logger.warning(f"Completion callback failed for document {document_id}: {str(e)}")
+
+    def _forget(self, document_id: str):
+        with self._lock:
+            self._states.pop(document_id, None)
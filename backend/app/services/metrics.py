@@ -0,0 +1,152 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cache hit to a long synthesis or a large PDF
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Latency histogram with fixed buckets, one series per label combination
+
+    Observing is a bisect and a few additions under a lock, so it can stay
+    on in production; cumulative counts are only computed when scraped.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block, whether or not it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Gauge:
+    """Gauge read from a callback when scraped, so nothing is recorded in the hot path
+
+    The callback returns a number, or a dict mapping label value tuples to
+    numbers for a labelled gauge.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f"Could not read gauge {self.name}: {str(e)}")
+            return lines
+        values = value if isinstance(value, dict) else {(): value}
+        for key, number in sorted(values.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(number)}")
+        return lines
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text exposition format"""
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable,
+              labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, callback, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        with self._lock:
+            # Re-registering (e.g. a second create_app) replaces the gauge's callback
+            existing = self._metrics.get(metric.name)
+            if isinstance(existing, Histogram) and isinstance(metric, Histogram):
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+# Process-wide registry; each worker process exposes its own series
+registry = MetricsRegistry()
+
+PARSE_SECONDS = registry.histogram(
+    'readit_parse_seconds', 'Time to extract and segment an uploaded document, by format', ['format'])
+SEGMENTATION_SECONDS = registry.histogram(
+    'readit_segmentation_seconds', 'Time spent splitting extracted text into segments')
+TTS_SECONDS = registry.histogram(
+    'readit_tts_seconds', 'Time to produce audio for a segment, by audio cache result', ['cache'])
+AI_ANSWER_SECONDS = registry.histogram(
+    'readit_ai_answer_seconds', 'Time to answer a question, by mode and outcome', ['mode', 'outcome'])
+DB_COMMIT_SECONDS = registry.histogram(
+    'readit_db_commit_seconds', 'Time to flush and commit an ORM session')
+SEARCH_SECONDS = registry.histogram(
+    'readit_search_seconds', 'Time to run a full-text segment search, by scope', ['scope'])
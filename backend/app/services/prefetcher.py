@@ -0,0 +1,180 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cap applies per process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class _NodeSlots:
+    """Counting semaphore shared by every worker process on the machine via lock files"""
+
+    def __init__(self, lock_dir: str, slots: int):
+        self.paths = [os.path.join(lock_dir, f"slot-{i}.lock") for i in range(slots)]
+        os.makedirs(lock_dir, exist_ok=True)
+
+    @contextmanager
+    def hold(self, cancelled):
+        """Wait for a free slot; yields False without one if cancelled() turns true first"""
+        if fcntl is None:
+            yield True
+            return
+        while True:
+            for path in self.paths:
+                f = open(path, 'a')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    f.close()
+                    continue
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    f.close()
+                return
+            if cancelled():
+                yield False
+                return
+            time.sleep(0.05)
+
+class _Plan:
+    """Prefetch window for one session; a new generation cancels older work"""
+
+    def __init__(self, generation: int, voice_id: str, fmt: str):
+        self.generation = generation
+        self.voice_id = voice_id
+        self.fmt = fmt
+        self.scheduled = set()
+        self.futures = []
+
+class SegmentPrefetcher:
+    """Synthesize the segments after the reader's position before they are requested
+
+    Each advance schedules the next lookahead segments with the session's
+    voice. Moving forward inside the window only adds the new segments; a
+    jump (or a voice or format change) starts a new generation, cancelling
+    queued work for the old position. Syntheses go through TTSService, so
+    they land in the audio cache and coalesce with concurrent /tts requests.
+    At most max_concurrency prefetches run at once across all worker
+    processes on the node.
+    """
+
+    def __init__(self, tts_service, segment_store, lookahead: int = None, max_concurrency: int = None):
+        self.tts_service = tts_service
+        self.segment_store = segment_store
+        self.lookahead = lookahead if lookahead is not None else int(os.getenv('TTS_PREFETCH_SEGMENTS', '3'))
+        self.max_concurrency = max_concurrency or int(os.getenv('TTS_PREFETCH_CONCURRENCY', '2'))
+        self.default_format = os.getenv('TTS_PREFETCH_FORMAT', 'wav')
+        self._slots = _NodeSlots(os.path.join(tts_service.output_dir, '.prefetch'), self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='prefetch')
+        self._plans: Dict[str, _Plan] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.scheduled = 0
+        self.synthesized = 0
+        self.already_cached = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def advance(self, db_session, reading_session, segment_index: int, fmt: str = None):
+        """Prefetch the segments following segment_index for a session"""
+        if self.lookahead <= 0:
+            return
+        session_id = reading_session.id
+        voice_id = reading_session.voice_id
+        start = segment_index + 1
+        stop = min(start + self.lookahead, reading_session.total_segments)
+
+        with self._lock:
+            plan = self._plans.get(session_id)
+            fmt = fmt or (plan.fmt if plan else self.default_format)
+            in_window = plan is not None and any(i in plan.scheduled for i in (segment_index, start))
+            if plan is None or not in_window or plan.voice_id != voice_id or plan.fmt != fmt:
+                if plan is not None:
+                    self._cancel(plan)
+                self._generation += 1
+                plan = self._plans[session_id] = _Plan(self._generation, voice_id, fmt)
+                # The segment being read is part of the window, so reading it counts as moving forward
+                plan.scheduled.add(segment_index)
+            indexes = [i for i in range(start, stop) if i not in plan.scheduled]
+            plan.scheduled.update(indexes)
+            plan.futures = [f for f in plan.futures if not f.done()]
+
+        if not indexes:
+            return
+        texts = self.segment_store.get_texts_at(db_session, reading_session.document_id, indexes)
+        with self._lock:
+            if self._plans.get(session_id) is not plan:
+                return
+            for index in indexes:
+                if index in texts:
+                    plan.futures.append(self._executor.submit(
+                        self._prefetch, session_id, plan, texts[index], voice_id, fmt
+                    ))
+                    self.scheduled += 1
+
+    def forget(self, session_id: str):
+        """Cancel and drop a session's prefetch window"""
+        with self._lock:
+            plan = self._plans.pop(session_id, None)
+            if plan is not None:
+                self._cancel(plan)
+
+    def in_flight(self) -> int:
+        """Number of prefetches queued or running in this process"""
+        with self._lock:
+            return sum(1 for plan in self._plans.values() for f in plan.futures if not f.done())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'sessions': len(self._plans),
+                'lookahead': self.lookahead,
+                'max_concurrency': self.max_concurrency,
+                'scheduled': self.scheduled,
+                'synthesized': self.synthesized,
+                'already_cached': self.already_cached,
+                'cancelled': self.cancelled,
+                'failed': self.failed
+            }
+
+    def _cancel(self, plan: _Plan):
+        """Cancel queued work for a superseded plan; caller holds the lock"""
+        for future in plan.futures:
+            if future.cancel():
+                self.cancelled += 1
+        plan.futures = []
+
+    def _is_stale(self, session_id: str, plan: _Plan) -> bool:
+        with self._lock:
+            return self._plans.get(session_id) is not plan
+
+    def _prefetch(self, session_id: str, plan: _Plan, text: str, voice_id: str, fmt: str):
+        cancelled = lambda: self._is_stale(session_id, plan)
+        with self._slots.hold(cancelled) as acquired:
+            if not acquired or cancelled():
+                with self._lock:
+                    self.cancelled += 1
+                return
+            try:
+                key = self.tts_service._get_cache_key(text, voice_id, fmt)
+                if self.tts_service.cache.contains(key):
+                    with self._lock:
+                        self.already_cached += 1
+                    return
+                self.tts_service.convert_to_speech(text, voice_id, fmt=fmt)
+                with self._lock:
+                    self.synthesized += 1
+            except Exception as e:
+                logger.warning(f"Prefetch failed for session {session_id}: {str(e)}")
+                with self._lock:
+                    self.failed += 1
@@ -0,0 +1,209 @@
+import os
+import atexit
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+
+from ..models.session import ReadingSession
+
+logger = logging.getLogger(__name__)
+
+# Fields written every few seconds during playback; everything else goes straight to the database
+PROGRESS_FIELDS = ('current_segment', 'current_position')
+
+# Keeps a field's buffered value when an update does not mention it
+_UPSERT = (
+    'INSERT INTO pending (session_id, {fields}) VALUES (?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET '
+    + ', '.join(f'{field} = coalesce(excluded.{field}, {field})' for field in PROGRESS_FIELDS)
+).format(fields=', '.join(PROGRESS_FIELDS))
+
+class ProgressBuffer:
+    """Write-behind buffer for reading progress
+
+    Updates are kept in a small SQLite file shared by every worker process
+    on the node, keeping only the last value per session and field, and
+    written to the database in one batched UPDATE every flush_interval
+    seconds, when max_pending sessions are waiting, or at interpreter exit.
+    Readers overlay pending values on what the database returns, so a
+    client sees its own writes before they are flushed whichever worker
+    serves the read.
+    """
+
+    def __init__(self, session_factory, flush_interval: float = None, max_pending: int = None,
+                 db_path: str = None):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv('PROGRESS_FLUSH_INTERVAL', '5')
+        )
+        self.max_pending = max_pending or int(os.getenv('PROGRESS_FLUSH_MAX_PENDING', '500'))
+        db_path = db_path or os.getenv('PROGRESS_BUFFER_DB', 'progress_buffer.db')
+
+        # Counters for this process
+        self.updates = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Autocommit; a flush holds the write lock with BEGIN IMMEDIATE until its rows are written
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # No fsync per update: a crash loses at most the last few seconds of progress, as the
+        # in-memory buffer did, while a flush's database commit keeps its own durability
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS pending (session_id TEXT PRIMARY KEY, '
+            + ', '.join(f'{field} INTEGER' for field in PROGRESS_FIELDS) + ')'
+        )
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name='progress-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def accepts(data: Dict) -> bool:
+        """True if an update only touches buffered progress fields"""
+        return bool(data) and all(key in PROGRESS_FIELDS for key in data)
+
+    @staticmethod
+    def validate(data: Dict) -> Dict:
+        """Return the progress fields in data as ints, raising ValueError for anything else"""
+        values = {}
+        for key in PROGRESS_FIELDS:
+            if key not in data:
+                continue
+            value = data[key]
+            # bool is an int, and int() would accept '7' or 7.9
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"{key} must be a non-negative integer")
+            values[key] = value
+        return values
+
+    def update(self, session_id: str, data: Dict) -> Tuple[Optional[Dict], Dict]:
+        """Buffer progress values for a session
+
+        Returns what was pending for it before (None if nothing) and after.
+        """
+        values = self.validate(data)
+        with self._lock:
+            previous = self._pending(session_id) or None
+            self._db.execute(_UPSERT, (session_id, *(values.get(field) for field in PROGRESS_FIELDS)))
+            self.updates += 1
+            result = self._pending(session_id)
+            full = self._db.execute('SELECT COUNT(*) FROM pending').fetchone()[0] >= self.max_pending
+        if full:
+            self.flush()
+        return previous, result
+
+    def pending(self, session_id: str) -> Optional[Dict]:
+        """Values buffered for a session but not yet written"""
+        with self._lock:
+            return self._pending(session_id) or None
+
+    def overlay(self, session_id: str, session_dict: Dict) -> Dict:
+        """Apply pending values to a session's to_dict() result"""
+        pending = self.pending(session_id)
+        if pending:
+            session_dict.update(pending)
+        return session_dict
+
+    def pop(self, session_id: str) -> Optional[Dict]:
+        """Take a session's pending values so the caller can write them itself"""
+        with self._lock, self._transaction():
+            pending = self._pending(session_id)
+            self._db.execute('DELETE FROM pending WHERE session_id = ?', (session_id,))
+        return pending or None
+
+    def flush(self) -> int:
+        """Write all pending values in one batch, returning the number of sessions written
+
+        The buffer's write lock is held until the database commit, so
+        flushes from different workers cannot write values out of order.
+        """
+        with self._lock:
+            try:
+                with self._transaction():
+                    batch = {}
+                    for row in self._db.execute(f"SELECT session_id, {', '.join(PROGRESS_FIELDS)} FROM pending"):
+                        batch[row[0]] = self._values(row[1:])
+                    if not batch:
+                        return 0
+                    self._write(batch)
+                    self._db.execute('DELETE FROM pending')
+            except Exception as e:
+                # Nothing is removed from the buffer; the next flush tries again
+                logger.error(f"Error flushing reading progress: {str(e)}", exc_info=True)
+                return 0
+            self.flushes += 1
+            self.rows_written += len(batch)
+        logger.debug(f"Flushed reading progress for {len(batch)} sessions")
+        return len(batch)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending': self._db.execute('SELECT COUNT(*) FROM pending').fetchone()[0],
+                'updates': self.updates,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written
+            }
+
+    def close(self):
+        """Stop the flush thread and write whatever is still pending"""
+        self._stop.set()
+        self.flush()
+
+    def _write(self, batch: Dict[str, Dict]):
+        """Apply a batch to the database in one transaction"""
+        now = datetime.utcnow()
+        db_session = self.session_factory()
+        try:
+            # One executemany per distinct field set; rows are matched by primary key
+            groups: Dict[tuple, list] = {}
+            for session_id, values in batch.items():
+                groups.setdefault(tuple(sorted(values)), []).append(
+                    dict(values, b_id=session_id, last_accessed=now)
+                )
+            table = ReadingSession.__table__
+            for fields, rows in groups.items():
+                stmt = update(table).where(table.c.id == bindparam('b_id')).values(
+                    **{field: bindparam(field) for field in fields},
+                    last_accessed=bindparam('last_accessed')
+                )
+                db_session.execute(stmt, rows)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            db_session.close()
+
+    def _pending(self, session_id: str) -> Dict:
+        row = self._db.execute(
+            f"SELECT {', '.join(PROGRESS_FIELDS)} FROM pending WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return self._values(row) if row else {}
+
+    @staticmethod
+    def _values(row) -> Dict:
+        return {field: value for field, value in zip(PROGRESS_FIELDS, row) if value is not None}
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ServiceUnavailable(Exception):
+    """A service could not be created, e.g. because its API key is not configured"""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name} is unavailable: {reason}")
+        self.name = name
+        self.reason = reason
+
+class ServiceRegistry:
+    """Creates each service on first use instead of at import time
+
+    Factories import their own (often heavy) dependencies, so a worker only
+    loads the SDKs and parsers it actually needs. A factory that fails
+    marks just that service unavailable; everything else keeps working.
+    The failure is remembered for retry_after seconds, then the factory is
+    tried again, so a service recovers once e.g. its database is reachable.
+    """
+
+    def __init__(self, retry_after: float = None):
+        self.retry_after = retry_after if retry_after is not None else float(
+            os.getenv('SERVICE_RETRY_SECONDS', '30')
+        )
+        self._factories: Dict[str, Callable] = {}
+        self._instances: Dict[str, object] = {}
+        # name -> (reason, monotonic time of the failure)
+        self._errors: Dict[str, Tuple[str, float]] = {}
+        self._timings: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable):
+        with self._lock:
+            self._factories[name] = factory
+
+    def get(self, name: str):
+        """Return the service, creating it on first use; raises ServiceUnavailable"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            # Re-entrant: a factory may get() the services it depends on
+            if name in self._instances:
+                return self._instances[name]
+            error = self._errors.get(name)
+            if error is not None:
+                if time.monotonic() - error[1] < self.retry_after:
+                    raise ServiceUnavailable(name, error[0])
+                del self._errors[name]
+
+            started = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except ServiceUnavailable as e:
+                self._errors[name] = (str(e), time.monotonic())
+                raise ServiceUnavailable(name, str(e))
+            except Exception as e:
+                self._errors[name] = (str(e), time.monotonic())
+                logger.error(f"Could not create service {name}: {str(e)}", exc_info=True)
+                raise ServiceUnavailable(name, str(e))
+            self._timings[name] = time.perf_counter() - started
+            self._instances[name] = instance
+            logger.info(f"Created service {name} in {self._timings[name] * 1000:.1f} ms")
+            return instance
+
+    def peek(self, name: str) -> Optional[object]:
+        """Return the service if it has already been created, without creating it"""
+        return self._instances.get(name)
+
+    def available(self, name: str) -> bool:
+        try:
+            self.get(name)
+            return True
+        except ServiceUnavailable:
+            return False
+
+    def status(self) -> Dict:
+        """State of every registered service and how long each took to create"""
+        with self._lock:
+            result = {}
+            for name in self._factories:
+                if name in self._instances:
+                    result[name] = {'state': 'ready', 'init_ms': round(self._timings[name] * 1000, 1)}
+                elif name in self._errors:
+                    reason, failed_at = self._errors[name]
+                    retry_in = max(0.0, failed_at + self.retry_after - time.monotonic())
+                    result[name] = {'state': 'unavailable', 'reason': reason, 'retry_in': round(retry_in, 1)}
+                else:
+                    result[name] = {'state': 'not_started'}
+            return result
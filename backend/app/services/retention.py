@@ -0,0 +1,255 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+
+from ..models.session import AudioJob, AudioJobSegment, ReadingSession
+from .audio_jobs import live_job_filter
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker process sweeps on its own schedule
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Values per IN (...) list, well under SQLite's bound-parameter limit
+IN_CHUNK = 500
+
+def _chunks(values: List, size: int = IN_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+class RetentionSweeper:
+    """Expire reading sessions that have not been accessed for max_age_days
+
+    Sessions are found oldest first through the last_accessed index and
+    deleted batch_size at a time, each batch in its own short transaction
+    with a pause in between, so requests never wait long for the write
+    lock. A batch takes the session's bookmarks and offline audio jobs with
+    it and drops its document reference. Once committed, freed upload files
+    are removed and cached audio that no remaining job refers to, and that
+    nobody has played since the cutoff, is released. Sessions with
+    unflushed progress or a live queued or running audio job are left alone.
+    Only one worker process sweeps at a time.
+    """
+
+    def __init__(self, session_factory, document_store, bookmark_store, progress,
+                 release_audio: Optional[Callable[[str, float], bool]] = None,
+                 on_session_expired: Optional[Callable[[str], None]] = None,
+                 on_document_released: Optional[Callable[[str], None]] = None,
+                 max_age_days: float = None, batch_size: int = None,
+                 interval: float = None, pause: float = None):
+        self.session_factory = session_factory
+        self.document_store = document_store
+        self.bookmark_store = bookmark_store
+        self.progress = progress
+        self.release_audio = release_audio
+        self.on_session_expired = on_session_expired
+        self.on_document_released = on_document_released
+        self.max_age_days = max_age_days if max_age_days is not None else float(
+            os.getenv('SESSION_RETENTION_DAYS', '30')
+        )
+        self.batch_size = min(batch_size or int(os.getenv('RETENTION_BATCH_SIZE', '100')), IN_CHUNK)
+        self.interval = interval if interval is not None else float(os.getenv('RETENTION_SWEEP_INTERVAL', '3600'))
+        self.pause = pause if pause is not None else float(os.getenv('RETENTION_BATCH_PAUSE', '0.2'))
+        self.lock_path = os.path.join(document_store.upload_dir, '.retention.lock')
+
+        self.sweeps = 0
+        self.totals = {'sessions': 0, 'bookmarks': 0, 'audio_jobs': 0, 'documents': 0, 'audio_files': 0}
+        self.last_sweep: Optional[Dict] = None
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_days > 0
+
+    def start(self):
+        """Sweep every interval seconds on a background thread; a no-op if retention is disabled"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._sweep_loop, name='retention-sweep', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        logger.info(f"Expiring sessions idle for {self.max_age_days:g} days, checking every {self.interval:g}s")
+
+    def close(self):
+        self._stop.set()
+
+    def sweep(self, now: datetime = None) -> Optional[Dict]:
+        """Expire everything past the cutoff; returns counts, or None if another process is sweeping"""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=self.max_age_days)
+        # Audio read after the cutoff is still in use by some other reader
+        idle_since = cutoff.replace(tzinfo=timezone.utc).timestamp()
+
+        with self._lock, self._exclusive() as acquired:
+            if not acquired:
+                logger.debug("Another process is sweeping expired sessions")
+                return None
+
+            started = time.perf_counter()
+            counts = dict.fromkeys(self.totals, 0)
+            while not self._stop.is_set():
+                selected, batch = self._sweep_batch(cutoff, idle_since)
+                for key, value in batch.items():
+                    counts[key] += value
+                if batch['sessions'] == 0 or selected < self.batch_size:
+                    break
+                time.sleep(self.pause)
+
+            self.sweeps += 1
+            for key in self.totals:
+                self.totals[key] += counts[key]
+            self.last_sweep = dict(counts, finished_at=datetime.utcnow().isoformat(),
+                                   seconds=round(time.perf_counter() - started, 3))
+            if counts['sessions']:
+                logger.info(f"Expired {counts['sessions']} sessions idle since {cutoff.isoformat()}: "
+                            f"{counts['bookmarks']} bookmarks, {counts['audio_jobs']} audio jobs, "
+                            f"{counts['documents']} documents, {counts['audio_files']} audio files")
+            return counts
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'max_age_days': self.max_age_days,
+            'sweeps': self.sweeps,
+            'totals': dict(self.totals),
+            'last_sweep': self.last_sweep
+        }
+
+    def _sweep_batch(self, cutoff: datetime, idle_since: float) -> Tuple[int, Dict]:
+        """Delete one batch of expired sessions in one transaction, then free what they held
+
+        Returns how many sessions the batch selected and what was removed.
+        """
+        counts = dict.fromkeys(self.totals, 0)
+        freed_documents = []
+        audio_paths = set()
+
+        db_session = self.session_factory()
+        try:
+            # A job whose worker died no longer protects its session
+            busy = select(AudioJob.id).where(
+                AudioJob.session_id == ReadingSession.id, live_job_filter()
+            ).exists()
+            rows = db_session.query(
+                ReadingSession.id, ReadingSession.document_id, ReadingSession.cached_audio_paths
+            ).filter(
+                ReadingSession.last_accessed < cutoff, ~busy
+            ).order_by(ReadingSession.last_accessed).limit(self.batch_size).all()
+            selected = len(rows)
+
+            # Buffered progress means the reader is back; the next flush moves last_accessed
+            rows = [row for row in rows if self.progress.pending(row.id) is None]
+            if not rows:
+                return selected, counts
+            session_ids = [row.id for row in rows]
+
+            job_ids = [job_id for (job_id,) in db_session.query(AudioJob.id).filter(
+                AudioJob.session_id.in_(session_ids)
+            )]
+            for chunk in _chunks(job_ids):
+                audio_paths.update(path for (path,) in db_session.query(AudioJobSegment.audio_path).filter(
+                    AudioJobSegment.job_id.in_(chunk), AudioJobSegment.audio_path.isnot(None)
+                ))
+                db_session.execute(delete(AudioJobSegment).where(AudioJobSegment.job_id.in_(chunk)))
+                db_session.execute(delete(AudioJob).where(AudioJob.id.in_(chunk)))
+            for row in rows:
+                audio_paths.update(path for path in (row.cached_audio_paths or {}).values() if path)
+
+            counts['bookmarks'] = self.bookmark_store.delete_sessions(db_session, session_ids)
+            db_session.execute(delete(ReadingSession).where(ReadingSession.id.in_(session_ids)))
+            for row in rows:
+                path = self.document_store.release(db_session, row.document_id)
+                if path is not None:
+                    freed_documents.append((row.document_id, path))
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            error_msg = f"Error expiring sessions: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            raise ValueError(error_msg)
+        finally:
+            db_session.close()
+
+        counts['sessions'] = len(session_ids)
+        counts['audio_jobs'] = len(job_ids)
+        counts['documents'] = len(freed_documents)
+
+        for document_id, path in freed_documents:
+            self.document_store.remove_file(path)
+            self._notify(self.on_document_released, document_id)
+        for session_id in session_ids:
+            self._notify(self.on_session_expired, session_id)
+        counts['audio_files'] = self._release_audio(audio_paths, idle_since)
+        return selected, counts
+
+    def _release_audio(self, audio_paths, idle_since: float) -> int:
+        """Release cached audio no surviving audio job refers to; returns how many were removed"""
+        if not audio_paths or self.release_audio is None:
+            return 0
+
+        db_session = self.session_factory()
+        try:
+            referenced = set()
+            for chunk in _chunks(sorted(audio_paths)):
+                referenced.update(path for (path,) in db_session.query(AudioJobSegment.audio_path).filter(
+                    AudioJobSegment.audio_path.in_(chunk)
+                ).distinct())
+        finally:
+            db_session.close()
+
+        released = 0
+        for path in audio_paths - referenced:
+            try:
+                released += bool(self.release_audio(path, idle_since))
+            except Exception as e:
+                # e.g. TTS is not configured in this process; the cache's own eviction still applies
+                logger.warning(f"Could not release cached audio {path}: {str(e)}")
+                break
+        return released
+
+    def _notify(self, callback, value: str):
+        if callback is None:
+            return
+        try:
+            callback(value)
+        except Exception as e:
+            logger.warning(f"Retention callback failed for {value}: {str(e)}")
+
+    @contextmanager
+    def _exclusive(self):
+        """Yield True if this process may sweep, without waiting for one that already is"""
+        if fcntl is None:
+            yield True
+            return
+        f = open(self.lock_path, 'a')
+        try:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Retention sweep failed: {str(e)}", exc_info=True)
@@ -0,0 +1,195 @@
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r'\w+')
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+class SegmentIndex:
+    """BM25 index over one document's segments, stored as term-major (CSC) arrays
+
+    Column t of the term-frequency matrix is term t: indptr[t]:indptr[t + 1]
+    delimits its postings, indices holds their segment ids and data their
+    counts. Scoring a query slices out only the postings of its terms,
+    vectorized over all segments at once.
+    """
+
+    def __init__(self, terms: np.ndarray, num_segments: int, indptr: np.ndarray, indices: np.ndarray,
+                 data: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.terms = terms
+        self.num_segments = int(num_segments)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.k1 = k1
+        self.b = b
+
+        self.vocabulary = {term: i for i, term in enumerate(terms.tolist())}
+        self.doc_len = np.bincount(indices, weights=data, minlength=self.num_segments)
+        self.avg_len = self.doc_len.mean() if self.num_segments else 0.0
+        df = np.diff(indptr)
+        self.idf = np.log1p((self.num_segments - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def build(cls, texts: List[str]) -> 'SegmentIndex':
+        vocabulary: Dict[str, int] = {}
+        term_ids = []
+        lengths = np.empty(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text)]
+            term_ids.extend(ids)
+            lengths[i] = len(ids)
+
+        size = max(1, len(texts))
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        # Sorting (term, segment) pairs yields CSC order; counting duplicates yields term frequencies
+        pairs, counts = np.unique(np.asarray(term_ids, dtype=np.int64) * size + rows, return_counts=True)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // size, minlength=len(vocabulary)), out=indptr[1:])
+
+        terms = np.array(list(vocabulary), dtype=np.str_)
+        return cls(terms, len(texts), indptr, (pairs % size).astype(np.int32), counts.astype(np.float32))
+
+    @classmethod
+    def load(cls, path: str) -> Optional['SegmentIndex']:
+        """Load a saved index; None if it was saved in the older segment-major layout"""
+        with np.load(path, allow_pickle=False) as arrays:
+            if 'num_segments' not in arrays:
+                return None
+            return cls(arrays['terms'], arrays['num_segments'], arrays['indptr'],
+                       arrays['indices'], arrays['data'])
+
+    def save(self, path: str):
+        tmp_path = f"{path}.part.npz"
+        np.savez_compressed(tmp_path, terms=self.terms, num_segments=self.num_segments,
+                            indptr=self.indptr, indices=self.indices, data=self.data)
+        os.replace(tmp_path, path)
+
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every segment for the query"""
+        ids = np.unique([self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary]).astype(np.int64)
+        scores = np.zeros(self.num_segments)
+        if not len(ids) or not self.num_segments:
+            return scores
+
+        starts = self.indptr[ids]
+        lengths = self.indptr[ids + 1] - starts
+        # Positions of every posting of the query terms, term after term
+        postings = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        tf = self.data[postings]
+        rows = self.indices[postings]
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / self.avg_len)
+        weights = np.repeat(self.idf[ids], lengths) * tf * (self.k1 + 1) / (tf + norm)
+        scores += np.bincount(rows, weights=weights, minlength=self.num_segments)
+        return scores
+
+class RetrievalService:
+    """Build, persist and query per-document segment indexes for the AI assistant
+
+    Indexes are saved as .npz files under RETRIEVAL_INDEX_DIR and the most
+    recently used ones are kept loaded. An index whose segment count no
+    longer matches the document (e.g. lazy extraction has progressed) is
+    rebuilt from the segments table.
+    """
+
+    def __init__(self, segment_store, index_dir: str = None, top_k: int = None):
+        self.segment_store = segment_store
+        self.index_dir = os.path.abspath(index_dir or os.getenv(
+            'RETRIEVAL_INDEX_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'indexes')
+        ))
+        self.top_k = top_k or int(os.getenv('RETRIEVAL_TOP_K', '4'))
+        # Distance in segments at which a match's score is halved
+        self.proximity_scale = float(os.getenv('RETRIEVAL_PROXIMITY_SCALE', '25'))
+        self.max_context_chars = int(os.getenv('RETRIEVAL_MAX_CONTEXT_CHARS', '6000'))
+        self.max_loaded = int(os.getenv('RETRIEVAL_LOADED_INDEXES', '32'))
+        self._loaded: 'OrderedDict[str, SegmentIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def build(self, document_id: str, texts: List[str]) -> SegmentIndex:
+        """Index a document's segments and persist the arrays"""
+        try:
+            index = SegmentIndex.build(texts)
+            index.save(self._path(document_id))
+            self._remember(document_id, index)
+            logger.info(f"Built retrieval index for document {document_id}: "
+                        f"{index.num_segments} segments, {len(index.terms)} terms")
+            return index
+        except Exception as e:
+            error_msg = f"Error building retrieval index: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            raise ValueError(error_msg)
+
+    def get(self, db_session, document_id: str, total_segments: int) -> SegmentIndex:
+        """Return the document's index, loading or rebuilding it as needed"""
+        with self._lock:
+            index = self._loaded.get(document_id)
+            if index is not None:
+                self._loaded.move_to_end(document_id)
+        if index is None and os.path.exists(self._path(document_id)):
+            index = SegmentIndex.load(self._path(document_id))
+            if index is not None:
+                self._remember(document_id, index)
+        if index is None or index.num_segments != total_segments:
+            index = self.build(document_id, self.segment_store.get_texts(db_session, document_id))
+        return index
+
+    def select(self, db_session, document_id: str, total_segments: int,
+               question: str, current_segment: int) -> List[int]:
+        """Rank the current segment first, then the top-k matches with nearby ones favored"""
+        index = self.get(db_session, document_id, total_segments)
+
+        scores = index.score(question)
+        distance = np.abs(np.arange(index.num_segments) - current_segment)
+        scores /= 1 + distance / self.proximity_scale
+        scores[current_segment] = 0
+
+        candidates = np.argsort(-scores, kind='stable')[:self.top_k]
+        return [current_segment] + [int(i) for i in candidates if scores[i] > 0]
+
+    def build_context(self, db_session, document_id: str, total_segments: int,
+                      question: str, current_segment: int) -> str:
+        """Join the selected segments into a prompt context capped at max_context_chars"""
+        if not total_segments:
+            return ''
+        current_segment = min(max(0, current_segment), total_segments - 1)
+        indexes = self.select(db_session, document_id, total_segments, question, current_segment)
+        texts = self.segment_store.get_texts_at(db_session, document_id, indexes)
+        context, used = [], 0
+        # The current segment is always included; matches are added by rank until the budget runs out
+        for index in indexes:
+            text = texts.get(index, '')
+            if context and used + len(text) > self.max_context_chars:
+                continue
+            context.append((index, text[:self.max_context_chars]))
+            used += len(text)
+        return ' '.join(text for _, text in sorted(context))
+
+    def discard(self, document_id: str):
+        """Forget a document's index and delete its file"""
+        with self._lock:
+            self._loaded.pop(document_id, None)
+        try:
+            os.remove(self._path(document_id))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.index_dir, f"{document_id}.npz")
+
+    def _remember(self, document_id: str, index: SegmentIndex):
+        with self._lock:
+            self._loaded[document_id] = index
+            self._loaded.move_to_end(document_id)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
@@ -0,0 +1,149 @@
+import re
+import logging
+import sqlite3
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from .metrics import SEARCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Stores each segment's text a second time so snippets need no join. The
+# doc column holds the document id as a single token: filtering on it is
+# an index lookup, so a query only touches the postings of the documents
+# searched however many documents are stored.
+SCHEMA = [
+    """CREATE VIRTUAL TABLE segment_search USING fts5(
+        doc, text, document_id UNINDEXED, segment_index UNINDEXED,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )""",
+    # Only the text column counts towards the score
+    "INSERT INTO segment_search(segment_search, rank) VALUES ('rank', 'bm25(0.0, 1.0, 0.0, 0.0)')",
+    # Indexed in the same transaction as the segment, whichever code path stores it
+    """CREATE TRIGGER document_segments_search_insert AFTER INSERT ON document_segments BEGIN
+        INSERT INTO segment_search(doc, text, document_id, segment_index)
+        VALUES (replace(new.document_id, '-', ''), new.text, new.document_id, new.segment_index);
+    END""",
+    # Segments are only ever deleted together with their document
+    """CREATE TRIGGER documents_search_delete AFTER DELETE ON documents BEGIN
+        DELETE FROM segment_search WHERE rowid IN (
+            SELECT rowid FROM segment_search WHERE segment_search MATCH 'doc : "' || replace(old.id, '-', '') || '"'
+        );
+    END""",
+    """INSERT INTO segment_search(doc, text, document_id, segment_index)
+        SELECT replace(document_id, '-', ''), text, document_id, segment_index FROM document_segments"""
+]
+
+# Quoted phrases, or runs of non-space characters
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+# Match markers; control characters cannot clash with document text
+_START, _END = '\x02', '\x03'
+
+def create_search_index(engine) -> bool:
+    """Create the FTS5 index and its triggers, indexing existing segments; False if unsupported"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # Taken before checking, so workers starting together backfill only once
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'segment_search'").fetchone() is None:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+                logger.info("Created the full-text segment index")
+            connection.commit()
+        except sqlite3.OperationalError as e:
+            connection.rollback()
+            logger.warning(f"Full-text search is unavailable: {str(e)}")
+            return False
+    finally:
+        connection.close()
+    return True
+
+def build_match(query: str) -> str:
+    """Turn user input into an FTS5 expression of quoted terms, so it can never be a syntax error
+
+    Every word must match (stemmed); "quoted words" match as a phrase and a
+    trailing * matches any word with that prefix.
+    """
+    terms = []
+    for phrase, word in _TERM.findall(query):
+        term = phrase or word
+        prefix = not phrase and term.endswith('*')
+        term = (term.rstrip('*') if prefix else term).replace('"', '""').strip()
+        if term:
+            terms.append(f'"{term}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+class SegmentSearch:
+    """Ranked full-text search over stored segments with SQLite FTS5
+
+    Hits are ordered by BM25 and carry the segment's index, the character
+    offset of the first match in the document's space-joined text (the
+    same coordinates as a segment's char_offset) and a short snippet with
+    the matched ranges marked.
+    """
+
+    def __init__(self, engine, snippet_tokens: int = 16):
+        if not create_search_index(engine):
+            raise ValueError("Full-text search needs a SQLite database with FTS5")
+        self.snippet_tokens = snippet_tokens
+
+    def search(self, db_session, document_ids: List[str], query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Return hits for query in the given documents, best first"""
+        terms = build_match(query)
+        if not terms or not document_ids:
+            return []
+        docs = ' OR '.join(f'"{document_id.replace("-", "")}"' for document_id in document_ids)
+        match = f'doc : ({docs}) AND text : ({terms})'
+
+        scope = 'document' if len(document_ids) == 1 else 'documents'
+        with SEARCH_SECONDS.time(scope=scope):
+            # Ranked and limited inside the subquery, where FTS5 can order by rank itself
+            rows = db_session.execute(text(
+                """SELECT hit.document_id, hit.segment_index, hit.score, hit.snippet, hit.marked, s.char_offset
+                FROM (
+                    SELECT document_id, segment_index, rank AS score,
+                           snippet(segment_search, 1, :start, :end, '…', :tokens) AS snippet,
+                           highlight(segment_search, 1, :start, :end) AS marked
+                    FROM segment_search WHERE segment_search MATCH :match
+                    ORDER BY rank LIMIT :limit OFFSET :offset
+                ) AS hit
+                JOIN document_segments s
+                  ON s.document_id = hit.document_id AND s.segment_index = hit.segment_index
+                ORDER BY hit.score"""
+            ), {
+                'match': match, 'start': _START, 'end': _END, 'tokens': self.snippet_tokens,
+                'limit': limit, 'offset': offset
+            }).all()
+
+        hits = []
+        for row in rows:
+            snippet, highlights = self._unmark(row.snippet)
+            hits.append({
+                'document_id': row.document_id,
+                'segment_index': row.segment_index,
+                'char_offset': row.char_offset + max(row.marked.find(_START), 0),
+                'snippet': snippet,
+                'highlights': highlights,
+                # bm25() is lower for better matches
+                'score': -row.score
+            })
+        return hits
+
+    @staticmethod
+    def _unmark(marked: str):
+        """Strip match markers, returning the plain text and the [start, end) ranges they enclosed"""
+        parts = []
+        highlights = []
+        length = 0
+        for i, piece in enumerate(re.split(f'[{_START}{_END}]', marked)):
+            if i % 2:
+                highlights.append([length, length + len(piece)])
+            parts.append(piece)
+            length += len(piece)
+        return ''.join(parts), highlights
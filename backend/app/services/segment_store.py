@@ -0,0 +1,62 @@
+import logging
+from typing import Dict, List
+
+from sqlalchemy import insert
+
+from ..models.session import Segment
+
+logger = logging.getLogger(__name__)
+
+class SegmentStore:
+    """Append and page through a document's rows in the segments table"""
+
+    def append(self, db_session, document, texts: List[str]):
+        """Add segments after the ones already stored; the caller commits"""
+        if not texts:
+            return
+
+        start = document.total_segments or 0
+        offset = 0
+        if start:
+            last = db_session.query(Segment).filter_by(
+                document_id=document.id, segment_index=start - 1
+            ).one()
+            offset = last.char_offset + len(last.text) + 1
+
+        rows = []
+        for i, text in enumerate(texts):
+            rows.append({
+                'document_id': document.id,
+                'segment_index': start + i,
+                'text': text,
+                'char_offset': offset,
+                'word_count': len(text.split())
+            })
+            offset += len(text) + 1
+
+        db_session.execute(insert(Segment), rows)
+        document.total_segments = start + len(texts)
+        document.word_count = (document.word_count or 0) + sum(row['word_count'] for row in rows)
+
+    def get_range(self, db_session, document_id: str, start: int, count: int) -> List[Segment]:
+        """Return up to count segments starting at index start"""
+        return db_session.query(Segment).filter(
+            Segment.document_id == document_id,
+            Segment.segment_index >= start,
+            Segment.segment_index < start + count
+        ).order_by(Segment.segment_index).all()
+
+    def get_texts(self, db_session, document_id: str) -> List[str]:
+        """Return the text of every segment in order"""
+        rows = db_session.query(Segment.text).filter(
+            Segment.document_id == document_id
+        ).order_by(Segment.segment_index).all()
+        return [row.text for row in rows]
+
+    def get_texts_at(self, db_session, document_id: str, indexes: List[int]) -> Dict[int, str]:
+        """Return the text of the given segments keyed by index"""
+        rows = db_session.query(Segment.segment_index, Segment.text).filter(
+            Segment.document_id == document_id,
+            Segment.segment_index.in_(indexes)
+        ).all()
+        return {row.segment_index: row.text for row in rows}
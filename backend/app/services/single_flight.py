@@ -0,0 +1,76 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process coalescing is available
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class _KeyLock:
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+
+class SingleFlight:
+    """Serialize work on the same key across threads and worker processes
+
+    Callers hold a key while they produce its result. Later callers block
+    until the holder is done and are expected to re-check for the finished
+    result (e.g. a cache entry) before doing the work themselves, so only
+    one of them does the expensive part.
+    """
+
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir
+        os.makedirs(lock_dir, exist_ok=True)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: str):
+        """Hold key exclusively within this process and, via a lock file, across processes"""
+        with self._lock:
+            key_lock = self._locks.get(key)
+            if key_lock is None:
+                key_lock = self._locks[key] = _KeyLock()
+            key_lock.users += 1
+        try:
+            with key_lock.lock:
+                with self._file_lock(key):
+                    yield
+        finally:
+            with self._lock:
+                key_lock.users -= 1
+                if key_lock.users == 0:
+                    del self._locks[key]
+
+    @contextmanager
+    def _file_lock(self, key: str):
+        if fcntl is None:
+            yield
+            return
+
+        path = os.path.join(self.lock_dir, f"{key}.lock")
+        while True:
+            f = open(path, 'a')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # The previous holder unlinks the file on release; retry if we locked a stale inode
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+
+        try:
+            yield
+        finally:
+            os.unlink(path)
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
@@ -0,0 +1,238 @@
+import os
+import time
+import random
+import logging
+from typing import Iterator, List, NamedTuple, Tuple
+from xml.sax.saxutils import escape, quoteattr
+from .synth_pool import SynthesizerPool
+
+logger = logging.getLogger(__name__)
+
+# Backends produce raw 16 kHz, 16-bit, mono PCM; TTSService adds the WAV header
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+
+class AudioFormat(NamedTuple):
+    name: str
+    mimetype: str
+    extension: str
+    sdk_format: str  # SpeechSynthesisOutputFormat member name
+    bytes_per_second: int
+    raw_pcm: bool = False  # Raw PCM gets a WAV header from TTSService and can be sliced
+
+AUDIO_FORMATS = {
+    'wav': AudioFormat('wav', 'audio/wav', '.wav', 'Raw16Khz16BitMonoPcm',
+                       SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS, raw_pcm=True),
+    'mp3': AudioFormat('mp3', 'audio/mpeg', '.mp3', 'Audio16Khz32KBitRateMonoMp3', 4000),
+    'opus': AudioFormat('opus', 'audio/ogg', '.ogg', 'Ogg16Khz16BitMonoOpus', 2000),
+}
+
+# Azure reports audio offsets in 100-nanosecond ticks
+TICKS_PER_SECOND = 10_000_000
+
+def _ticks_to_bytes(ticks: int) -> int:
+    return round(ticks * SAMPLE_RATE / TICKS_PER_SECOND) * SAMPLE_WIDTH * CHANNELS
+
+def build_marked_ssml(texts: List[str], voice_id: str) -> str:
+    """Build SSML that speaks texts in order with a bookmark before each one"""
+    lang = '-'.join(voice_id.split('-')[:2])
+    body = ' '.join(f"<bookmark mark='seg{i}'/>{escape(text)}" for i, text in enumerate(texts))
+    return (
+        f"<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang={quoteattr(lang)}>"
+        f"<voice name={quoteattr(voice_id)}>{body}</voice></speak>"
+    )
+
+class _AzureSynthesizer:
+    """A synthesizer with a pre-opened service connection"""
+
+    def __init__(self, synthesizer, connection):
+        self.synthesizer = synthesizer
+        self.connection = connection
+        self.connected = True
+        connection.disconnected.connect(self._on_disconnected)
+
+    def _on_disconnected(self, evt):
+        self.connected = False
+
+class AzureSpeechBackend:
+    """Synthesize speech with the Azure speech SDK using a pool of warm synthesizers"""
+
+    def __init__(self, speech_key: str, service_region: str, chunk_size: int = 16000,
+                 pool_size: int = None, idle_timeout: float = None):
+        # The SDK loads a large native library; only pay for it when Azure is actually used
+        import azure.cognitiveservices.speech as speechsdk
+        self.sdk = speechsdk
+        self.speech_key = speech_key
+        self.service_region = service_region
+        self.chunk_size = chunk_size
+        self.pool = SynthesizerPool(
+            self._create_synthesizer,
+            max_size=pool_size,
+            idle_timeout=idle_timeout,
+            health_check=lambda synth: synth.connected,
+            close=lambda synth: synth.connection.close()
+        )
+
+    def _create_synthesizer(self, key: Tuple[str, str]) -> _AzureSynthesizer:
+        voice_id, fmt = key
+        speech_config = self.sdk.SpeechConfig(
+            subscription=self.speech_key,
+            region=self.service_region
+        )
+        speech_config.speech_synthesis_voice_name = voice_id
+        speech_config.set_speech_synthesis_output_format(
+            getattr(self.sdk.SpeechSynthesisOutputFormat, AUDIO_FORMATS[fmt].sdk_format)
+        )
+
+        # No audio_config: audio is read from the result stream instead of a file or speaker
+        synthesizer = self.sdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        # Pay the connection and TLS handshake once, not on every segment
+        connection = self.sdk.Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+        logger.info(f"Opened speech synthesizer connection for voice {voice_id} ({fmt})")
+        return _AzureSynthesizer(synthesizer, connection)
+
+    def stream(self, text: str, voice_id: str, fmt: str = 'wav') -> Iterator[bytes]:
+        """Yield audio chunks (raw PCM for wav) as the service produces them"""
+        with self.pool.acquire((voice_id, fmt)) as synth:
+            result = synth.synthesizer.start_speaking_text_async(text).get()
+            if result.reason == self.sdk.ResultReason.Canceled:
+                details = result.cancellation_details
+                raise Exception(f"Speech synthesis failed: {details.reason} {details.error_details}")
+
+            audio_stream = self.sdk.AudioDataStream(result)
+            buffer = bytes(self.chunk_size)
+            while True:
+                filled = audio_stream.read_data(buffer)
+                if filled == 0:
+                    break
+                yield buffer[:filled]
+
+            if audio_stream.status == self.sdk.StreamStatus.Canceled:
+                details = audio_stream.cancellation_details
+                raise Exception(f"Speech synthesis failed: {details.reason} {details.error_details}")
+
+    def synthesize_batch(self, texts: List[str], voice_id: str) -> Tuple[bytes, List[int]]:
+        """Synthesize texts in one SSML request, returning PCM and each text's start byte"""
+        marks = {}
+
+        def on_bookmark(evt):
+            marks[evt.text] = evt.audio_offset
+
+        ssml = build_marked_ssml(texts, voice_id)
+        with self.pool.acquire((voice_id, 'wav')) as synth:
+            synth.synthesizer.bookmark_reached.connect(on_bookmark)
+            try:
+                result = synth.synthesizer.speak_ssml_async(ssml).get()
+            finally:
+                synth.synthesizer.bookmark_reached.disconnect_all()
+
+            if result.reason == self.sdk.ResultReason.Canceled:
+                details = result.cancellation_details
+                raise Exception(f"Speech synthesis failed: {details.reason} {details.error_details}")
+
+        missing = [i for i in range(len(texts)) if f"seg{i}" not in marks]
+        if missing:
+            raise Exception(f"Speech synthesis returned no bookmark for segments: {missing}")
+
+        offsets = [_ticks_to_bytes(marks[f"seg{i}"]) for i in range(len(texts))]
+        # The first bookmark sits at the very start; include any leading silence
+        offsets[0] = 0
+        return result.audio_data, offsets
+
+class _FakeSynthesizer:
+    """Stand-in for a connected synthesizer; tracks connection reuse"""
+
+    def __init__(self, voice_id: str, connection_id: int):
+        self.voice_id = voice_id
+        self.connection_id = connection_id
+        self.closed = False
+
+class FakeSpeechBackend:
+    """Local stand-in synthesizer that emits silent PCM chunks on a timer"""
+
+    def __init__(self, chunk_interval: float = None, seconds_per_word: float = 0.3,
+                 chunk_seconds: float = 0.1, connect_delay: float = None,
+                 request_overhead: float = None, pool_size: int = None, idle_timeout: float = None,
+                 jitter: float = None, error_rate: float = None):
+        self.chunk_interval = chunk_interval if chunk_interval is not None else float(
+            os.getenv('FAKE_TTS_CHUNK_INTERVAL', '0.05')
+        )
+        # Simulated connection setup cost paid once per pooled synthesizer
+        self.connect_delay = connect_delay if connect_delay is not None else float(
+            os.getenv('FAKE_TTS_CONNECT_DELAY', '0.1')
+        )
+        # Simulated round-trip overhead paid once per request
+        self.request_overhead = request_overhead if request_overhead is not None else float(
+            os.getenv('FAKE_TTS_REQUEST_OVERHEAD', '0.05')
+        )
+        # Extra per-request delay drawn uniformly from [0, jitter], and the share of requests that fail
+        self.jitter = jitter if jitter is not None else float(os.getenv('FAKE_TTS_JITTER', '0'))
+        self.error_rate = error_rate if error_rate is not None else float(
+            os.getenv('FAKE_TTS_ERROR_RATE', '0')
+        )
+        self.seconds_per_word = seconds_per_word
+        self.chunk_bytes = int(SAMPLE_RATE * chunk_seconds) * SAMPLE_WIDTH * CHANNELS
+        self.connections = 0
+        self.pool = SynthesizerPool(
+            self._create_synthesizer,
+            max_size=pool_size,
+            idle_timeout=idle_timeout,
+            health_check=lambda synth: not synth.closed,
+            close=self._close_synthesizer
+        )
+
+    def _create_synthesizer(self, key: Tuple[str, str]) -> _FakeSynthesizer:
+        time.sleep(self.connect_delay)
+        self.connections += 1
+        return _FakeSynthesizer(key[0], self.connections)
+
+    def _close_synthesizer(self, synth: _FakeSynthesizer):
+        synth.closed = True
+
+    def _request(self):
+        """Simulate the round trip that starts a synthesis, failing at error_rate"""
+        time.sleep(self.request_overhead + random.uniform(0, self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError("Simulated speech service failure")
+
+    def _audio_bytes(self, text: str, fmt: str = 'wav') -> int:
+        bytes_per_second = AUDIO_FORMATS[fmt].bytes_per_second
+        total = int(max(1, len(text.split())) * self.seconds_per_word * bytes_per_second)
+        return total - total % SAMPLE_WIDTH
+
+    def stream(self, text: str, voice_id: str, fmt: str = 'wav') -> Iterator[bytes]:
+        """Yield placeholder audio sized to the text and format, one chunk per timer tick"""
+        total = self._audio_bytes(text, fmt)
+        # Chunks cover the same stretch of audio time whatever the format
+        chunk_bytes = max(SAMPLE_WIDTH, self.chunk_bytes * AUDIO_FORMATS[fmt].bytes_per_second
+                          // AUDIO_FORMATS['wav'].bytes_per_second)
+        with self.pool.acquire((voice_id, fmt)):
+            self._request()
+            for offset in range(0, total, chunk_bytes):
+                time.sleep(self.chunk_interval)
+                yield bytes(min(chunk_bytes, total - offset))
+
+    def synthesize_batch(self, texts: List[str], voice_id: str) -> Tuple[bytes, List[int]]:
+        """Return silence for all texts in one simulated request, with per-text offsets"""
+        sizes = [self._audio_bytes(text) for text in texts]
+        offsets = [sum(sizes[:i]) for i in range(len(sizes))]
+        with self.pool.acquire((voice_id, 'wav')):
+            self._request()
+            time.sleep(self.chunk_interval * -(-sum(sizes) // self.chunk_bytes))
+            return bytes(sum(sizes)), offsets
+
+def create_speech_backend():
+    """Build the backend selected by TTS_BACKEND ('azure' or 'fake')"""
+    name = os.getenv('TTS_BACKEND', 'azure').lower()
+    if name == 'fake':
+        logger.info("Using fake speech backend")
+        return FakeSpeechBackend()
+
+    speech_key = os.getenv("AZURE_SPEECH_KEY")
+    if not speech_key:
+        error_msg = "Azure Speech Key not found in environment variables"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    return AzureSpeechBackend(speech_key, os.getenv("AZURE_SPEECH_REGION", "eastus"))
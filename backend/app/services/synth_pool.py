@@ -0,0 +1,136 @@
+import os
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+class SynthesizerPool:
+    """Keyed pool of warm, reusable synthesizer objects
+
+    Each key (e.g. a voice and output format) has up to max_size live objects. Idle objects
+    are reused most-recently-used first, closed after idle_timeout seconds,
+    and run through health_check before being handed out again. An object
+    whose use raised is closed rather than returned to the pool.
+    """
+
+    def __init__(self, factory: Callable, max_size: int = None, idle_timeout: float = None,
+                 health_check: Callable = None, close: Callable = None):
+        self.factory = factory
+        self.max_size = max_size or int(os.getenv('TTS_POOL_SIZE', '4'))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(
+            os.getenv('TTS_POOL_IDLE_TIMEOUT', '300')
+        )
+        self.health_check = health_check or (lambda obj: True)
+        self.close = close or (lambda obj: None)
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+        self._idle: Dict[Hashable, deque] = defaultdict(deque)
+        self._live: Dict[Hashable, int] = defaultdict(int)
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def acquire(self, key: Hashable):
+        """Check out a synthesizer for key, blocking while the key's pool is exhausted"""
+        obj = self._checkout(key)
+        ok = False
+        try:
+            yield obj
+            ok = True
+        finally:
+            if ok:
+                self._checkin(key, obj)
+            else:
+                self._discard(key, obj)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'live': sum(self._live.values()),
+                'idle': sum(len(idle) for idle in self._idle.values()),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded
+            }
+
+    def _checkout(self, key):
+        while True:
+            expired = []
+            obj = None
+            with self._cond:
+                while True:
+                    expired.extend(self._reap_idle())
+                    if self._idle[key]:
+                        obj, _ = self._idle[key].pop()
+                        break
+                    if self._live[key] < self.max_size:
+                        self._live[key] += 1
+                        break
+                    self._cond.wait()
+
+            for stale_key, stale in expired:
+                self._close(stale_key, stale)
+
+            if obj is None:
+                try:
+                    obj = self.factory(key)
+                except Exception:
+                    with self._cond:
+                        self._live[key] -= 1
+                        self._cond.notify_all()
+                    raise
+                with self._cond:
+                    self.created += 1
+                return obj
+
+            if self._is_healthy(obj):
+                with self._cond:
+                    self.reused += 1
+                return obj
+            self._discard(key, obj)
+
+    def _checkin(self, key, obj):
+        with self._cond:
+            self._idle[key].append((obj, time.monotonic()))
+            self._cond.notify_all()
+
+    def _discard(self, key, obj):
+        with self._cond:
+            self._live[key] -= 1
+            self.discarded += 1
+            self._cond.notify_all()
+        self._close(key, obj)
+
+    def _reap_idle(self):
+        """Remove idle objects past idle_timeout; caller holds the lock and closes them"""
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        for key, idle in self._idle.items():
+            # Oldest entries are on the left
+            while idle and idle[0][1] < cutoff:
+                obj, _ = idle.popleft()
+                self._live[key] -= 1
+                self.discarded += 1
+                expired.append((key, obj))
+        if expired:
+            self._cond.notify_all()
+        return expired
+
+    def _is_healthy(self, obj) -> bool:
+        try:
+            return bool(self.health_check(obj))
+        except Exception as e:
+            logger.warning(f"Synthesizer health check failed: {str(e)}")
+            return False
+
+    def _close(self, key, obj):
+        try:
+            self.close(obj)
+        except Exception as e:
+            logger.warning(f"Error closing synthesizer for {key}: {str(e)}")
@@ -1,39 +1,121 @@
-import PyPDF2
-from docx import Document
+import io
 import os
 import json
 import logging
-from typing import Dict, List
+import time
+import codecs
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List
+from .metrics import PARSE_SECONDS, SEGMENTATION_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# (path, file, reader) of the PDF a worker process last opened; tasks for one document reuse it
+_worker_pdf = (None, None, None)
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) of the PDF at path in a worker process"""
+    global _worker_pdf
+    if _worker_pdf[0] != path:
+        import PyPDF2
+        if _worker_pdf[1] is not None:
+            _worker_pdf[1].close()
+        f = open(path, 'rb')
+        _worker_pdf = (path, f, PyPDF2.PdfReader(f))
+    reader = _worker_pdf[2]
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+class SegmentBuilder:
+    """Incrementally split streamed text into the same segments as _create_segments"""
+
+    def __init__(self, words_per_segment: int = 100):
+        self.words_per_segment = words_per_segment
+        self._words = []
+        self._tail = ''
+
+    def feed(self, text: str) -> List[str]:
+        """Add a chunk of text and return any segments it completed"""
+        text = self._tail + text
+        words = text.split()
+        # A word touching the end of the chunk may continue in the next one
+        if words and not text[-1].isspace():
+            self._tail = words.pop()
+        else:
+            self._tail = ''
+        self._words.extend(words)
+        return self._drain(final=False)
+
+    def finish(self) -> List[str]:
+        """Flush the remaining words as the last (possibly short) segment"""
+        if self._tail:
+            self._words.append(self._tail)
+            self._tail = ''
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> List[str]:
+        n = self.words_per_segment
+        count = len(self._words) if final else len(self._words) - len(self._words) % n
+        segments = [' '.join(self._words[i:i + n]) for i in range(0, count, n)]
+        del self._words[:count]
+        return segments
+
 class TextParser:
-    def __init__(self):
+    def __init__(self, parallel_page_threshold=None, max_workers=None):
+        # PDFs with fewer pages than this are extracted serially
+        self.parallel_page_threshold = parallel_page_threshold or int(
+            os.getenv('PDF_PARALLEL_PAGE_THRESHOLD', '64')
+        )
+        self.max_workers = max_workers or int(os.getenv('PDF_PARALLEL_WORKERS', '0')) or os.cpu_count() or 1
+        # Shared by all uploads and created on the first large PDF
+        self._pool = None
+        self._pool_lock = threading.Lock()
         self.supported_formats = {
             '.pdf': self._parse_pdf,
             '.docx': self._parse_docx,
             '.txt': self._parse_txt
         }
 
-    def parse_document(self, file) -> Dict:
-        """Parse document and return structured content"""
+    def get_format(self, filename: str) -> str:
+        """Return the document extension, raising ValueError if it is unsupported"""
+        ext = os.path.splitext(filename.lower())[1]
+        if ext not in self.supported_formats:
+            error_msg = f"Unsupported file format: {ext}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        return ext
+
+    def parse_document(self, file, path: str = None) -> Dict:
+        """Parse document and return structured content
+
+        If the upload has already been saved, pass its path so the document
+        is read from disk rather than from the request stream.
+        """
         try:
             filename = file.filename.lower()
-            ext = os.path.splitext(filename)[1]
-            
             logger.info(f"Parsing document: {filename}")
+            ext = self.get_format(filename)
+            started = time.perf_counter()
 
-            if ext not in self.supported_formats:
-                error_msg = f"Unsupported file format: {ext}"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-
-            parser = self.supported_formats[ext]
-            content = parser(file)
+            if ext == '.txt':
+                # Decoded and segmented chunk by chunk; the whole body is never held as one string
+                if path:
+                    with open(path, 'rb') as f:
+                        segments = self._segment_chunks(self._iter_txt(f))
+                else:
+                    segments = self._segment_chunks(self._iter_txt(file))
+            else:
+                parser = self.supported_formats[ext]
+                content = parser(path or file)
 
-            # Structure the content into segments
-            segments = self._create_segments(content)
+                # Structure the content into segments
+                segments = self._create_segments(content)
             
+            PARSE_SECONDS.observe(time.perf_counter() - started, format=ext)
+
             result = {
                 'segments': segments,
                 'total_segments': len(segments),
@@ -52,36 +134,141 @@ class TextParser:
             logger.error(error_msg, exc_info=True)
             raise ValueError(error_msg)
 
+    def iter_pages(self, path: str, ext: str, paragraphs_per_page: int = 50,
+                   txt_chunk_size: int = 64 * 1024) -> Iterator[str]:
+        """Yield the text of a stored document one page (or page-sized block) at a time
+
+        Concatenating the yielded chunks gives the same text as the matching
+        _parse_* method, so feeding them through SegmentBuilder reproduces
+        the eager segments.
+        """
+        if ext == '.pdf':
+            import PyPDF2
+            with open(path, 'rb') as f:
+                for page in PyPDF2.PdfReader(f).pages:
+                    yield page.extract_text()
+        elif ext == '.docx':
+            from docx import Document
+            paragraphs = [p.text for p in Document(path).paragraphs]
+            for i in range(0, len(paragraphs), paragraphs_per_page):
+                yield " ".join(paragraphs[i:i + paragraphs_per_page]) + " "
+        elif ext == '.txt':
+            with open(path, 'rb') as f:
+                yield from self._iter_txt(f, txt_chunk_size)
+        else:
+            raise ValueError(f"Unsupported file format: {ext}")
+
+    def _iter_txt(self, f, chunk_size: int = 64 * 1024) -> Iterator[str]:
+        """Decode a UTF-8 byte stream chunk by chunk"""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+
+    def _segment_chunks(self, chunks: Iterator[str]) -> List[str]:
+        """Segment streamed text without materializing it or its word list"""
+        builder = SegmentBuilder()
+        segments = []
+        # Only the segmenting is timed, not reading and decoding the chunks in between
+        elapsed = 0.0
+        for chunk in chunks:
+            started = time.perf_counter()
+            segments.extend(builder.feed(chunk))
+            elapsed += time.perf_counter() - started
+        started = time.perf_counter()
+        segments.extend(builder.finish())
+        SEGMENTATION_SECONDS.observe(elapsed + time.perf_counter() - started)
+        return segments
+
     def _create_segments(self, text: str, words_per_segment: int = 100) -> List[str]:
         """Split text into manageable segments"""
         try:
-            words = text.split()
-            segments = []
-            
-            for i in range(0, len(words), words_per_segment):
-                segment = ' '.join(words[i:i + words_per_segment])
-                segments.append(segment)
-            
+            with SEGMENTATION_SECONDS.time():
+                words = text.split()
+                segments = []
+
+                for i in range(0, len(words), words_per_segment):
+                    segment = ' '.join(words[i:i + words_per_segment])
+                    segments.append(segment)
+
             return segments
         except Exception as e:
             error_msg = f"Error creating segments: {str(e)}"
             logger.error(error_msg, exc_info=True)
             raise ValueError(error_msg)
 
-    def _parse_pdf(self, file) -> str:
+    def _parse_pdf(self, source) -> str:
+        """Extract PDF text from a file path or a file-like object"""
         try:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            return text
+            # Format libraries are imported on first use so startup does not pay for all of them
+            import PyPDF2
+            if isinstance(source, str):
+                with open(source, 'rb') as f:
+                    return self._extract_pdf(PyPDF2.PdfReader(f), source)
+            data = source.read()
+            return self._extract_pdf(PyPDF2.PdfReader(io.BytesIO(data)), data)
         except Exception as e:
             error_msg = f"Error parsing PDF: {str(e)}"
             logger.error(error_msg, exc_info=True)
             raise ValueError(error_msg)
 
+    def _extract_pdf(self, pdf_reader, source) -> str:
+        page_count = len(pdf_reader.pages)
+
+        if page_count >= self.parallel_page_threshold and self.max_workers > 1:
+            try:
+                return "".join(self._extract_pdf_parallel(source, page_count))
+            except BrokenProcessPool as e:
+                logger.warning(f"Parallel PDF extraction failed, falling back to serial: {str(e)}")
+                self._discard_pool()
+
+        return "".join(page.extract_text() for page in pdf_reader.pages)
+
+    def _extract_pdf_parallel(self, source, page_count: int) -> List[str]:
+        """Extract PDF pages over the process pool, returning page texts in page order"""
+        if not isinstance(source, str):
+            # Workers open the document by path, so bytes are written out once instead of sent per task
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                f.write(source)
+            try:
+                return self._extract_pdf_parallel(f.name, page_count)
+            finally:
+                os.remove(f.name)
+
+        workers = min(self.max_workers, page_count)
+        # Several ranges per worker so uneven pages don't leave workers idle
+        chunk_size = max(1, -(-page_count // (workers * 4)))
+        starts = range(0, page_count, chunk_size)
+
+        logger.info(f"Extracting {page_count} PDF pages with up to {workers} workers")
+        results = self._get_pool().map(
+            _extract_pdf_pages, [source] * len(starts), starts,
+            [min(start + chunk_size, page_count) for start in starts]
+        )
+        return [text for page_texts in results for text in page_texts]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # Spawned rather than forked: forking this multi-threaded process could copy a held
+                # lock (logging, a service's own) into the child and deadlock it
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _discard_pool(self):
+        """Drop a broken pool; the next large PDF starts a new one"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
     def _parse_docx(self, file) -> str:
         try:
+            from docx import Document
             doc = Document(file)
             return " ".join([paragraph.text for paragraph in doc.paragraphs])
         except Exception as e:
@@ -89,9 +276,12 @@ class TextParser:
             logger.error(error_msg, exc_info=True)
             raise ValueError(error_msg)
 
-    def _parse_txt(self, file) -> str:
+    def _parse_txt(self, source) -> str:
         try:
-            return file.read().decode('utf-8')
+            if isinstance(source, str):
+                with open(source, 'rb') as f:
+                    return "".join(self._iter_txt(f))
+            return "".join(self._iter_txt(source))
         except Exception as e:
             error_msg = f"Error parsing TXT: {str(e)}"
             logger.error(error_msg, exc_info=True)
@@ -1,5 +1,3 @@
-import PyPDF2
-from docx import Document
 import io
 
 class TextProcessor:
@@ -19,6 +17,7 @@ class TextProcessor:
     def _process_pdf(self, file):
         """Extract text from PDF files"""
         try:
+            import PyPDF2
             pdf_reader = PyPDF2.PdfReader(file)
             text = ""
             for page in pdf_reader.pages:
@@ -30,6 +29,7 @@ class TextProcessor:
     def _process_docx(self, file):
         """Extract text from DOCX files"""
         try:
+            from docx import Document
             doc = Document(file)
             text = ""
             for paragraph in doc.paragraphs:
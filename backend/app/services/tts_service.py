@@ -1,18 +1,43 @@
 import os
-import azure.cognitiveservices.speech as speechsdk
-from datetime import datetime
 import json
 import hashlib
 import logging
+import queue
+import threading
+import time
+import struct
+import uuid
+from contextlib import ExitStack
+from .audio_cache import AudioCache
+from .single_flight import SingleFlight
+from .metrics import TTS_SECONDS
+from .speech_backends import create_speech_backend, AUDIO_FORMATS, SAMPLE_RATE, SAMPLE_WIDTH, CHANNELS
 
 logger = logging.getLogger(__name__)
 
+# Data size advertised while streaming, before the real length is known
+STREAMING_DATA_SIZE = 0xFFFFFFFF - 36
+
+_DONE = object()
+
+def _wav_header(data_size):
+    """Build a PCM WAV header for data_size bytes of backend audio"""
+    byte_rate = SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, CHANNELS, SAMPLE_RATE, byte_rate, CHANNELS * SAMPLE_WIDTH, SAMPLE_WIDTH * 8,
+        b'data', data_size
+    )
+
 class TTSService:
-    def __init__(self):
-        self.speech_key = os.getenv("AZURE_SPEECH_KEY")
-        self.service_region = os.getenv("AZURE_SPEECH_REGION", "eastus")
+    def __init__(self, backend=None):
+        # Backend from TTS_BACKEND unless one is injected (e.g. FakeSpeechBackend)
+        self.backend = backend or create_speech_backend()
         # Use absolute path for audio cache
-        self.output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'audio_cache'))
+        self.output_dir = os.path.abspath(os.getenv(
+            'AUDIO_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'audio_cache')
+        ))
         self.voices = {
             'en-US-JennyNeural': 'Female, Neutral',
             'en-US-GuyNeural': 'Male, Neutral',
@@ -26,11 +51,16 @@ class TTSService:
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir, exist_ok=True)
             logger.info(f"Created audio cache directory: {self.output_dir}")
-            
-        if not self.speech_key:
-            error_msg = "Azure Speech Key not found in environment variables"
-            logger.error(error_msg)
-            raise ValueError(error_msg)
+
+        self.cache = AudioCache(self.output_dir)
+        # Limits for packing consecutive segments into one synthesis request
+        self.batch_size = int(os.getenv('TTS_BATCH_SIZE', '8'))
+        self.batch_max_chars = int(os.getenv('TTS_BATCH_MAX_CHARS', '5000'))
+        # Offline audio defaults to WAV: only raw PCM can be cut from a batch, compressed formats
+        # (OFFLINE_AUDIO_FORMAT=mp3/opus) are smaller but take one synthesis request per segment
+        self.offline_format = os.getenv('OFFLINE_AUDIO_FORMAT', 'wav')
+        # Coalesces concurrent syntheses of the same cache key
+        self.single_flight = SingleFlight(os.path.join(self.output_dir, '.locks'))
 
     def get_available_voices(self):
         """Return list of available voices"""
@@ -42,74 +72,232 @@ class TTSService:
             logger.error(error_msg, exc_info=True)
             raise ValueError(error_msg)
 
-    def convert_to_speech(self, text, voice_id='en-US-JennyNeural', cache=True):
-        """Convert text to speech using Azure TTS"""
+    def convert_to_speech(self, text, voice_id='en-US-JennyNeural', cache=True, fmt='wav'):
+        """Convert text to speech using the configured speech backend"""
         try:
-            logger.info(f"Converting text to speech using voice: {voice_id}")
+            logger.info(f"Converting text to speech using voice: {voice_id} ({fmt})")
             
-            if voice_id not in self.voices:
-                error_msg = f"Invalid voice ID: {voice_id}"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-
-            # Generate cache key based on text and voice
-            cache_key = self._generate_cache_key(text, voice_id)
-            cache_path = os.path.join(self.output_dir, f"{cache_key}.wav")
-            logger.info(f"Audio cache path: {cache_path}")
+            started = time.perf_counter()
+            cache_key = self._get_cache_key(text, voice_id, fmt)
 
             # Check cache first
-            if cache and os.path.exists(cache_path):
-                logger.info(f"Using cached audio: {cache_path}")
-                return cache_path
-
-            # Create speech configuration
-            speech_config = speechsdk.SpeechConfig(
-                subscription=self.speech_key, 
-                region=self.service_region
-            )
-            
-            # Set speech synthesis voice
-            speech_config.speech_synthesis_voice_name = voice_id
-            
-            # Create audio configuration with absolute path
-            audio_config = speechsdk.audio.AudioOutputConfig(filename=cache_path)
-            
-            # Create speech synthesizer
-            synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=speech_config, 
-                audio_config=audio_config
-            )
-
-            # Start the synthesis
-            result = synthesizer.speak_text_async(text).get()
-
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                logger.info(f"Speech synthesis completed: {cache_path}")
-                if not os.path.exists(cache_path):
-                    raise FileNotFoundError(f"Audio file not found after synthesis: {cache_path}")
-                return cache_path
-            else:
-                error_msg = f"Speech synthesis failed: {result.reason}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
+            if cache:
+                cache_path = self.cache.get(cache_key)
+                if cache_path:
+                    logger.info(f"Using cached audio: {cache_path}")
+                    TTS_SECONDS.observe(time.perf_counter() - started, cache='hit')
+                    return cache_path
+
+            cache_path = self.cache.path_for(cache_key)
+            with self.single_flight.hold(cache_key):
+                # Another request may have synthesized this while we waited
+                if cache and self.cache.contains(cache_key):
+                    logger.info(f"Using audio synthesized by a concurrent request: {cache_path}")
+                    TTS_SECONDS.observe(time.perf_counter() - started, cache='miss')
+                    return cache_path
+
+                for _ in self._stream_to_cache(text, voice_id, cache_key, fmt):
+                    pass
+
+            logger.info(f"Speech synthesis completed: {cache_path}")
+            TTS_SECONDS.observe(time.perf_counter() - started, cache='miss')
+            return cache_path
 
         except Exception as e:
             error_msg = f"Error in text-to-speech conversion: {str(e)}"
             logger.error(error_msg, exc_info=True)
             raise
 
+    def convert_batch(self, texts, voice_id='en-US-JennyNeural', fmt='wav'):
+        """Synthesize several segments in one request and cache each one separately
+
+        Returns the cached audio path for every text, in order. Segments already
+        cached are not re-synthesized; the rest are sent as one SSML request and
+        the audio is cut back into segments at bookmark offsets. Only raw PCM
+        can be cut this way, so compressed formats synthesize segment by segment.
+        """
+        try:
+            keys = [self._get_cache_key(text, voice_id, fmt) for text in texts]
+            missing = {key: text for key, text in zip(keys, texts) if not self.cache.contains(key)}
+
+            if len(missing) == 1 or not self.get_format(fmt).raw_pcm:
+                for text in missing.values():
+                    self.convert_to_speech(text, voice_id, fmt=fmt)
+            elif missing:
+                with ExitStack() as stack:
+                    # Sorted so overlapping batches always lock keys in the same order
+                    for key in sorted(missing):
+                        stack.enter_context(self.single_flight.hold(key))
+                    missing = {key: text for key, text in missing.items() if not self.cache.contains(key)}
+                    if missing:
+                        self._synthesize_batch(list(missing.items()), voice_id)
+
+            return [self.cache.path_for(key) for key in keys]
+
+        except Exception as e:
+            error_msg = f"Error in batched text-to-speech conversion: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            raise
+
+    def iter_batches(self, items, text=lambda item: item):
+        """Group consecutive items into batches within the size and character limits"""
+        batch, chars = [], 0
+        for item in items:
+            length = len(text(item))
+            if batch and (len(batch) >= self.batch_size or chars + length > self.batch_max_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append(item)
+            chars += length
+        if batch:
+            yield batch
+
+    def _synthesize_batch(self, items, voice_id):
+        """Synthesize (cache_key, text) pairs in one request and cache each slice as WAV"""
+        logger.info(f"Synthesizing batch of {len(items)} segments using voice: {voice_id}")
+        pcm, offsets = self.backend.synthesize_batch([text for _, text in items], voice_id)
+        audio = memoryview(pcm)
+        bounds = offsets + [len(pcm)]
+        for i, (cache_key, _) in enumerate(items):
+            data = audio[bounds[i]:bounds[i + 1]]
+            tmp_path = f"{self.cache.path_for(cache_key)}.{uuid.uuid4().hex}.part"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(_wav_header(len(data)))
+                    f.write(data)
+                self.cache.put(cache_key, tmp_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def get_format(self, fmt):
+        """Return the AudioFormat for a format name, raising ValueError if unknown"""
+        if fmt not in AUDIO_FORMATS:
+            error_msg = f"Unsupported audio format: {fmt}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        return AUDIO_FORMATS[fmt]
+
+    def negotiate_format(self, accept_mimetypes):
+        """Pick a format name from a Werkzeug Accept header, preferring wav on ties"""
+        by_mimetype = {f.mimetype: name for name, f in AUDIO_FORMATS.items()}
+        best = accept_mimetypes.best_match(list(by_mimetype), default='audio/wav')
+        return by_mimetype[best]
+
+    def get_cached_audio(self, text, voice_id='en-US-JennyNeural', fmt='wav'):
+        """Return the cached audio path for text, voice and format, or None on a miss"""
+        started = time.perf_counter()
+        cache_path = self.cache.get(self._get_cache_key(text, voice_id, fmt))
+        if cache_path:
+            TTS_SECONDS.observe(time.perf_counter() - started, cache='hit')
+        return cache_path
+
+    def stream_speech(self, text, voice_id='en-US-JennyNeural', fmt='wav'):
+        """Return a generator of audio bytes that also fills the cache as it streams"""
+        cache_key = self._get_cache_key(text, voice_id, fmt)
+        logger.info(f"Streaming speech synthesis for cache key: {cache_key}")
+        return self._stream_single_flight(text, voice_id, cache_key, fmt)
+
+    def _stream_single_flight(self, text, voice_id, cache_key, fmt):
+        """Stream a synthesis, or the cached result of a concurrent identical one
+
+        The key is held only until the cache file is complete: synthesis runs
+        on its own thread and its chunks are relayed through a queue, so a
+        slow client never keeps waiters blocked. A waiter gets the finished
+        file, opened before the key is released, and reads it after.
+        """
+        chunks = queue.Queue()
+        threading.Thread(
+            target=self._fill_cache, args=(text, voice_id, cache_key, fmt, chunks),
+            name='tts-stream', daemon=True
+        ).start()
+
+        while True:
+            item, error = chunks.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            if hasattr(item, 'read'):
+                with item:
+                    while True:
+                        chunk = item.read(64 * 1024)
+                        if not chunk:
+                            return
+                        yield chunk
+            yield item
+
+    def _fill_cache(self, text, voice_id, cache_key, fmt, chunks):
+        """Synthesize into the cache under the key, putting (chunk, None) on chunks as it goes
+
+        Runs to completion even if the client goes away, so waiters always
+        get the cached file.
+        """
+        started = time.perf_counter()
+        try:
+            with self.single_flight.hold(cache_key):
+                if self.cache.contains(cache_key):
+                    chunks.put((open(self.cache.path_for(cache_key), 'rb'), None))
+                    TTS_SECONDS.observe(time.perf_counter() - started, cache='miss')
+                    return
+                for chunk in self._stream_to_cache(text, voice_id, cache_key, fmt):
+                    chunks.put((chunk, None))
+            # Until the whole segment is synthesized, as convert_to_speech measures it
+            TTS_SECONDS.observe(time.perf_counter() - started, cache='miss')
+            chunks.put((_DONE, None))
+        except Exception as e:
+            logger.error(f"Error streaming speech for cache key {cache_key}: {str(e)}", exc_info=True)
+            chunks.put((None, e))
+
+    def _get_cache_key(self, text, voice_id, fmt='wav'):
+        if voice_id not in self.voices:
+            error_msg = f"Invalid voice ID: {voice_id}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        # Generate cache key based on text and voice; the extension keys the format
+        return f"{self._generate_cache_key(text, voice_id)}{self.get_format(fmt).extension}"
+
+    def _stream_to_cache(self, text, voice_id, cache_key, fmt='wav'):
+        """Yield an audio stream while writing it to a temp file that is then added to the cache"""
+        raw_pcm = self.get_format(fmt).raw_pcm
+        tmp_path = f"{self.cache.path_for(cache_key)}.{uuid.uuid4().hex}.part"
+        completed = False
+        try:
+            with open(tmp_path, 'wb') as f:
+                if raw_pcm:
+                    f.write(_wav_header(0))
+                    yield _wav_header(STREAMING_DATA_SIZE)
+
+                data_size = 0
+                for chunk in self.backend.stream(text, voice_id, fmt):
+                    f.write(chunk)
+                    data_size += len(chunk)
+                    yield chunk
+
+                if raw_pcm:
+                    # Patch in the real length now that synthesis has finished
+                    f.seek(0)
+                    f.write(_wav_header(data_size))
+
+            self.cache.put(cache_key, tmp_path)
+            completed = True
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     def _generate_cache_key(self, text, voice_id):
         """Generate a unique cache key for the text and voice combination"""
         data = f"{text}{voice_id}".encode('utf-8')
         return hashlib.md5(data).hexdigest()
 
-    def prepare_offline_audio(self, segments, voice_id='en-US-JennyNeural'):
+    def prepare_offline_audio(self, segments, voice_id='en-US-JennyNeural', fmt=None):
         """Prepare audio files for offline use"""
         try:
+            fmt = fmt or self.offline_format
             audio_files = []
-            for segment in segments:
-                audio_path = self.convert_to_speech(segment, voice_id)
-                audio_files.append(audio_path)
+            for batch in self.iter_batches(segments):
+                audio_files.extend(self.convert_batch(batch, voice_id, fmt))
             return audio_files
         except Exception as e:
             error_msg = f"Error preparing offline audio: {str(e)}"
@@ -117,17 +305,10 @@ class TTSService:
             raise
 
     def cleanup_old_files(self, max_age_hours=24):
-        """Clean up old audio files"""
+        """Clean up audio files not played within max_age_hours"""
         try:
-            current_time = datetime.now()
-            for filename in os.listdir(self.output_dir):
-                file_path = os.path.join(self.output_dir, filename)
-                file_age = datetime.fromtimestamp(os.path.getctime(file_path))
-                age_hours = (current_time - file_age).total_seconds() / 3600
-                
-                if age_hours > max_age_hours:
-                    os.remove(file_path)
-                    logger.info(f"Removed old audio file: {file_path}")
+            removed = self.cache.expire(max_age_hours * 3600)
+            logger.info(f"Removed {removed} old audio files")
         except Exception as e:
             error_msg = f"Error cleaning up old files: {str(e)}"
             logger.error(error_msg, exc_info=True)
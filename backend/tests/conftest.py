@@ -0,0 +1,64 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Every path the app writes to lives in one throwaway directory, set before app modules read them
+WORKDIR = tempfile.mkdtemp(prefix='readit-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(WORKDIR, 'readit.db')}",
+    'AUDIO_CACHE_DIR': os.path.join(WORKDIR, 'audio_cache'),
+    'UPLOAD_DIR': os.path.join(WORKDIR, 'uploads'),
+    'RETRIEVAL_INDEX_DIR': os.path.join(WORKDIR, 'indexes'),
+    'PROGRESS_BUFFER_DB': os.path.join(WORKDIR, 'progress_buffer.db'),
+    'PROGRESS_FLUSH_INTERVAL': '3600',
+    'TTS_BACKEND': 'fake',
+    'FAKE_TTS_CHUNK_INTERVAL': '0',
+    'FAKE_TTS_CONNECT_DELAY': '0',
+    'FAKE_TTS_REQUEST_OVERHEAD': '0',
+    'AI_CACHE_DB': ''
+})
+
+# Run from anywhere: the app package lives next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.speech_backends import FakeSpeechBackend  # noqa: E402
+
+@pytest.fixture
+def fake_backend():
+    """Fake synthesizer fast enough for tests but still streaming in several chunks"""
+    return FakeSpeechBackend(chunk_interval=0.005, seconds_per_word=0.3, chunk_seconds=0.1,
+                             connect_delay=0, request_overhead=0, pool_size=2)
+
+@pytest.fixture
+def tts_service(tmp_path, monkeypatch, fake_backend):
+    from app.services.tts_service import TTSService
+
+    monkeypatch.setenv('AUDIO_CACHE_DIR', str(tmp_path / 'audio_cache'))
+    return TTSService(backend=fake_backend)
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    from app.routes import services
+
+    yield create_app()
+    # Flush here rather than at exit, when pytest has already closed the log streams
+    progress = services.peek('progress')
+    if progress is not None:
+        progress.close()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def upload(client):
+    """Upload text as a document and return the new session's JSON"""
+    def upload(text, filename='document.txt', **form):
+        response = client.post('/upload', data=dict(form, file=(io.BytesIO(text.encode('utf-8')), filename)))
+        assert response.status_code == 200, response.json
+        return response.json
+    return upload
@@ -0,0 +1,72 @@
+import os
+import time
+
+import pytest
+
+from app.database import SessionFactory
+from app.models.session import ReadingSession
+from app.routes import services
+
+class RecordingAssistant:
+    """Stands in for AIAssistant and keeps the context each question was sent with"""
+
+    def __init__(self):
+        self.contexts = []
+
+    async def ask_question(self, question, context):
+        self.contexts.append(context)
+        return 'answer'
+
+@pytest.fixture
+def assistant(monkeypatch):
+    assistant = RecordingAssistant()
+    monkeypatch.setitem(services._instances, 'ai_assistant', assistant)
+    return assistant
+
+def _document(matching, segments=10):
+    """One 100-word segment per index; those in matching mention zebras"""
+    return ' '.join(
+        ' '.join(f'seg{i}word{j}' for j in range(99)) + (' zebra' if i in matching else ' filler')
+        for i in range(segments)
+    )
+
+def _segments_in(context):
+    return {int(word[3:word.index('word')]) for word in context.split() if word.startswith('seg')}
+
+def _document_id(session_id):
+    db_session = SessionFactory()
+    try:
+        return db_session.get(ReadingSession, session_id).document_id
+    finally:
+        db_session.close()
+
+def test_ask_sends_only_the_top_k_segments(client, upload, assistant):
+    session_id = upload(_document(matching={2, 3, 4, 5, 6, 7}), 'zebras.txt')['session_id']
+
+    response = client.post('/ask', json={'question': 'zebra', 'sessionId': session_id, 'currentSegment': 0})
+
+    assert response.status_code == 200
+    top_k = services.get('retrieval').top_k
+    segments = _segments_in(assistant.contexts[-1])
+    # The current segment plus the best top_k matches, never the whole document
+    assert 0 in segments
+    assert len(segments) == top_k + 1
+    assert segments - {0} <= {2, 3, 4, 5, 6, 7}
+
+def test_ask_rejects_a_non_integer_current_segment(client, upload, assistant):
+    session_id = upload(_document(matching={1}), 'bad-segment.txt')['session_id']
+
+    response = client.post('/ask', json={'question': 'zebra', 'sessionId': session_id, 'currentSegment': 'abc'})
+
+    assert response.status_code == 400
+    assert client.post('/ask', json=['zebra']).status_code == 400
+    assert assistant.contexts == []
+
+def test_lazy_upload_builds_the_retrieval_index(upload):
+    session_id = upload(_document(matching={4}, segments=3) + ' lazyindex', 'lazy.txt', lazy='true')['session_id']
+    path = services.get('retrieval')._path(_document_id(session_id))
+
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert os.path.exists(path)
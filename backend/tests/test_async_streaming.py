@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+
+from app.services.async_runner import AsyncRunner
+from tools.fake_openai import ANSWER, serve
+
+@pytest.fixture(scope='module')
+def runner():
+    return AsyncRunner()
+
+@pytest.fixture
+def fake_openai():
+    server = serve(port=0, first_token_delay=0.05, token_interval=0.02)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def assistant(fake_openai, monkeypatch):
+    from app.services.ai_assistant import AIAssistant
+
+    host, port = fake_openai.server_address
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    monkeypatch.setenv('OPENAI_API_BASE', f'http://{host}:{port}/v1')
+    monkeypatch.setenv('AI_CACHE_DB', '')
+    return AIAssistant()
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_iterate_yields_items_and_raises_producer_errors(runner):
+    async def numbers():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield i
+        raise ValueError('upstream failed')
+
+    items = []
+    with pytest.raises(ValueError):
+        for item in runner.iterate(numbers):
+            items.append(item)
+    assert items == [0, 1, 2]
+
+def test_closing_the_consumer_cancels_the_producer(runner):
+    events = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield 'token'
+        except asyncio.CancelledError:
+            events.append('cancelled')
+            raise
+        finally:
+            events.append('closed')
+
+    stream = runner.iterate(endless)
+    assert next(stream) == 'token'
+    stream.close()
+
+    assert _wait_for(lambda: 'closed' in events)
+    assert events == ['cancelled', 'closed']
+
+def test_stream_answer_forwards_tokens_and_caches_the_answer(runner, assistant):
+    tokens = list(runner.iterate(lambda: assistant.stream_answer('What is it?', 'Some context')))
+
+    assert len(tokens) > 1
+    assert ''.join(tokens).strip() == ANSWER
+    key = assistant.cache.make_key(assistant.model, 'What is it?', 'Some context')
+    assert assistant.cache.get(key) == ''.join(tokens)
+
+def test_abandoned_answer_drops_the_upstream_request(runner, assistant, caplog):
+    caplog.set_level(logging.INFO, logger='fake_openai')
+
+    stream = runner.iterate(lambda: assistant.stream_answer('Why?', 'Some context'))
+    next(stream)
+    stream.close()
+
+    assert _wait_for(lambda: 'Client disconnected' in caplog.text)
+    key = assistant.cache.make_key(assistant.model, 'Why?', 'Some context')
+    # A partial answer is never cached
+    assert assistant.cache.get(key) is None
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from app.routes import services
+from app.services.audio_cache import AudioCache
+
+def _put(cache, key, size):
+    tmp_path = cache.path_for(f'{key}.part')
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * size)
+    return cache.put(key, tmp_path)
+
+def _cached(cache):
+    return {key for key in os.listdir(cache.cache_dir) if key.startswith('k')}
+
+def test_puts_past_the_budget_evict_down_to_the_low_watermark(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1000)
+    for i in range(3):
+        _put(cache, f'k{i}', 300)
+    assert cache.stats()['evictions'] == 0
+
+    _put(cache, 'k3', 300)
+
+    stats = cache.stats()
+    assert stats['bytes'] <= cache.low_watermark
+    assert stats['bytes'] == sum(os.path.getsize(cache.path_for(key)) for key in _cached(cache))
+    assert _cached(cache) == {'k1', 'k2', 'k3'}
+
+def test_lru_evicts_the_least_recently_read(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1000, policy='lru')
+    for i in range(3):
+        _put(cache, f'k{i}', 300)
+    assert cache.get('k0') is not None
+
+    _put(cache, 'k3', 300)
+
+    assert _cached(cache) == {'k0', 'k2', 'k3'}
+
+def test_lfu_evicts_the_least_often_read(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1000, policy='lfu')
+    for i in range(3):
+        _put(cache, f'k{i}', 300)
+    for _ in range(3):
+        cache.get('k0')
+    cache.get('k1')
+    cache.get('k1')
+    # Read last, but only once
+    cache.get('k2')
+
+    _put(cache, 'k3', 300)
+
+    assert _cached(cache) == {'k0', 'k1', 'k3'}
+
+def test_processes_sharing_a_directory_share_one_budget(tmp_path):
+    first = AudioCache(str(tmp_path), max_bytes=1000)
+    second = AudioCache(str(tmp_path), max_bytes=1000)
+    _put(first, 'k0', 300)
+    _put(first, 'k1', 300)
+    assert second.stats()['bytes'] == 600
+
+    # Reads made by one process count when the other picks victims
+    first.get('k0')
+    first.flush()
+    _put(second, 'k2', 300)
+    _put(second, 'k3', 300)
+
+    assert _cached(first) == {'k0', 'k2', 'k3'}
+    assert first.stats()['bytes'] == second.stats()['bytes'] == 900
+    assert first.get('k1') is None
+
+def test_a_new_index_adopts_files_already_in_the_directory(tmp_path):
+    (tmp_path / 'k0').write_bytes(b'\0' * 100)
+
+    cache = AudioCache(str(tmp_path), max_bytes=1000)
+
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == 100
+
+def test_tts_synthesizes_again_if_the_file_is_evicted_before_it_is_sent(client, monkeypatch):
+    tts_service = services.get('tts_service')
+    convert_to_speech = tts_service.convert_to_speech
+    paths = []
+
+    def evicting_convert(*args, **kwargs):
+        path = convert_to_speech(*args, **kwargs)
+        if not paths:
+            # Another request's put() evicts it before send_file opens it
+            tts_service.cache.discard(os.path.basename(path))
+        paths.append(path)
+        return path
+
+    monkeypatch.setattr(tts_service, 'convert_to_speech', evicting_convert)
+
+    response = client.post('/tts', json={'text': 'evicted before sending', 'format': 'wav'})
+
+    assert response.status_code == 200
+    assert len(paths) == 2
+    assert response.data[:4] == b'RIFF'
+
+def test_unknown_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AudioCache(str(tmp_path), policy='mru')
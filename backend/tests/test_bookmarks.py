@@ -0,0 +1,69 @@
+import pytest
+
+@pytest.fixture
+def session_id(upload):
+    return upload('A short document to bookmark.')['session_id']
+
+def _create(client, session_id, items):
+    response = client.post(f'/session/{session_id}/bookmark', json={'bookmarks': items})
+    assert response.status_code == 201
+    return response.json['bookmarks']
+
+def test_single_create_is_201_on_both_routes(client, session_id):
+    response = client.post(f'/session/{session_id}/bookmark', json={'segment_index': 2, 'note': 'here'})
+    assert response.status_code == 201
+    assert (response.json['segment_index'], response.json['position'], response.json['note']) == (2, 0, 'here')
+
+    response = client.post('/bookmarks', json={'sessionId': session_id, 'segmentIndex': 1, 'position': 4})
+    assert response.status_code == 201
+    assert (response.json['segment_index'], response.json['position']) == (1, 4)
+
+def test_listing_is_in_reading_order_and_paged(client, session_id):
+    _create(client, session_id, [{'segment_index': s, 'position': p} for s, p in
+                                 [(3, 0), (1, 9), (1, 2), (0, 5), (2, 1)]])
+
+    page = client.get(f'/session/{session_id}/bookmark', query_string={'start': 1, 'count': 3}).json
+    assert (page['start'], page['count'], page['total']) == (1, 3, 5)
+    assert [(b['segment_index'], b['position']) for b in page['bookmarks']] == [(1, 2), (1, 9), (2, 1)]
+
+    response = client.get(f'/bookmarks/{session_id}', query_string={'count': 2})
+    assert response.headers['X-Total-Count'] == '5'
+    assert [(b['segment_index'], b['position']) for b in response.json] == [(0, 5), (1, 2)]
+
+def test_bulk_delete_removes_only_the_sessions_bookmarks(client, session_id, upload):
+    created = _create(client, session_id, [{'segment_index': i} for i in range(4)])
+    other = upload('Another document entirely.')['session_id']
+    foreign = _create(client, other, [{'segment_index': 0}])
+
+    ids = [created[0]['id'], created[2]['id'], foreign[0]['id'], 'missing']
+    response = client.delete(f'/session/{session_id}/bookmark', json={'ids': ids})
+
+    assert response.json['deleted'] == 2
+    assert client.get(f'/session/{session_id}/bookmark').json['total'] == 2
+    assert client.get(f'/session/{other}/bookmark').json['total'] == 1
+
+@pytest.mark.parametrize('body', [
+    {'segment_index': [1]},
+    {'segment_index': '1'},
+    {'segment_index': -1},
+    {'segment_index': True},
+    {'segment_index': 1, 'position': 'start'},
+    {'segment_index': 1, 'note': 5},
+    {'bookmarks': {'segment_index': 1}},
+    {'bookmarks': [1, 2]},
+    {'bookmarks': [{'segment_index': 1}, {'segment_index': 'x'}]},
+    [{'segment_index': 1}]
+])
+def test_malformed_creates_are_rejected(client, session_id, body):
+    assert client.post(f'/session/{session_id}/bookmark', json=body).status_code == 400
+    # Nothing from a partly valid batch is stored
+    assert client.get(f'/session/{session_id}/bookmark').json['total'] == 0
+
+def test_missing_bodies_are_rejected(client, session_id):
+    assert client.post(f'/session/{session_id}/bookmark', data='x').status_code == 400
+    assert client.post('/bookmarks', data='x').status_code == 400
+    assert client.post('/bookmarks', json={'sessionId': session_id, 'segmentIndex': [0]}).status_code == 400
+
+@pytest.mark.parametrize('body', [{'ids': 'abc'}, {'ids': [1, 2]}, ['abc'], {}])
+def test_malformed_deletes_are_rejected(client, session_id, body):
+    assert client.delete(f'/session/{session_id}/bookmark', json=body).status_code == 400
@@ -0,0 +1,77 @@
+import hashlib
+import os
+
+import pytest
+
+from app import UploadRequest
+from app.database import SessionFactory
+from app.models.session import Document, ReadingSession
+from app.routes import services
+
+def _document(session_id):
+    db_session = SessionFactory()
+    try:
+        session = db_session.get(ReadingSession, session_id)
+        return db_session.get(Document, session.document_id)
+    finally:
+        db_session.close()
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Count the documents actually parsed"""
+    text_parser = services.get('text_parser')
+    parse_document = text_parser.parse_document
+    calls = []
+
+    def counting_parse(file, path=None):
+        calls.append(file.filename)
+        return parse_document(file, path=path)
+
+    monkeypatch.setattr(text_parser, 'parse_document', counting_parse)
+    return calls
+
+def test_same_bytes_share_one_parsed_document(upload, parses):
+    text = 'Uploaded by two readers, parsed once.'
+    first = upload(text, 'first-copy.txt')['session_id']
+    path = _document(first).path
+    stored_at = os.stat(path).st_mtime_ns
+
+    second = upload(text, 'second-copy.txt')['session_id']
+
+    document = _document(second)
+    assert document.id == _document(first).id
+    assert document.ref_count == 2
+    assert parses == ['first-copy.txt']
+    # Recognized from the spooled hash, so the stored copy is not written again
+    assert os.stat(path).st_mtime_ns == stored_at
+
+def test_different_bytes_get_their_own_document(upload):
+    first = upload('One text.', 'one.txt')['session_id']
+    second = upload('Another text.', 'another.txt')['session_id']
+
+    assert _document(first).id != _document(second).id
+    assert _document(first).ref_count == _document(second).ref_count == 1
+
+@pytest.mark.parametrize('spool_bytes', [1024 * 1024, 512])
+def test_upload_is_stored_under_the_hash_of_its_bytes(upload, monkeypatch, spool_bytes):
+    # 512 bytes makes the upload roll over from memory to a temporary file
+    monkeypatch.setattr(UploadRequest, 'spool_max_size', spool_bytes)
+    text = ' '.join(f'hashed{spool_bytes}-{i}' for i in range(400))
+    data = text.encode('utf-8')
+
+    document = _document(upload(text, 'hashed.txt')['session_id'])
+
+    assert document.content_hash == hashlib.sha256(data).hexdigest()
+    assert document.size == len(data)
+    with open(document.path, 'rb') as f:
+        assert f.read() == data
+
+def test_a_missing_stored_copy_is_written_again(upload):
+    text = 'Stored, removed, uploaded again.'
+    document = _document(upload(text, 'again.txt')['session_id'])
+    os.remove(document.path)
+
+    upload(text, 'again.txt')
+
+    with open(document.path, 'rb') as f:
+        assert f.read() == text.encode('utf-8')
@@ -0,0 +1,135 @@
+import pytest
+
+from app.database import SessionFactory
+from app.models.session import Document
+from app.routes import services
+from app.services.materializer import DocumentMaterializer
+from app.services.segment_store import SegmentStore
+
+def _page(start, words=100):
+    return ' '.join(f'word{i}' for i in range(start, start + words)) + ' '
+
+class PagedParser:
+    """Yields one 100-word page at a time, optionally failing at page fail_at"""
+
+    def __init__(self, pages, fail_at=None):
+        self.pages = pages
+        self.fail_at = fail_at
+        self.opened = 0
+
+    def iter_pages(self, path, ext):
+        self.opened += 1
+        for i in range(self.pages):
+            if i == self.fail_at:
+                raise ValueError('page is corrupt')
+            yield _page(i * 100)
+
+@pytest.fixture
+def document_id(app, tmp_path):
+    db_session = SessionFactory()
+    try:
+        document = services.get('document_store').create(
+            db_session, f'lazy-{tmp_path.name}', '.txt', 0, str(tmp_path / 'lazy.txt'), materialized=False
+        )
+        db_session.commit()
+        return document.id
+    finally:
+        db_session.close()
+
+def _materializer(parser, **settings):
+    materializer = DocumentMaterializer(parser, SessionFactory, SegmentStore())
+    materializer.initial_pages = 1
+    materializer.batch_pages = 1
+    materializer.lookahead = 0
+    materializer.background = False
+    for name, value in settings.items():
+        setattr(materializer, name, value)
+    return materializer
+
+def _texts(document_id):
+    db_session = SessionFactory()
+    try:
+        return SegmentStore().get_texts(db_session, document_id)
+    finally:
+        db_session.close()
+
+def test_begin_stores_only_the_first_pages(document_id):
+    materializer = _materializer(PagedParser(pages=5))
+
+    initial = materializer.begin(document_id, 'lazy.txt', '.txt')
+
+    assert initial['complete'] is False
+    assert initial['segments'] == [_page(0).strip()]
+    status = materializer.status(document_id)
+    assert status['ready_segments'] == 1
+    assert status['total_segments'] is None
+    assert status['in_progress'] is True
+    assert status['error'] is None
+
+def test_ensure_extracts_up_to_the_requested_segment(document_id):
+    materializer = _materializer(PagedParser(pages=5))
+    materializer.begin(document_id, 'lazy.txt', '.txt')
+
+    materializer.ensure(document_id, 2)
+    assert materializer.status(document_id)['ready_segments'] == 3
+
+    materializer.ensure(document_id, 10)
+    status = materializer.status(document_id)
+    assert status['complete'] is True
+    assert status['total_segments'] == 5
+    assert status['in_progress'] is False
+    # Same segments an eager parse of the whole text gives
+    assert _texts(document_id) == [_page(i * 100).strip() for i in range(5)]
+
+def test_a_process_that_lost_the_state_resumes_without_duplicates(document_id):
+    parser = PagedParser(pages=4)
+    _materializer(parser).begin(document_id, 'lazy.txt', '.txt')
+
+    # e.g. another worker process, or this one after a restart
+    _materializer(parser).ensure(document_id, 10)
+
+    assert parser.opened == 2
+    assert _texts(document_id) == [_page(i * 100).strip() for i in range(4)]
+
+def test_background_failure_is_recorded_and_reported(document_id):
+    materializer = _materializer(PagedParser(pages=5, fail_at=2))
+    materializer.begin(document_id, 'lazy.txt', '.txt')
+
+    # What the background task runs, on this thread
+    materializer._run(document_id)
+
+    status = materializer.status(document_id)
+    assert status['error'] == 'page is corrupt'
+    assert status['complete'] is False
+    assert status['in_progress'] is False
+    assert status['ready_segments'] == 2
+
+    # Failed documents are not reopened, and the half-read pages are never marked complete
+    materializer.ensure(document_id, 4)
+    db_session = SessionFactory()
+    try:
+        document = db_session.get(Document, document_id)
+        assert document.materialized is False
+        assert document.total_segments == 2
+    finally:
+        db_session.close()
+
+def test_completion_callback_runs_once_the_document_is_stored(document_id):
+    completed = []
+    materializer = _materializer(PagedParser(pages=2), on_complete=completed.append)
+    materializer.begin(document_id, 'lazy.txt', '.txt')
+
+    materializer.ensure(document_id, 10)
+    materializer._executor.shutdown(wait=True)
+
+    assert completed == [document_id]
+
+def test_status_endpoint_reports_lazy_progress(client, upload):
+    session_id = upload(' '.join(f'word{i}' for i in range(300)), 'lazy-status.txt', lazy='true')['session_id']
+
+    status = client.get(f'/session/{session_id}/segments/status').json
+
+    assert status['session_id'] == session_id
+    assert status['complete'] is True
+    assert status['total_segments'] == 3
+    assert status['error'] is None
@@ -0,0 +1,36 @@
+import io
+
+from app.services.metrics import SEGMENTATION_SECONDS, TTS_SECONDS
+
+def _count(histogram, **labels):
+    """Observations recorded so far in one series"""
+    key = tuple(str(labels.get(name, '')) for name in histogram.labelnames)
+    series = histogram._series.get(key)
+    return sum(series[0]) if series else 0
+
+def test_streamed_synthesis_and_cached_lookups_are_timed(tts_service):
+    misses, hits = _count(TTS_SECONDS, cache='miss'), _count(TTS_SECONDS, cache='hit')
+
+    list(tts_service.stream_speech('Streamed once and timed.'))
+    assert _count(TTS_SECONDS, cache='miss') == misses + 1
+
+    assert tts_service.get_cached_audio('Streamed once and timed.') is not None
+    assert tts_service.get_cached_audio('Never synthesized.') is None
+    assert _count(TTS_SECONDS, cache='hit') == hits + 1
+
+def test_streamed_txt_segmentation_is_timed():
+    from app.services.text_parser import TextParser
+
+    class Upload:
+        filename = 'streamed.txt'
+        stream = io.BytesIO(' '.join(f'word{i}' for i in range(250)).encode('utf-8'))
+
+        def read(self, size=-1):
+            return self.stream.read(size)
+
+    before = _count(SEGMENTATION_SECONDS)
+
+    parsed = TextParser().parse_document(Upload())
+
+    assert parsed['total_segments'] == 3
+    assert _count(SEGMENTATION_SECONDS) == before + 1
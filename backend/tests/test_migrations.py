@@ -0,0 +1,79 @@
+import json
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from app import migrations
+from app.migrations import add_missing_columns
+from app.models.session import Base, Document, ReadingSession
+from app.services.segment_store import SegmentStore
+
+def test_columns_added_since_a_table_was_created_are_added(tmp_path):
+    path = tmp_path / 'old.db'
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    # A documents table from before lazy extraction recorded failures
+    connection = sqlite3.connect(path)
+    connection.execute('ALTER TABLE documents DROP COLUMN materialize_error')
+    connection.close()
+
+    add_missing_columns(engine)
+    add_missing_columns(engine)
+
+    assert 'materialize_error' in {column['name'] for column in inspect(engine).get_columns('documents')}
+
+BASELINE_SESSIONS = '''
+CREATE TABLE reading_sessions (
+    id VARCHAR NOT NULL PRIMARY KEY, user_id VARCHAR, document_name VARCHAR NOT NULL, content TEXT NOT NULL,
+    segments JSON NOT NULL, current_segment INTEGER, current_position INTEGER, bookmarks JSON,
+    voice_id VARCHAR, reading_speed FLOAT, font_size INTEGER, dark_mode BOOLEAN, offline_mode BOOLEAN,
+    cached_audio_paths JSON, created_at DATETIME, last_accessed DATETIME
+)
+'''
+
+def _baseline_database(path):
+    """A database written by the baseline app: segments stored on every session"""
+    connection = sqlite3.connect(path)
+    connection.execute(BASELINE_SESSIONS)
+    shared = json.dumps(['First shared segment.', 'Second shared segment.'])
+    connection.executemany(
+        'INSERT INTO reading_sessions (id, document_name, content, segments, current_segment, font_size) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        [('a', 'shared.txt', 'First shared segment.', shared, 1, 18),
+         ('b', 'shared-copy.txt', 'First shared segment.', shared, 0, 16),
+         ('c', 'own.txt', 'Only mine.', json.dumps(['Only mine.']), 0, 16)]
+    )
+    connection.commit()
+    connection.close()
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    return engine
+
+@pytest.mark.parametrize('drop_column', [True, False])
+def test_baseline_sessions_move_to_shared_documents(tmp_path, monkeypatch, drop_column):
+    # False takes the table rebuild used on SQLite before 3.35
+    monkeypatch.setattr(migrations, 'DROP_COLUMN_SUPPORTED', drop_column)
+    engine = _baseline_database(tmp_path / 'baseline.db')
+
+    migrations.migrate_legacy_sessions(engine)
+    migrations.migrate_legacy_sessions(engine)
+
+    assert 'segments' not in {column['name'] for column in inspect(engine).get_columns('reading_sessions')}
+    db_session = sessionmaker(bind=engine)()
+    try:
+        sessions = {session.id: session for session in db_session.query(ReadingSession)}
+        assert sessions['a'].document_id == sessions['b'].document_id != sessions['c'].document_id
+        assert (sessions['a'].current_segment, sessions['a'].font_size) == (1, 18)
+
+        shared = db_session.get(Document, sessions['a'].document_id)
+        assert (shared.ref_count, shared.total_segments, shared.materialized) == (2, 2, True)
+        assert SegmentStore().get_texts(db_session, shared.id) == ['First shared segment.', 'Second shared segment.']
+        assert db_session.get(Document, sessions['c'].document_id).ref_count == 1
+
+        # The dropped NOT NULL column no longer blocks new sessions
+        db_session.add(ReadingSession(id='d', document_name='new.txt', content='', document_id=shared.id))
+        db_session.commit()
+    finally:
+        db_session.close()
@@ -0,0 +1,52 @@
+import pytest
+
+SEGMENTS = [f'Offline segment number {i} has a few words.' for i in range(5)]
+
+@pytest.fixture
+def batch_calls(tts_service, monkeypatch):
+    """Make every text's audio distinct and record each batch request"""
+    calls = []
+
+    def synthesize_batch(texts, voice_id):
+        calls.append(list(texts))
+        sizes = [2 * (len(text) + i) for i, text in enumerate(texts)]
+        pcm = b''.join(bytes([len(calls) * 16 + i]) * size for i, size in enumerate(sizes))
+        return pcm, [sum(sizes[:i]) for i in range(len(sizes))]
+
+    monkeypatch.setattr(tts_service.backend, 'synthesize_batch', synthesize_batch)
+    monkeypatch.setattr(tts_service.backend, 'stream', lambda *args, **kwargs: pytest.fail('synthesized alone'))
+    return calls
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_offline_audio_defaults_to_a_format_that_batches(tts_service):
+    assert tts_service.get_format(tts_service.offline_format).raw_pcm
+
+def test_a_batch_is_one_request_cut_into_one_cache_entry_per_segment(tts_service, batch_calls):
+    paths = tts_service.prepare_offline_audio(SEGMENTS)
+
+    assert batch_calls == [SEGMENTS]
+    assert len(set(paths)) == len(SEGMENTS)
+    for i, (text, path) in enumerate(zip(SEGMENTS, paths)):
+        audio = _read(path)
+        assert audio[:4] == b'RIFF'
+        # Exactly this segment's slice of the batch audio, under a header of its own length
+        assert audio[44:] == bytes([16 + i]) * (2 * (len(text) + i))
+        assert int.from_bytes(audio[40:44], 'little') == len(audio) - 44
+        assert tts_service.get_cached_audio(text, fmt=tts_service.offline_format) == path
+
+def test_cached_segments_are_left_out_of_the_batch(tts_service, batch_calls):
+    tts_service.prepare_offline_audio(SEGMENTS[:2])
+
+    tts_service.prepare_offline_audio(SEGMENTS)
+
+    assert batch_calls == [SEGMENTS[:2], SEGMENTS[2:]]
+
+def test_batches_respect_the_size_limit(tts_service, batch_calls):
+    tts_service.batch_size = 2
+
+    tts_service.prepare_offline_audio(SEGMENTS[:4])
+
+    assert batch_calls == [SEGMENTS[0:2], SEGMENTS[2:4]]
@@ -0,0 +1,95 @@
+import pytest
+
+from app import routes
+from app.database import SessionFactory
+from app.models.session import ReadingSession
+from app.services.progress_buffer import ProgressBuffer
+
+# Six 100-word segments
+TEXT = ' '.join(f'word{i}' for i in range(600))
+
+@pytest.fixture
+def session_id(upload):
+    return upload(TEXT)['session_id']
+
+@pytest.fixture
+def buffer(tmp_path):
+    buffer = ProgressBuffer(SessionFactory, flush_interval=3600, db_path=str(tmp_path / 'progress.db'))
+    yield buffer
+    buffer.close()
+
+def _stored(session_id):
+    db_session = SessionFactory()
+    try:
+        session = db_session.get(ReadingSession, session_id)
+        return session.current_segment, session.current_position
+    finally:
+        db_session.close()
+
+def test_updates_coalesce_to_the_last_value(buffer, session_id):
+    for position in range(10):
+        buffer.update(session_id, {'current_position': position})
+    previous, pending = buffer.update(session_id, {'current_segment': 2})
+
+    assert previous == {'current_position': 9}
+    assert pending == {'current_segment': 2, 'current_position': 9}
+    assert _stored(session_id) == (0, 0)
+
+    assert buffer.flush() == 1
+    assert _stored(session_id) == (2, 9)
+    assert buffer.pending(session_id) is None
+    assert buffer.stats()['rows_written'] == 1
+
+def test_workers_share_pending_values(buffer, session_id, tmp_path):
+    other = ProgressBuffer(SessionFactory, flush_interval=3600, db_path=str(tmp_path / 'progress.db'))
+    try:
+        buffer.update(session_id, {'current_position': 41})
+        assert other.pending(session_id) == {'current_position': 41}
+
+        assert other.flush() == 1
+        assert buffer.pending(session_id) is None
+    finally:
+        other.close()
+    assert _stored(session_id) == (0, 41)
+
+def test_close_flushes_pending_values(tmp_path, session_id):
+    buffer = ProgressBuffer(SessionFactory, flush_interval=3600, db_path=str(tmp_path / 'progress.db'))
+    buffer.update(session_id, {'current_segment': 3, 'current_position': 7})
+
+    buffer.close()
+
+    assert _stored(session_id) == (3, 7)
+
+def test_pop_hands_pending_values_to_the_caller(buffer, session_id):
+    buffer.update(session_id, {'current_segment': 1})
+
+    assert buffer.pop(session_id) == {'current_segment': 1}
+    assert buffer.pending(session_id) is None
+    assert buffer.flush() == 0
+
+def test_get_reads_its_own_buffered_writes(client, session_id):
+    response = client.put(f'/session/{session_id}', json={'current_segment': 4, 'current_position': 12})
+    assert response.status_code == 200
+    assert response.json == {'id': session_id, 'current_segment': 4, 'current_position': 12}
+
+    assert _stored(session_id) == (0, 0)
+    body = client.get(f'/session/{session_id}').json
+    assert (body['current_segment'], body['current_position']) == (4, 12)
+
+def test_full_update_writes_buffered_progress_first(client, session_id):
+    client.put(f'/session/{session_id}', json={'current_position': 5})
+    client.put(f'/session/{session_id}', json={'current_segment': 2, 'font_size': 22})
+
+    assert _stored(session_id) == (2, 5)
+
+def test_prefetch_only_when_the_segment_changes(client, session_id, monkeypatch):
+    prefetched = []
+    monkeypatch.setattr(routes, '_prefetch_after',
+                        lambda db_session, sid, segment_index, fmt=None: prefetched.append(segment_index))
+
+    client.put(f'/session/{session_id}', json={'current_segment': 1, 'current_position': 0})
+    for position in range(1, 5):
+        client.put(f'/session/{session_id}', json={'current_segment': 1, 'current_position': position})
+    client.put(f'/session/{session_id}', json={'current_segment': 2})
+
+    assert prefetched == [1, 2]
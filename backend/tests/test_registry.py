@@ -0,0 +1,16 @@
+import time
+
+import pytest
+
+from app.routes import services
+
+@pytest.fixture
+def retention_unavailable(monkeypatch):
+    monkeypatch.delitem(services._instances, 'retention', raising=False)
+    monkeypatch.setitem(services._errors, 'retention', ('disabled for this test', time.monotonic()))
+
+def test_retention_stats_report_an_unavailable_sweeper_as_503(client, retention_unavailable):
+    response = client.get('/retention')
+
+    assert response.status_code == 503
+    assert 'retention is unavailable' in response.json['error']
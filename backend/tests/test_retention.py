@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import SessionFactory
+from app.models.session import AudioJob, AudioJobSegment, Document, ReadingSession, Segment
+from app.routes import services
+from app.services.retention import RetentionSweeper
+
+OLD = datetime.utcnow() - timedelta(days=60)
+
+@pytest.fixture
+def released_audio():
+    return []
+
+@pytest.fixture
+def sweeper(released_audio):
+    def release_audio(path, idle_since):
+        released_audio.append(path)
+        return True
+
+    return RetentionSweeper(
+        SessionFactory, services.get('document_store'), services.get('bookmark_store'), services.get('progress'),
+        release_audio=release_audio, max_age_days=30, batch_size=2, pause=0
+    )
+
+def _age(session_id, **values):
+    """Make a session look idle since OLD, optionally setting other columns too"""
+    db_session = SessionFactory()
+    try:
+        session = db_session.get(ReadingSession, session_id)
+        session.last_accessed = OLD
+        for name, value in values.items():
+            setattr(session, name, value)
+        db_session.commit()
+        return session.document_id
+    finally:
+        db_session.close()
+
+def _add_job(session_id, audio_path, status='completed'):
+    db_session = SessionFactory()
+    try:
+        job = AudioJob(session_id=session_id, voice_id='en-US-JennyNeural', status=status, total_segments=1)
+        db_session.add(job)
+        db_session.flush()
+        db_session.add(AudioJobSegment(job_id=job.id, segment_index=0, status='done', audio_path=audio_path))
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def _exists(model, **filters):
+    db_session = SessionFactory()
+    try:
+        return db_session.query(model).filter_by(**filters).first() is not None
+    finally:
+        db_session.close()
+
+def test_expired_sessions_go_in_batches_with_what_they_hold(client, upload, sweeper, released_audio):
+    sessions = [upload(f'Expiring document number {i}.', f'expire{i}.txt')['session_id'] for i in range(5)]
+    document_ids = [_age(session_id, cached_audio_paths={'0': f'/audio/played{i}.wav'})
+                    for i, session_id in enumerate(sessions)]
+    _add_job(sessions[0], '/audio/job.wav')
+    assert client.post(f'/session/{sessions[1]}/bookmark',
+                       json={'position': 0, 'segment_index': 0}).status_code == 201
+    kept = upload('A document someone is still reading.', 'kept.txt')['session_id']
+
+    counts = sweeper.sweep()
+
+    # batch_size 2: three batches, the last a partial one
+    assert counts['sessions'] == 5
+    assert counts['documents'] == 5
+    assert counts['audio_jobs'] == 1
+    assert counts['bookmarks'] == 1
+    assert sorted(released_audio) == ['/audio/job.wav'] + [f'/audio/played{i}.wav' for i in range(5)]
+    assert counts['audio_files'] == 6
+    for session_id, document_id in zip(sessions, document_ids):
+        assert not _exists(ReadingSession, id=session_id)
+        assert not _exists(Document, id=document_id)
+        assert not _exists(Segment, document_id=document_id)
+    assert not _exists(AudioJob, session_id=sessions[0])
+    assert _exists(ReadingSession, id=kept)
+
+def test_audio_still_used_by_a_live_session_is_kept(upload, sweeper, released_audio):
+    expired = upload('Shared audio, expired reader.', 'shared-old.txt')['session_id']
+    active = upload('Shared audio, active reader.', 'shared-new.txt')['session_id']
+    _age(expired, cached_audio_paths={'0': '/audio/shared.wav'})
+    _add_job(active, '/audio/shared.wav')
+
+    counts = sweeper.sweep()
+
+    assert counts['sessions'] == 1
+    assert released_audio == []
+
+def test_sessions_with_live_jobs_or_pending_progress_are_skipped(upload, sweeper):
+    busy = upload('A document with a running job.', 'busy.txt')['session_id']
+    reading = upload('A document whose reader just moved on.', 'reading.txt')['session_id']
+    _age(busy)
+    _add_job(busy, None, status='running')
+    _age(reading)
+    services.get('progress').update(reading, {'current_position': 3})
+
+    counts = sweeper.sweep()
+
+    assert counts['sessions'] == 0
+    assert _exists(ReadingSession, id=busy)
+    assert _exists(ReadingSession, id=reading)
+
+def test_a_shared_document_outlives_its_first_session(upload, sweeper):
+    first = upload('The same bytes uploaded twice.', 'twice.txt')['session_id']
+    second = upload('The same bytes uploaded twice.', 'twice.txt')['session_id']
+    document_id = _age(first)
+
+    counts = sweeper.sweep()
+
+    assert counts == dict(counts, sessions=1, documents=0)
+    assert _exists(Document, id=document_id, ref_count=1)
+    assert _exists(ReadingSession, id=second)
+
+def test_upload_racing_the_release_of_its_document_stores_it_again(client, upload, sweeper, monkeypatch):
+    text = 'Uploaded again just as the only reader expires.'
+    old = upload(text, 'race.txt')['session_id']
+    old_document = _age(old)
+
+    document_store = services.get('document_store')
+    find = document_store.find
+
+    def find_then_sweep(db_session, content_hash):
+        document = find(db_session, content_hash)
+        if document is not None and document.id == old_document:
+            # The sweep commits between this upload's find and its acquire
+            assert sweeper.sweep()['documents'] == 1
+        return document
+
+    monkeypatch.setattr(document_store, 'find', find_then_sweep)
+    created = upload(text, 'race.txt')
+
+    db_session = SessionFactory()
+    try:
+        session = db_session.get(ReadingSession, created['session_id'])
+        document = db_session.get(Document, session.document_id)
+        assert document is not None and document.id != old_document
+        assert document.ref_count == 1
+    finally:
+        db_session.close()
+    assert created['segments'] == [text]
+    assert client.get(f"/session/{created['session_id']}").status_code == 200
@@ -0,0 +1,49 @@
+from app.database import SessionFactory
+from app.models.session import ReadingSession
+
+def _set_owner(session_id, user_id):
+    """Stand-in for authentication, the only thing that may set user_id"""
+    db_session = SessionFactory()
+    try:
+        db_session.get(ReadingSession, session_id).user_id = user_id
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def test_session_search_finds_its_document(client, upload):
+    session_id = upload('Whales sing long songs. Dolphins click instead.')['session_id']
+
+    response = client.get(f'/session/{session_id}/search', query_string={'q': 'dolphins'})
+
+    assert response.status_code == 200
+    hits = response.json['hits']
+    assert len(hits) == 1
+    assert 'Dolphins' in hits[0]['snippet']
+
+def test_search_covers_the_owners_documents(client, upload):
+    first = upload('Lighthouse keepers log every ship.', 'first.txt')['session_id']
+    second = upload('A lighthouse stands on the cape.', 'second.txt')['session_id']
+    _set_owner(first, 'carol')
+    _set_owner(second, 'carol')
+
+    hits = client.get('/search', query_string={'q': 'lighthouse', 'session_id': first}).json['hits']
+
+    assert sorted(hit['document_name'] for hit in hits) == ['first.txt', 'second.txt']
+    assert not any('session_ids' in hit for hit in hits)
+
+def test_other_users_sessions_stay_hidden(client, upload):
+    secret = upload('The vault code is marmalade.', 'secret.txt')['session_id']
+    _set_owner(secret, 'alice')
+
+    # Neither the upload form nor a session update can claim alice's identity
+    mine = upload('My own marmalade recipe.', 'mine.txt', user_id='alice')['session_id']
+    assert client.put(f'/session/{mine}', json={'user_id': 'alice'}).status_code == 400
+
+    response = client.get('/search', query_string={'q': 'marmalade', 'session_id': mine})
+
+    assert response.status_code == 200
+    assert [hit['document_name'] for hit in response.json['hits']] == ['mine.txt']
+
+def test_search_needs_a_known_session(client):
+    assert client.get('/search', query_string={'q': 'anything', 'user_id': 'alice'}).status_code == 400
+    assert client.get('/search', query_string={'q': 'anything', 'session_id': 'missing'}).status_code == 404
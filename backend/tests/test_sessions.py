@@ -0,0 +1,63 @@
+import pytest
+
+from app.database import SessionFactory
+from app.models.session import ReadingSession
+
+TEXT = 'First sentence here. Second sentence follows. Third one ends it.'
+
+@pytest.fixture
+def session_id(upload):
+    return upload(TEXT)['session_id']
+
+def test_settings_update(client, session_id):
+    response = client.put(f'/session/{session_id}', json={
+        'document_name': 'Renamed', 'voice_id': 'en-GB-RyanNeural', 'reading_speed': 1.5,
+        'font_size': 20, 'dark_mode': True
+    })
+
+    assert response.status_code == 200
+    body = response.json
+    assert (body['document_name'], body['voice_id'], body['reading_speed'], body['font_size'], body['dark_mode']) == \
+        ('Renamed', 'en-GB-RyanNeural', 1.5, 20, True)
+
+@pytest.mark.parametrize('data', [
+    {'user_id': 'alice'},
+    {'cached_audio_paths': {}},
+    {'created_at': '2000-01-01'},
+    {'offline_mode': True},
+    {'document_id': 'x'},
+    {'document_name': None},
+    {'document_name': ''},
+    {'font_size': '20'},
+    {'dark_mode': 1},
+    {'reading_speed': 0},
+    {'current_segment': 'abc'},
+    {'current_position': -1},
+    []
+])
+def test_invalid_updates_are_rejected(client, session_id, data):
+    response = client.put(f'/session/{session_id}', json=data)
+
+    assert response.status_code == 400
+    db_session = SessionFactory()
+    try:
+        session = db_session.get(ReadingSession, session_id)
+        assert session.user_id is None
+        assert session.document_name == 'document.txt'
+    finally:
+        db_session.close()
+
+def test_missing_body_is_rejected(client, session_id):
+    assert client.put(f'/session/{session_id}', data='not json').status_code == 400
+
+@pytest.mark.parametrize('extra', [{}, {'font_size': 18}])
+def test_current_segment_is_bounded_by_the_document(client, upload, extra):
+    created = upload(TEXT)
+    session_id = created['session_id']
+    last = created['total_segments'] - 1
+
+    assert client.put(f'/session/{session_id}', json=dict(extra, current_segment=last)).status_code == 200
+    response = client.put(f'/session/{session_id}', json=dict(extra, current_segment=last + 1))
+
+    assert response.status_code == 400
+    assert client.get(f'/session/{session_id}').json['current_segment'] == last
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from app.services.synth_pool import SynthesizerPool
+
+class _Synth:
+    def __init__(self, key, number):
+        self.key = key
+        self.number = number
+        self.closed = False
+
+def _pool(**kwargs):
+    created = []
+
+    def factory(key):
+        synth = _Synth(key, len(created))
+        created.append(synth)
+        return synth
+
+    kwargs.setdefault('max_size', 2)
+    kwargs.setdefault('idle_timeout', 300)
+    pool = SynthesizerPool(factory, health_check=lambda synth: not synth.closed,
+                           close=lambda synth: setattr(synth, 'closed', True), **kwargs)
+    return pool, created
+
+def test_returned_synthesizer_is_reused():
+    pool, created = _pool()
+
+    with pool.acquire('jenny') as first:
+        pass
+    with pool.acquire('jenny') as second:
+        pass
+
+    assert second is first
+    assert len(created) == 1
+    assert pool.stats() == {'live': 1, 'idle': 1, 'created': 1, 'reused': 1, 'discarded': 0}
+
+def test_keys_get_separate_synthesizers():
+    pool, created = _pool()
+
+    with pool.acquire('jenny') as jenny, pool.acquire('guy') as guy:
+        assert jenny is not guy
+    assert [synth.key for synth in created] == ['jenny', 'guy']
+
+def test_synthesizer_that_raised_is_closed_not_returned():
+    pool, created = _pool()
+
+    with pytest.raises(RuntimeError):
+        with pool.acquire('jenny'):
+            raise RuntimeError('synthesis failed')
+
+    assert created[0].closed
+    assert pool.stats()['live'] == 0
+    assert pool.stats()['discarded'] == 1
+    with pool.acquire('jenny') as synth:
+        assert synth is not created[0]
+
+def test_failed_factory_frees_its_slot():
+    attempts = []
+
+    def factory(key):
+        attempts.append(key)
+        if len(attempts) == 1:
+            raise ConnectionError('handshake failed')
+        return _Synth(key, len(attempts))
+
+    pool = SynthesizerPool(factory, max_size=1, idle_timeout=300)
+    with pytest.raises(ConnectionError):
+        with pool.acquire('jenny'):
+            pass
+
+    # Would block forever if the failed checkout still counted against max_size
+    with pool.acquire('jenny') as synth:
+        assert synth.number == 2
+    assert pool.stats()['live'] == 1
+
+def test_exhausted_pool_waits_for_a_return():
+    pool, created = _pool(max_size=1)
+    acquired = threading.Event()
+
+    def borrower():
+        with pool.acquire('jenny') as synth:
+            acquired.set()
+            got.append(synth)
+
+    got = []
+    with pool.acquire('jenny') as held:
+        thread = threading.Thread(target=borrower)
+        thread.start()
+        assert not acquired.wait(0.1)
+    thread.join(5)
+
+    assert got == [held]
+    assert len(created) == 1
+
+def test_unhealthy_idle_synthesizer_is_replaced():
+    pool, created = _pool()
+
+    with pool.acquire('jenny') as synth:
+        pass
+    synth.closed = True  # e.g. the service dropped the connection while idle
+
+    with pool.acquire('jenny') as replacement:
+        assert replacement is not synth
+    assert len(created) == 2
+    assert pool.stats()['discarded'] == 1
+
+def test_idle_synthesizers_expire():
+    pool, created = _pool(idle_timeout=0.05)
+
+    with pool.acquire('jenny'):
+        pass
+    time.sleep(0.1)
+    with pool.acquire('jenny') as synth:
+        assert synth is not created[0]
+
+    assert created[0].closed
+    assert pool.stats()['discarded'] == 1
+
+def test_fake_backend_returns_synthesizer_after_error(fake_backend):
+    list(fake_backend.stream('hello there', 'en-US-JennyNeural'))
+    assert fake_backend.pool.stats()['idle'] == 1
+
+    fake_backend.error_rate = 1
+    with pytest.raises(RuntimeError):
+        list(fake_backend.stream('hello there', 'en-US-JennyNeural'))
+    stats = fake_backend.pool.stats()
+    assert stats['live'] == 0
+    assert stats['discarded'] == 1
+
+    fake_backend.error_rate = 0
+    list(fake_backend.stream('hello there', 'en-US-JennyNeural'))
+    assert fake_backend.connections == 2
@@ -0,0 +1,117 @@
+import os
+import struct
+import threading
+import time
+
+import pytest
+
+from app.services.tts_service import STREAMING_DATA_SIZE
+
+TEXT = ' '.join(['word'] * 10)
+
+def _count_streams(backend):
+    """Wrap backend.stream to count the syntheses it starts"""
+    calls = []
+    stream = backend.stream
+
+    def counting_stream(*args, **kwargs):
+        calls.append(args)
+        return stream(*args, **kwargs)
+
+    backend.stream = counting_stream
+    return calls
+
+def _data_size(wav: bytes) -> int:
+    return struct.unpack('<I', wav[40:44])[0]
+
+def test_stream_fills_cache_and_later_hits_read_it(tts_service):
+    calls = _count_streams(tts_service.backend)
+
+    chunks = list(tts_service.stream_speech(TEXT))
+    assert len(chunks) > 2
+    streamed = b''.join(chunks)
+    # The length is unknown while streaming
+    assert _data_size(streamed) == STREAMING_DATA_SIZE
+
+    path = tts_service.get_cached_audio(TEXT)
+    assert path is not None
+    with open(path, 'rb') as f:
+        cached = f.read()
+    assert _data_size(cached) == len(cached) - 44
+    assert cached[44:] == streamed[44:]
+
+    again = b''.join(tts_service.stream_speech(TEXT))
+    assert again == cached
+    assert len(calls) == 1
+
+def test_concurrent_streams_of_one_text_synthesize_once(tts_service):
+    calls = _count_streams(tts_service.backend)
+    results = []
+
+    def listen():
+        results.append(b''.join(tts_service.stream_speech(TEXT)))
+
+    threads = [threading.Thread(target=listen) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert len({result[44:] for result in results}) == 1
+
+def test_concurrent_conversions_synthesize_once(tts_service):
+    calls = _count_streams(tts_service.backend)
+    paths = []
+
+    threads = [threading.Thread(target=lambda: paths.append(tts_service.convert_to_speech(TEXT)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(paths)) == 1
+    assert os.path.exists(paths[0])
+
+def test_waiter_is_not_blocked_by_a_slow_client(tts_service):
+    finished = {}
+
+    def slow_client():
+        for _ in tts_service.stream_speech(TEXT):
+            time.sleep(0.1)
+        finished['slow'] = time.monotonic()
+
+    def waiter():
+        time.sleep(0.02)
+        b''.join(tts_service.stream_speech(TEXT))
+        finished['waiter'] = time.monotonic()
+
+    threads = [threading.Thread(target=slow_client), threading.Thread(target=waiter)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert finished['waiter'] < finished['slow'] - 0.5
+
+def test_abandoned_stream_still_fills_cache(tts_service):
+    stream = tts_service.stream_speech(TEXT)
+    next(stream)
+    stream.close()
+
+    deadline = time.monotonic() + 5
+    while tts_service.get_cached_audio(TEXT) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert tts_service.get_cached_audio(TEXT) is not None
+
+def test_failed_stream_caches_nothing(tts_service):
+    tts_service.backend.error_rate = 1
+
+    with pytest.raises(RuntimeError):
+        b''.join(tts_service.stream_speech(TEXT))
+
+    assert tts_service.get_cached_audio(TEXT) is None
+    assert not [name for name in os.listdir(tts_service.output_dir) if name.endswith('.part')]
@@ -0,0 +1,267 @@
+"""Benchmarks for startup, document parsing, segmentation, synthesis and /ask
+
+Parsers and segmenters run on deterministic synthetic corpora (see
+tools/corpus.py); TTS uses the fake speech backend and /ask the fake
+OpenAI server, so runs need no credentials and are repeatable. Results
+are written as JSON for comparison across commits:
+
+    python tools/bench.py --output base.json
+    git checkout my-branch
+    python tools/bench.py --output head.json
+    python tools/bench_compare.py base.json head.json
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import fnmatch
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import corpus
+
+logger = logging.getLogger('bench')
+
+class _Named:
+    """Upload stand-in carrying only a filename, for parsing a document already on disk"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+class Benchmark:
+    def __init__(self, name: str, run: Callable, setup: Optional[Callable] = None, info: Dict = None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.info = info or {}
+
+def measure(benchmark: Benchmark, repeat: int, warmup: int) -> Dict:
+    """Time benchmark.run over repeat runs after warmup runs; setup is not timed"""
+    timings = []
+    for i in range(warmup + repeat):
+        arg = benchmark.setup() if benchmark.setup else None
+        started = time.perf_counter()
+        benchmark.run(arg)
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed)
+    return dict(benchmark.info, **{
+        'runs': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'max': max(timings)
+    })
+
+def configure_environment(workdir: str, args):
+    """Point every service at the fakes and at a scratch directory before app modules load"""
+    os.environ.update({
+        'TTS_BACKEND': 'fake',
+        'FAKE_TTS_CHUNK_INTERVAL': str(args.tts_chunk_interval),
+        'FAKE_TTS_CONNECT_DELAY': str(args.tts_connect_delay),
+        'FAKE_TTS_REQUEST_OVERHEAD': str(args.tts_request_overhead),
+        'AUDIO_CACHE_DIR': os.path.join(workdir, 'audio_cache'),
+        'UPLOAD_DIR': os.path.join(workdir, 'uploads'),
+        'RETRIEVAL_INDEX_DIR': os.path.join(workdir, 'indexes'),
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'PROGRESS_BUFFER_DB': os.path.join(workdir, 'progress_buffer.db'),
+        'OPENAI_API_KEY': 'bench',
+        'AI_CACHE_DB': ''
+    })
+
+def parse_benchmarks(corpus_dir: str, sizes: List[int], words_per_page: int) -> List[Benchmark]:
+    from app.services.text_parser import TextParser
+
+    text_parser = TextParser()
+    benchmarks = []
+    for fmt in corpus.FORMATS:
+        for pages in sizes:
+            path = corpus.write_document(corpus_dir, fmt, pages, words_per_page)
+            upload = _Named(os.path.basename(path))
+            benchmarks.append(Benchmark(
+                f"parse.{fmt}.{pages}p",
+                lambda _, upload=upload, path=path: text_parser.parse_document(upload, path=path),
+                info={'pages': pages, 'bytes': os.path.getsize(path)}
+            ))
+    return benchmarks
+
+def segment_benchmarks(sizes: List[int], words_per_page: int) -> List[Benchmark]:
+    from app.services.text_parser import TextParser
+    from app.services.text_processor import TextProcessor
+
+    text_parser = TextParser()
+    text_processor = TextProcessor()
+    benchmarks = []
+    for pages in sizes:
+        text = '\n\n'.join(corpus.page_texts(pages, words_per_page))
+        data = text.encode('utf-8')
+        info = {'pages': pages, 'words': pages * words_per_page}
+        benchmarks.extend([
+            Benchmark(f"segment.create_segments.{pages}p",
+                      lambda _, text=text: text_parser._create_segments(text), info=info),
+            Benchmark(f"segment.txt_stream.{pages}p",
+                      lambda _, data=data: text_parser._segment_chunks(text_parser._iter_txt(io.BytesIO(data))),
+                      info=info),
+            Benchmark(f"segment.chunk_text.{pages}p",
+                      lambda _, text=text: text_processor.chunk_text(text), info=info)
+        ])
+    return benchmarks
+
+def tts_benchmarks(words_per_page: int) -> List[Benchmark]:
+    from app.services.tts_service import TTSService
+
+    tts_service = TTSService()
+    text = corpus.page_texts(1, words_per_page)[0].split('\n\n')[1]
+    counter = iter(range(10 ** 9))
+    tts_service.convert_to_speech(text, fmt='wav')
+    return [
+        # A fresh text per run, so every run synthesizes and writes the cache
+        Benchmark('tts.convert.miss', lambda t: tts_service.convert_to_speech(t, fmt='wav'),
+                  setup=lambda: f"{text} {next(counter)}"),
+        Benchmark('tts.convert.hit', lambda _: tts_service.convert_to_speech(text, fmt='wav'))
+    ]
+
+def ask_benchmarks(args) -> List[Benchmark]:
+    import fake_openai
+
+    server = fake_openai.serve('127.0.0.1', 0, args.ai_first_token_delay, args.ai_token_interval)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['OPENAI_API_BASE'] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    from app.services.ai_assistant import AIAssistant
+
+    ai_assistant = AIAssistant()
+    context = corpus.page_texts(1)[0]
+    counter = iter(range(10 ** 9))
+    loop = asyncio.new_event_loop()
+
+    async def first_token(question):
+        stream = ai_assistant.stream_answer(question, context)
+        try:
+            await stream.__anext__()
+        finally:
+            await stream.aclose()
+
+    loop.run_until_complete(ai_assistant.ask_question('What is this page about?', context))
+    return [
+        Benchmark('ask.miss', lambda q: loop.run_until_complete(ai_assistant.ask_question(q, context)),
+                  setup=lambda: f"Question {next(counter)}?"),
+        Benchmark('ask.hit', lambda _: loop.run_until_complete(
+            ai_assistant.ask_question('What is this page about?', context))),
+        Benchmark('ask.stream.first_token', lambda q: loop.run_until_complete(first_token(q)),
+                  setup=lambda: f"Question {next(counter)}?")
+    ]
+
+def startup_benchmarks() -> List[Benchmark]:
+    """Cold start in a fresh interpreter, the cost every worker (re)start pays
+
+    For a per-module breakdown run: python -X importtime -c 'import app.routes'
+    """
+    snippets = {
+        'startup.interpreter': 'pass',
+        'startup.import_routes': 'import app.routes',
+        'startup.create_app': 'from app import create_app; create_app()'
+    }
+
+    def run(code):
+        subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=os.environ,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return [Benchmark(name, lambda _, code=code: run(code)) for name, code in snippets.items()]
+
+def environment_info(args) -> Dict:
+    def git(*argv):
+        try:
+            return subprocess.run(['git', *argv], cwd=BACKEND_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': vars(args)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000], help='corpus sizes in pages')
+    parser.add_argument('--words-per-page', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--only', nargs='+', default=['*'], help='glob patterns of benchmark names to run')
+    parser.add_argument('--corpus-dir', help='where generated documents are kept (default: a temp dir)')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    parser.add_argument('--tts-chunk-interval', type=float, default=0.0)
+    parser.add_argument('--tts-connect-delay', type=float, default=0.0)
+    parser.add_argument('--tts-request-overhead', type=float, default=0.0)
+    parser.add_argument('--ai-first-token-delay', type=float, default=0.0)
+    parser.add_argument('--ai-token-interval', type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # The services log every call; keep only the benchmark's own output
+    for name in ('app', 'openai', 'fake_openai'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix='readit-bench-') as workdir:
+        configure_environment(workdir, args)
+        corpus_dir = args.corpus_dir or os.path.join(workdir, 'corpus')
+        groups = {
+            'startup': startup_benchmarks,
+            'parse': lambda: parse_benchmarks(corpus_dir, args.sizes, args.words_per_page),
+            'segment': lambda: segment_benchmarks(args.sizes, args.words_per_page),
+            'tts': lambda: tts_benchmarks(args.words_per_page),
+            'ask': lambda: ask_benchmarks(args)
+        }
+
+        def selected(name):
+            return any(fnmatch.fnmatch(name, pattern) for pattern in args.only)
+
+        def wanted(group):
+            # Literal prefix of each pattern, so e.g. 'ask.*' never builds the parse corpus
+            prefixes = [re.split(r'[*?\[]', pattern, 1)[0] for pattern in args.only]
+            return any(group.startswith(prefix) or prefix.startswith(group + '.') or prefix == group
+                       for prefix in prefixes)
+
+        results = {}
+        for group, build in groups.items():
+            if not wanted(group):
+                continue
+            for benchmark in build():
+                if not selected(benchmark.name):
+                    continue
+                result = measure(benchmark, args.repeat, args.warmup)
+                results[benchmark.name] = result
+                logger.info(f"{benchmark.name:36s} median {result['median'] * 1000:10.3f} ms  "
+                            f"min {result['min'] * 1000:10.3f} ms")
+
+    report = {'environment': environment_info(args), 'results': results}
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        logger.info(f"Wrote {len(results)} results to {args.output}")
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
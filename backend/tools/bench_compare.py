@@ -0,0 +1,67 @@
+"""Compare two tools/bench.py result files
+
+Prints the change in each benchmark's median between a baseline and a
+candidate run and exits non-zero if any benchmark slowed down by more
+than the threshold, so it can gate CI:
+
+    python tools/bench_compare.py base.json head.json --threshold 0.10
+"""
+import sys
+import json
+import argparse
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(base: dict, head: dict, metric: str, threshold: float, min_delta: float):
+    """Yield (name, base, head, ratio, status) for every benchmark in either run"""
+    for name in sorted(set(base) | set(head)):
+        if name not in base:
+            yield name, None, head[name][metric], None, 'new'
+            continue
+        if name not in head:
+            yield name, base[name][metric], None, None, 'missing'
+            continue
+        before, after = base[name][metric], head[name][metric]
+        ratio = after / before if before else float('inf')
+        # Sub-millisecond benchmarks jitter by more than any threshold; require an absolute change too
+        if abs(after - before) < min_delta:
+            status = 'same'
+        elif ratio > 1 + threshold:
+            status = 'SLOWER'
+        elif ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = 'same'
+        yield name, before, after, ratio, status
+
+def _ms(value) -> str:
+    return '-' if value is None else f"{value * 1000:.3f}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--metric', default='median', choices=['min', 'median', 'mean', 'max'])
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown that counts as a regression')
+    parser.add_argument('--min-delta', type=float, default=0.0005, help='ignore changes smaller than this many seconds')
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    print(f"base {base['environment'].get('commit')}  head {head['environment'].get('commit')}")
+    print(f"{'benchmark':36s} {'base ms':>12s} {'head ms':>12s} {'change':>9s}  status")
+
+    regressions = 0
+    for name, before, after, ratio, status in compare(
+            base['results'], head['results'], args.metric, args.threshold, args.min_delta):
+        change = '-' if ratio is None else f"{(ratio - 1) * 100:+.1f}%"
+        print(f"{name:36s} {_ms(before):>12s} {_ms(after):>12s} {change:>9s}  {status}")
+        regressions += status == 'SLOWER'
+
+    if regressions:
+        print(f"{regressions} benchmark(s) slower than the {args.threshold:.0%} threshold")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
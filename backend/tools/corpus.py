@@ -0,0 +1,126 @@
+"""Deterministic synthetic documents for benchmarks and load tests
+
+The same seed and page count always produce the same bytes, so results
+from different commits are measured on identical input:
+
+    python tools/corpus.py --pages 1000 --format pdf --output /tmp/corpus
+"""
+import io
+import os
+import random
+import argparse
+from datetime import datetime
+from typing import List
+
+# Short lowercase words keep PDF strings free of characters needing escapes
+VOCABULARY = (
+    "the of and to in is was for on that with as by at from his her it an were "
+    "are which this be or had not but first one their its new after who they have "
+    "she two been other when there all during into school time may years more most "
+    "only over city some world would where later up such used many can state about "
+    "national out known university united then made reading voice page chapter story"
+).split()
+
+FORMATS = ('txt', 'pdf', 'docx')
+FIXED_TIMESTAMP = datetime(2024, 1, 1)
+
+def page_texts(pages: int, words_per_page: int = 300, seed: int = 0) -> List[str]:
+    """Return the text of each page, split into sentences and paragraphs"""
+    rng = random.Random(f"{seed}:{pages}:{words_per_page}")
+    result = []
+    for page in range(pages):
+        words = [rng.choice(VOCABULARY) for _ in range(words_per_page)]
+        sentences = []
+        for start in range(0, words_per_page, 15):
+            sentence = words[start:start + 15]
+            sentences.append(' '.join(sentence).capitalize() + '.')
+        paragraphs = [' '.join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+        result.append(f"Page {page + 1}.\n\n" + '\n\n'.join(paragraphs))
+    return result
+
+def make_txt(pages: List[str]) -> bytes:
+    return '\n\n'.join(pages).encode('utf-8')
+
+def make_pdf(pages: List[str], line_words: int = 12) -> bytes:
+    """Build a minimal uncompressed PDF with one text object per page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = ' '.join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        words = text.split()
+        lines = [' '.join(words[j:j + line_words]) for j in range(0, len(words), line_words)]
+        body = ' '.join(f"({line}) Tj T*" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 72 760 Td {body} ET".encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def make_docx(pages: List[str]) -> bytes:
+    """Build a DOCX with one paragraph per text paragraph and a break after each page"""
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+
+    document = Document()
+    for text in pages:
+        paragraph = None
+        for block in text.split('\n\n'):
+            paragraph = document.add_paragraph(block)
+        paragraph.add_run().add_break(WD_BREAK.PAGE)
+    # python-docx stamps the current time into the core properties; pin it for stable bytes
+    document.core_properties.created = FIXED_TIMESTAMP
+    document.core_properties.modified = FIXED_TIMESTAMP
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+def make_document(fmt: str, pages: int, words_per_page: int = 300, seed: int = 0) -> bytes:
+    texts = page_texts(pages, words_per_page, seed)
+    if fmt == 'txt':
+        return make_txt(texts)
+    if fmt == 'pdf':
+        return make_pdf(texts)
+    if fmt == 'docx':
+        return make_docx(texts)
+    raise ValueError(f"Unsupported corpus format: {fmt}")
+
+def write_document(directory: str, fmt: str, pages: int, words_per_page: int = 300, seed: int = 0) -> str:
+    """Write a document to directory (reusing an existing copy) and return its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic-{pages}p-{words_per_page}w-s{seed}.{fmt}")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.part"
+        with open(tmp_path, 'wb') as f:
+            f.write(make_document(fmt, pages, words_per_page, seed))
+        os.replace(tmp_path, path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--format', choices=FORMATS, nargs='+', default=list(FORMATS))
+    parser.add_argument('--words-per-page', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='corpus')
+    args = parser.parse_args()
+
+    for fmt in args.format:
+        for pages in args.pages:
+            print(write_document(args.output, fmt, pages, args.words_per_page, args.seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Local stand-in for the OpenAI chat completions API
+
+Answers every request with a canned reply, streamed token by token when
+the request asks for stream=true, so /ask latency (including time to first
+token) can be measured without network access or an API key:
+
+    python tools/fake_openai.py --port 8001 --first-token-delay 0.5 --jitter 0.2 --error-rate 0.01
+    OPENAI_API_BASE=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake flask run
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('fake_openai')
+
+ANSWER = ("This is a canned answer from the local fake completion server. "
+          "It is streamed one word at a time so clients can measure time to first token.")
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    first_token_delay = 0.3
+    token_interval = 0.02
+    jitter = 0.0
+    error_rate = 0.0
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model = body.get('model', 'gpt-3.5-turbo')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        tokens = [word + ' ' for word in ANSWER.split(' ')]
+        first_token_delay = self.first_token_delay + random.uniform(0, self.jitter)
+
+        if self.error_rate and random.random() < self.error_rate:
+            time.sleep(first_token_delay)
+            self._send_json(500, {'error': {'message': 'Simulated server error', 'type': 'server_error'}})
+            return
+
+        if not body.get('stream'):
+            time.sleep(first_token_delay + self.token_interval * len(tokens))
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(tokens)}}]
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        time.sleep(first_token_delay)
+        sent = 0
+        try:
+            for token in tokens:
+                self._send_event({
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+                })
+                sent += 1
+                time.sleep(self.token_interval)
+            self._send_event({
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+            })
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+            logger.info(f"Completed stream of {sent} tokens")
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Client disconnected after {sent}/{len(tokens)} tokens")
+
+    def _send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def serve(host: str = '127.0.0.1', port: int = 8001, first_token_delay: float = 0.3,
+          token_interval: float = 0.02, jitter: float = 0.0, error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Create the server; call serve_forever() on it (in a thread if needed)"""
+    handler = type('Handler', (FakeOpenAIHandler,), {
+        'first_token_delay': first_token_delay,
+        'token_interval': token_interval,
+        'jitter': jitter,
+        'error_rate': error_rate
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    parser.add_argument('--token-interval', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra first-token delay, uniform in [0, jitter]')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = serve(args.host, args.port, args.first_token_delay, args.token_interval,
+                   args.jitter, args.error_rate)
+    logger.info(f"Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""Drive the app with concurrent simulated readers against local fakes
+
+Starts the app from wsgi.py on a threaded local server, with the fake
+speech backend (TTS_BACKEND=fake) and tools/fake_openai.py standing in for
+Azure Speech and OpenAI, then runs reader sessions at a fixed concurrency:
+upload a document, then for each segment request its audio and report
+progress a few times, asking a question now and then. Reports latency
+percentiles and throughput per endpoint:
+
+    python tools/loadtest.py --concurrency 16 --duration 60 \\
+        --tts-latency 0.3 --tts-jitter 0.2 --tts-error-rate 0.01 \\
+        --ai-latency 0.8 --ai-jitter 0.5 --ai-error-rate 0.02
+
+Pass --url to load an already running server instead (its backends are
+then whatever that server was started with).
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import corpus
+
+logger = logging.getLogger('loadtest')
+
+FALLBACK_ANSWER = 'Sorry, I encountered an error'
+
+QUESTIONS = [
+    'What is this chapter about?',
+    'Who is the main character?',
+    'Summarize the last page.',
+    'What happened at the university?',
+    'Why does the story mention the city?'
+]
+
+class Recorder:
+    """Thread-safe latency and outcome samples per endpoint"""
+
+    def __init__(self):
+        self._samples: Dict[str, List] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self._samples[endpoint].append((seconds, ok))
+
+    def report(self, elapsed: float) -> Dict:
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self._samples.items()}
+        report = {}
+        for endpoint, values in sorted(samples.items()):
+            latencies = sorted(seconds for seconds, _ in values)
+            report[endpoint] = {
+                'requests': len(values),
+                'errors': sum(1 for _, ok in values if not ok),
+                'throughput': len(values) / elapsed,
+                'mean': sum(latencies) / len(latencies),
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1]
+            }
+        return report
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+class Reader:
+    """One simulated reader working through a document with its own HTTP session"""
+
+    def __init__(self, base_url: str, recorder: Recorder, args, rng: random.Random):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+        self.http = requests.Session()
+
+    def call(self, endpoint: str, method: str, path: str, check=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.args.timeout, **kwargs)
+            ok = response.status_code < 400 and (check is None or check(response))
+        except requests.RequestException as e:
+            logger.debug(f"{endpoint} failed: {str(e)}")
+            response, ok = None, False
+        self.recorder.record(endpoint, time.perf_counter() - started, ok)
+        return response if ok else None
+
+    def think(self):
+        if self.args.think_time:
+            time.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+    def run_session(self, name: str, document: bytes, deadline: float):
+        response = self.call('upload', 'POST', '/upload', files={'file': (name, document)})
+        if response is None:
+            return
+        session = response.json()
+        session_id = session['session_id']
+        segments = session['segments']
+
+        for index, text in enumerate(segments[:self.args.segments_per_session]):
+            if time.monotonic() >= deadline:
+                return
+            self.call('tts', 'POST', '/tts', json={
+                'text': text,
+                'voice_id': self.args.voice,
+                'format': self.args.format,
+                'session_id': session_id,
+                'segment_index': index
+            })
+            for tick in range(self.args.progress_updates):
+                self.think()
+                self.call('progress', 'PUT', f'/session/{session_id}', json={
+                    'current_segment': index,
+                    'current_position': tick
+                })
+            if self.rng.random() < self.args.ask_rate:
+                self.call('ask', 'POST', '/ask', json={
+                    'sessionId': session_id,
+                    'question': self.rng.choice(QUESTIONS),
+                    'currentSegment': index
+                }, check=lambda r: not r.json().get('response', '').startswith(FALLBACK_ANSWER))
+            self.think()
+
+def configure_environment(workdir: str, args, openai_base: str):
+    """Route the app's backends to the fakes and its storage to a scratch directory"""
+    os.environ.update({
+        'TTS_BACKEND': 'fake',
+        'FAKE_TTS_REQUEST_OVERHEAD': str(args.tts_latency),
+        'FAKE_TTS_JITTER': str(args.tts_jitter),
+        'FAKE_TTS_ERROR_RATE': str(args.tts_error_rate),
+        'FAKE_TTS_CHUNK_INTERVAL': str(args.tts_chunk_interval),
+        'FAKE_TTS_CONNECT_DELAY': '0',
+        'OPENAI_API_KEY': 'loadtest',
+        'OPENAI_API_BASE': openai_base,
+        'AUDIO_CACHE_DIR': os.path.join(workdir, 'audio_cache'),
+        'UPLOAD_DIR': os.path.join(workdir, 'uploads'),
+        'RETRIEVAL_INDEX_DIR': os.path.join(workdir, 'indexes'),
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        'PROGRESS_BUFFER_DB': os.path.join(workdir, 'progress_buffer.db'),
+        'AI_CACHE_DB': ''
+    })
+
+def start_app(workdir: str, args) -> str:
+    """Start the fake OpenAI server and the app in this process; returns the app's base URL"""
+    import fake_openai
+    from werkzeug.serving import make_server
+
+    openai_server = fake_openai.serve('127.0.0.1', 0, args.ai_latency, args.ai_token_interval,
+                                      args.ai_jitter, args.ai_error_rate)
+    threading.Thread(target=openai_server.serve_forever, daemon=True).start()
+    configure_environment(workdir, args, f"http://127.0.0.1:{openai_server.server_address[1]}/v1")
+
+    # Imported only now: the app reads its configuration from the environment at import time
+    import wsgi
+
+    server = make_server('127.0.0.1', args.port, wsgi.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def print_report(report: Dict, elapsed: float):
+    print(f"{'endpoint':10s} {'requests':>9s} {'errors':>7s} {'req/s':>8s} "
+          f"{'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:10s} {stats['requests']:9d} {stats['errors']:7d} {stats['throughput']:8.1f} "
+              f"{stats['p50'] * 1000:9.1f} {stats['p95'] * 1000:9.1f} {stats['p99'] * 1000:9.1f} "
+              f"{stats['max'] * 1000:9.1f}")
+    total = sum(stats['requests'] for stats in report['endpoints'].values())
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), "
+          f"{report['sessions']} reader sessions at concurrency {report['config']['concurrency']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='load this server instead of starting the app locally')
+    parser.add_argument('--port', type=int, default=0, help='port for the local app (default: any free port)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout in seconds')
+    parser.add_argument('--documents', type=int, default=4, help='distinct documents shared by readers')
+    parser.add_argument('--doc-format', choices=corpus.FORMATS, default='pdf')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--segments-per-session', type=int, default=20)
+    parser.add_argument('--progress-updates', type=int, default=3, help='progress PUTs per segment')
+    parser.add_argument('--ask-rate', type=float, default=0.1, help='chance of a question after each segment')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between a reader\'s calls')
+    parser.add_argument('--voice', default='en-US-JennyNeural')
+    parser.add_argument('--format', default='wav', help='audio format requested from /tts')
+    parser.add_argument('--tts-latency', type=float, default=0.2)
+    parser.add_argument('--tts-jitter', type=float, default=0.1)
+    parser.add_argument('--tts-error-rate', type=float, default=0.0)
+    parser.add_argument('--tts-chunk-interval', type=float, default=0.0)
+    parser.add_argument('--ai-latency', type=float, default=0.5)
+    parser.add_argument('--ai-jitter', type=float, default=0.2)
+    parser.add_argument('--ai-error-rate', type=float, default=0.0)
+    parser.add_argument('--ai-token-interval', type=float, default=0.0)
+    parser.add_argument('--output', help='also write the report as JSON here')
+    parser.add_argument('--verbose', action='store_true', help='show the app\'s own logs, including simulated failures')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if not args.verbose:
+        for name in ('app', 'openai', 'fake_openai', 'werkzeug'):
+            logging.getLogger(name).setLevel(logging.CRITICAL)
+
+    documents = [
+        (f"doc-{seed}.{args.doc_format}", corpus.make_document(args.doc_format, args.pages, seed=seed))
+        for seed in range(args.documents)
+    ]
+
+    workdir = tempfile.mkdtemp(prefix='readit-load-')
+    # Removed at exit, after the app's background workers (e.g. prefetches) have been joined
+    atexit.register(shutil.rmtree, workdir, True)
+
+    base_url = args.url or start_app(workdir, args)
+    logger.info(f"Loading {base_url} with {args.concurrency} readers for {args.duration:.0f}s")
+
+    recorder = Recorder()
+    sessions = []
+    started = time.monotonic()
+    deadline = started + args.duration
+
+    def worker(number: int):
+        rng = random.Random(f"{args.seed}:{number}")
+        reader = Reader(base_url, recorder, args, rng)
+        count = 0
+        while time.monotonic() < deadline:
+            name, document = documents[(number + count) % len(documents)]
+            reader.run_session(name, document, deadline)
+            count += 1
+        sessions.append(count)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(worker, range(args.concurrency)))
+    elapsed = time.monotonic() - started
+
+    report = {
+        'config': vars(args),
+        'elapsed': elapsed,
+        'sessions': sum(sessions),
+        'endpoints': recorder.report(elapsed)
+    }
+    print_report(report, elapsed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
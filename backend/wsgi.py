@@ -1,6 +1,9 @@
+import multiprocessing
 from app import create_app
 
-app = create_app()
+# Spawned helper processes (e.g. PDF extraction) re-import the main module; they need no app
+if multiprocessing.parent_process() is None:
+    app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -34,13 +34,26 @@ export const uploadDocument = async (file) => {
   }
 };
 
-export const askAIQuestion = async (sessionId, question, context) => {
+export const getSegments = async (sessionId, start = 0, count = 50) => {
   try {
-    console.log('Asking AI:', { sessionId, question, context });
+    const response = await api.get(`/session/${sessionId}/segments`, {
+      params: { start, count },
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Failed to fetch segments:', error);
+    throw error;
+  }
+};
+
+export const askAIQuestion = async (sessionId, question, currentSegment) => {
+  try {
+    console.log('Asking AI:', { sessionId, question, currentSegment });
+    // The server retrieves the relevant segments itself
     const response = await api.post('/ask', {
       sessionId,
       question,
-      context,
+      currentSegment,
     });
     return response.data.response;
   } catch (error) {
@@ -49,6 +62,41 @@ export const askAIQuestion = async (sessionId, question, context) => {
   }
 };
 
+// Streams the answer over Server-Sent Events, calling onToken as tokens arrive
+export const streamAIQuestion = async (sessionId, question, currentSegment, onToken) => {
+  const response = await fetch(`${API_URL}/ask/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ sessionId, question, currentSegment }),
+  });
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || `Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let answer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      const event = (raw.match(/^event: (.*)$/m) || [])[1] || 'message';
+      const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+      if (event === 'error') throw new Error(data.error);
+      if (event === 'done') return data.response;
+      answer += data.token;
+      onToken(answer);
+    }
+  }
+  return answer;
+};
+
 export const getVoices = async () => {
   try {
     const response = await api.get('/api/voices');
@@ -59,9 +107,15 @@ export const getVoices = async () => {
   }
 };
 
-export const textToSpeech = async (text, voice) => {
+export const textToSpeech = async (text, voice, sessionId = null, segmentIndex = null) => {
   try {
-    const response = await api.post('/text-to-speech', { text, voice }, {
+    // Naming the session and segment lets the server prefetch the segments that follow
+    const body = { text, voice_id: voice };
+    if (sessionId && segmentIndex !== null) {
+      body.session_id = sessionId;
+      body.segment_index = segmentIndex;
+    }
+    const response = await api.post('/tts', body, {
       responseType: 'blob',
     });
     return response.data;
@@ -71,15 +125,16 @@ export const textToSpeech = async (text, voice) => {
   }
 };
 
-export const addBookmark = async (sessionId, segment, note) => {
+export const addBookmark = async (sessionId, segmentIndex, note, position = 0) => {
   try {
-    if (!sessionId || !segment) {
-      throw new Error('Missing required fields: sessionId and segment are required');
+    if (!sessionId || segmentIndex === null || segmentIndex === undefined) {
+      throw new Error('Missing required fields: sessionId and segmentIndex are required');
     }
     
     const response = await api.post('/bookmarks', {
       sessionId,
-      segment,
+      segmentIndex,
+      position,
       note: note || ''
     });
     return response.data;
@@ -89,9 +144,11 @@ export const addBookmark = async (sessionId, segment, note) => {
   }
 };
 
-export const getBookmarks = async (sessionId) => {
+export const getBookmarks = async (sessionId, start = 0, count = 100) => {
   try {
-    const response = await api.get(`/bookmarks/${sessionId}`);
+    const response = await api.get(`/bookmarks/${sessionId}`, {
+      params: { start, count }
+    });
     return response.data;
   } catch (error) {
     console.error('Failed to get bookmarks:', error);
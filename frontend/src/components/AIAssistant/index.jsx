@@ -18,7 +18,7 @@ import MicIcon from '@mui/icons-material/Mic';
 import StopIcon from '@mui/icons-material/Stop';
 import { useAppContext } from '../../contexts/AppContext';
 import { useSettings } from '../../contexts/SettingsContext';
-import { askAIQuestion, textToSpeech } from '../../api';
+import { streamAIQuestion, textToSpeech } from '../../api';
 import './styles.css';
 
 // Initialize speech recognition
@@ -31,7 +31,7 @@ if (recognition) {
 }
 
 const AIAssistant = () => {
-  const { sessionId, segments, currentSegment } = useAppContext();
+  const { sessionId, currentSegment } = useAppContext();
   const { selectedVoice } = useSettings();
   const [question, setQuestion] = useState('');
   const [answer, setAnswer] = useState('');
@@ -84,25 +84,7 @@ const AIAssistant = () => {
     setLoading(true);
     setError(null);
     try {
-      // Get context from current and surrounding segments
-      const contextSegments = [];
-      const start = Math.max(0, currentSegment - 1);
-      const end = Math.min(segments.length, currentSegment + 2);
-      
-      for (let i = start; i < end; i++) {
-        if (segments[i]) {
-          contextSegments.push(segments[i]);
-        }
-      }
-      
-      const context = contextSegments.join(' ');
-      console.log('Asking question with context:', { 
-        question, 
-        contextLength: context.length,
-        segmentsUsed: end - start 
-      });
-
-      const response = await askAIQuestion(sessionId, question, context);
+      const response = await streamAIQuestion(sessionId, question, currentSegment, setAnswer);
       setAnswer(response);
 
       // Convert AI response to speech if voice is selected
@@ -43,9 +43,10 @@ const Bookmarks = () => {
     }
 
     try {
-      const segment = segments[currentSegment];
-      const bookmark = await addBookmark(sessionId, segment, note);
-      setBookmarks(prev => [...prev, bookmark]);
+      const bookmark = await addBookmark(sessionId, currentSegment, note);
+      setBookmarks(prev => [...prev, bookmark].sort(
+        (a, b) => a.segment_index - b.segment_index || a.position - b.position
+      ));
       setNote('');
       setError(null);
     } catch (error) {
@@ -102,7 +103,7 @@ const Bookmarks = () => {
           <ListItem key={bookmark.id}>
             <ListItemText
               primary={bookmark.note || 'No note'}
-              secondary={`Segment: ${bookmark.segment.substring(0, 100)}...`}
+              secondary={`Segment ${bookmark.segment_index + 1}: ${(segments[bookmark.segment_index] || '').substring(0, 100)}...`}
             />
             <ListItemSecondaryAction>
               <IconButton
@@ -1,4 +1,4 @@
-import React, { useCallback, useState } from 'react';
+import React, { useCallback, useRef, useState } from 'react';
 import { useDropzone } from 'react-dropzone';
 import {
   Box,
@@ -9,9 +9,12 @@ import {
 import CloudUploadIcon from '@mui/icons-material/CloudUpload';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import { useAppContext } from '../../contexts/AppContext';
-import { uploadDocument } from '../../api';
+import { getSegments, uploadDocument } from '../../api';
 import './styles.css';
 
+// Largest page /session/<id>/segments serves
+const SEGMENT_PAGE = 500;
+
 const DocumentUploader = () => {
   const {
     setSessionId,
@@ -23,11 +26,30 @@ const DocumentUploader = () => {
   const [uploading, setUploading] = useState(false);
   const [uploadSuccess, setUploadSuccess] = useState(false);
   const [fileName, setFileName] = useState('');
+  // Bumped on every upload so paging for an earlier document stops
+  const uploadGeneration = useRef(0);
+
+  // /upload returns only the first page of segments; fetch the rest behind the reader
+  const loadRemainingSegments = useCallback(async (sessionId, response, generation) => {
+    let loaded = response.segments;
+    let total = response.total_segments;
+    // A lazily extracted document keeps growing until the server reports it complete
+    let complete = response.materialized !== false;
+    while (uploadGeneration.current === generation && !(complete && loaded.length >= total)) {
+      const page = await getSegments(sessionId, loaded.length, SEGMENT_PAGE);
+      if (uploadGeneration.current !== generation || page.count === 0) break;
+      loaded = loaded.concat(page.segments.map((segment) => segment.text));
+      setSegments(loaded);
+      total = page.total_segments;
+      complete = page.materialized;
+    }
+  }, [setSegments]);
 
   const onDrop = useCallback(async (acceptedFiles) => {
     if (acceptedFiles.length === 0) return;
 
     const file = acceptedFiles[0];
+    const generation = ++uploadGeneration.current;
     setFileName(file.name);
     setUploading(true);
     setUploadSuccess(false);
@@ -42,13 +64,17 @@ const DocumentUploader = () => {
       setSegments(response.segments);
       setCurrentSegment(0);
       setUploadSuccess(true);
+      loadRemainingSegments(response.session_id, response, generation).catch((error) => {
+        console.error('Failed to load remaining segments:', error);
+        setError(error.message || 'Failed to load the rest of the document');
+      });
     } catch (error) {
       console.error('Upload error:', error);
       setError(error.message || 'Failed to upload document');
     } finally {
       setUploading(false);
     }
-  }, [setSessionId, setSegments, setCurrentSegment, setError]);
+  }, [setSessionId, setSegments, setCurrentSegment, setError, loadRemainingSegments]);
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     onDrop,
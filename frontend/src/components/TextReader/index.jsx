@@ -19,6 +19,7 @@ import './styles.css';
 
 const TextReader = () => {
   const {
+    sessionId,
     segments,
     currentSegment,
     setCurrentSegment,
@@ -84,7 +85,7 @@ const TextReader = () => {
       }
 
       setLoading(true);
-      const audioBlob = await textToSpeech(segment, selectedVoice);
+      const audioBlob = await textToSpeech(segment, selectedVoice, sessionId, segmentIndex);
       
       // Create new audio element
       const audio = new Audio(URL.createObjectURL(audioBlob));
@@ -128,7 +129,7 @@ const TextReader = () => {
       setIsPlaying(false);
       setLoading(false);
     }
-  }, [currentPosition, segments, selectedVoice, setCurrentPosition, setIsPlaying, handleSegmentEnd, currentPage, wordsPerPage]);
+  }, [currentPosition, segments, selectedVoice, sessionId, setCurrentPosition, setIsPlaying, handleSegmentEnd, currentPage, wordsPerPage]);
 
   const handlePlayPause = useCallback(async () => {
     try {